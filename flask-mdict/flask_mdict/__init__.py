@@ -1,5 +1,6 @@
+import os
 import sqlite3
-import os.path
+from concurrent.futures import ThreadPoolExecutor
 
 from flask import Blueprint, g
 
@@ -19,12 +20,18 @@ class Config:
     pass
 
 
-# Module-level cache instance, initialized in init_app()
+# Module-level cache instances, initialized in init_app()
 _cache = None
+_block_cache = None
+_suggest_index = None
+_lookup_executor = None
+_lookup_stats = None
+_indexer = None
 
 
 def init_app(app, url_prefix=None):
-    global _cache
+    global _cache, _block_cache, _suggest_index, _lookup_executor, _lookup_stats
+    global _indexer
 
     Config.MDICT_DIR = app.config.get("MDICT_DIR")
     Config.MDICT_CACHE = app.config.get("MDICT_CACHE")
@@ -32,6 +39,10 @@ def init_app(app, url_prefix=None):
         raise ValueError('Please set "MDICT_DIR" in app.config')
 
     Config.INDEX_DIR = app.config.get("INDEX_DIR")
+    if IndexBuilder2.index_backend not in IndexBuilder2.INDEX_BACKENDS:
+        raise ValueError(
+            'INDEX_BACKEND must be one of %s' % ", ".join(IndexBuilder2.INDEX_BACKENDS)
+        )
 
     Config.DB_NAMES = {}
 
@@ -40,14 +51,57 @@ def init_app(app, url_prefix=None):
     Config.DB_NAMES["wfd_db"] = app.config.get("WFD_DB")
     helper.init_flask_mdict()
 
-    mdicts, db_names = helper.init_mdict(Config.MDICT_DIR, Config.INDEX_DIR)
-    Config.MDICT = mdicts
+    # missing or outdated indexes are built in parallel processes, before
+    # the server starts or, with INDEX_BACKGROUND, while it already serves
+    # the dictionaries that have one
+    index_workers = int(os.environ.get("INDEX_WORKERS", min(4, os.cpu_count() or 1)))
+    index_background = os.environ.get("INDEX_BACKGROUND", "").lower() in ("1", "true", "yes")
+    mdicts, db_names = helper.init_mdict(
+        Config.MDICT_DIR,
+        Config.INDEX_DIR,
+        index_workers=index_workers,
+        background=index_background,
+    )
+    from .background import BackgroundIndexer
+
+    _indexer = BackgroundIndexer(mdicts, index_workers)
+    Config.MDICT = _indexer.ready_items(mdicts)
     Config.DB_NAMES.update(db_names)
 
     # Initialize cache (Valkey if REDIS_URL is set, otherwise in-memory LRU)
-    from .cache import init_cache
+    from .cache import init_cache, init_block_cache
 
-    _cache = init_cache()
+    # fragments are cached per dictionary, the memory cache grows with them
+    _cache = init_cache(len(mdicts))
+
+    # Decompressed record blocks, shared by all mdx/mdd dictionaries
+    _block_cache = init_block_cache()
+    IndexBuilder2.block_cache = _block_cache
+
+    from .pool import init_file_pool
+
+    init_file_pool()
+
+    # Prefix index over the headwords of all dictionaries for /api/suggest,
+    # built in the background
+    from .suggest import SuggestIndex
+
+    _suggest_index = SuggestIndex()
+    _suggest_index.start(Config.MDICT, Config.DB_NAMES)
+
+    if _indexer.building:
+        _indexer.start(helper.get_dict_usage(), _suggest_index)
+
+    # Aggregated lookups query the dictionaries in parallel
+    from .stats import LookupStats
+
+    Config.LOOKUP_TIMEOUT = float(os.environ.get("LOOKUP_TIMEOUT", "10"))
+    Config.BATCH_MAX_WORDS = int(os.environ.get("BATCH_MAX_WORDS", "5000"))
+    _lookup_executor = ThreadPoolExecutor(
+        max_workers=int(os.environ.get("LOOKUP_WORKERS", "8")),
+        thread_name_prefix="lookup",
+    )
+    _lookup_stats = LookupStats()
 
     app.register_blueprint(mdict, url_prefix=url_prefix)
 
@@ -60,6 +114,26 @@ def get_cache():
     return _cache
 
 
+def get_block_cache():
+    return _block_cache
+
+
+def get_suggest_index():
+    return _suggest_index
+
+
+def get_lookup_executor():
+    return _lookup_executor
+
+
+def get_lookup_stats():
+    return _lookup_stats
+
+
+def get_indexer():
+    return _indexer
+
+
 def get_db(uuid):
     database = getattr(g, "_database", None)
     if not database:
@@ -79,3 +153,4 @@ def get_db(uuid):
 
 # must import at bottom
 from . import helper, views
+from .mdict_query2 import IndexBuilder2
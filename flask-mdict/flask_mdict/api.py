@@ -3,27 +3,45 @@
 import re
 import io
 import os.path
+import json
+import time
 import datetime
 import sqlite3
+from concurrent.futures import Future, wait, as_completed, TimeoutError
+
+from flask import (
+    Blueprint,
+    Response,
+    jsonify,
+    request,
+    abort,
+    make_response,
+    send_file,
+    url_for,
+    copy_current_request_context,
+    stream_with_context,
+)
 
-from flask import Blueprint, jsonify, request, abort, make_response, send_file, url_for
 
-from . import get_mdict, get_db, get_cache, Config
+from . import (
+    get_mdict,
+    get_db,
+    get_cache,
+    get_block_cache,
+    get_suggest_index,
+    get_lookup_executor,
+    get_lookup_stats,
+    get_indexer,
+    Config,
+)
 from . import helper
+from .fulltext import MAX_RESULTS, match_query, search_fulltext
+from .rewriter import RecordRewriter
 
 
 api = Blueprint("api", __name__)
 
 regex_word_link = re.compile(r"^(@@@LINK=)(.+)$")
-regex_src_schema = re.compile(r'([ "]src=["\'])(/|file:///)?(?!data:)(.+?["\'])')
-regex_href_end_slash = re.compile(r'([ "]href=["\'].+?)(/)(["\'])')
-regex_href_schema_sound = re.compile(r'([ "]href=["\'])(sound://)([^#].+?["\'])')
-regex_href_schema_entry = re.compile(r'([ "]href=["\'])(entry://)([^#].+?["\'])')
-regex_href_no_schema = re.compile(
-    r'([ "]href=["\'])(?!http://|https://|sound://|entry://)([^#].+?["\'])'
-)
-regex_css = re.compile(r'(<link.*? )(href)(=".+?>)')
-regex_js = re.compile(r'(<script.*? )(src)(=".+?>)')
 
 
 @api.after_request
@@ -40,9 +58,16 @@ def add_cors_headers(response):
 
 @api.route("/dicts")
 def list_dicts():
-    """List all loaded dictionaries with metadata."""
+    """List all loaded dictionaries with metadata.
+
+    Dictionaries whose index is still being built are listed too, with
+    status "building" (or "error" if the build failed). "wildcard" is the
+    state of the index for wildcard searches of an mdx dictionary, null
+    until the first such search, then "building", "ready" or "error".
+    """
     dicts = []
-    for uuid, item in get_mdict().items():
+    for item in get_indexer().all_items():
+        uuid = item["uuid"]
         dicts.append(
             {
                 "uuid": uuid,
@@ -52,46 +77,34 @@ def list_dicts():
                 ),
                 "type": item["type"],
                 "enabled": item["enable"],
+                "status": item["status"],
+                "wildcard": getattr(item["query"], "wildcard_status", None),
             }
         )
     return jsonify(dicts)
 
 
-@api.route("/dicts/<uuid>/lookup/<word>")
-def lookup_word(uuid, word):
-    """Lookup a word in a specific dictionary. Returns raw HTML content."""
-    word = word.strip()
-    item = get_mdict().get(uuid)
-    if not item:
-        abort(404)
-
-    # Cache check: per-dict lookup
-    cache = get_cache()
-    cache_key = "l:%s:%s" % (uuid[:8], word.lower())
-    if cache:
-        cached = cache.get(cache_key)
-        if cached is not None:
-            return jsonify(cached)
-
+def _lookup_records(uuid, item, word):
+    """Lookup the records of a word in one dictionary, following @@@LINK."""
     q = item["query"]
     if item["type"] == "app":
-        records = q(word, item)
-    else:
-        records = q.mdx_lookup(get_db(uuid), word, ignorecase=True)
-        # resolve @@@LINK references
-        for idx, record in enumerate(records):
-            mo = regex_word_link.match(record)
-            if mo:
-                link = mo.group(2).strip()
-                link_records = q.mdx_lookup(get_db(uuid), link, ignorecase=True)
-                records[idx] = "\n\n".join(link_records)
+        return q(word, item)
+    records = q.mdx_lookup(get_db(uuid), word, ignorecase=True)
+    # resolve @@@LINK references
+    for idx, record in enumerate(records):
+        mo = regex_word_link.match(record)
+        if mo:
+            link = mo.group(2).strip()
+            link_records = q.mdx_lookup(get_db(uuid), link, ignorecase=True)
+            records[idx] = "\n\n".join(link_records)
+    return records
 
-    if not records:
-        result = {"word": word, "uuid": uuid, "found": False, "html": ""}
-        return jsonify(result)
 
+def _render_records(uuid, records):
+    """Join the records of one dictionary into the HTML shown by the SPA."""
     # Build resource URL prefix for this dict
     prefix_resource = url_for("mdict.query_resource", uuid=uuid, resource="")
+    rewriter = RecordRewriter(prefix_resource)
 
     html_parts = []
     count = 1
@@ -110,33 +123,72 @@ def lookup_word(uuid, word):
                 f'data-entry-word="{link}">{link}</a></p>'
             )
         else:
-            # Rewrite resource URLs to point to Flask backend
-            record = regex_src_schema.sub(r"\g<1>%s/\3" % prefix_resource, record)
-            record = regex_href_no_schema.sub(r"\g<1>%s/\2" % prefix_resource, record)
-            record = regex_href_end_slash.sub(r"\1\3", record)
-            # Mark sound/entry links with data attributes for JS handling
-            record = regex_href_schema_sound.sub(
-                r' data-sound-url="%s/\3" \1\2\3' % prefix_resource, record
-            )
-            record = regex_href_schema_entry.sub(
-                r' data-entry-word="\3" \1\2\3', record
-            )
-
+            # Rewrite resource URLs to point to Flask backend and mark
+            # sound/entry links with data attributes for JS handling.
             # Keep first CSS, keep last JS
-            if count > 1:
-                record = regex_css.sub(r"\1data-\2\3", record)
-            if count < record_num:
-                record = regex_js.sub(r"\1data-\2\3", record)
+            record = rewriter.rewrite(
+                record, keep_css=count == 1, keep_js=count >= record_num
+            )
             count += 1
 
         html_parts.append(record)
 
     # Prepend reset CSS
     reset_css_url = url_for("mdict.query_resource", uuid=uuid, resource="css/reset.css")
-    html_content = f'<link rel="stylesheet" href="{reset_css_url}">' + "<hr />".join(
+    return f'<link rel="stylesheet" href="{reset_css_url}">' + "<hr />".join(
         html_parts
     )
 
+
+def _lookup_html(uuid, item, word):
+    """Lookup and render a word in one dictionary, None if not found."""
+    start = time.perf_counter()
+    records = _lookup_records(uuid, item, word)
+    html_content = _render_records(uuid, records) if records else None
+    get_lookup_stats().observe(uuid, time.perf_counter() - start)
+    return html_content
+
+
+def _fragment_key(uuid, word):
+    return "f:%s:%s" % (uuid[:8], word.lower())
+
+
+def _get_fragment(uuid, word):
+    """Cached HTML of a word in one dictionary.
+
+    Returns None on a cache miss and "" if the dictionary is known not to
+    have the word.
+    """
+    cache = get_cache()
+    return cache.get(_fragment_key(uuid, word)) if cache else None
+
+
+def _lookup_fragment(uuid, item, word):
+    """_lookup_html that stores the result in the fragment cache."""
+    html_content = _lookup_html(uuid, item, word)
+    cache = get_cache()
+    # misses of the online translators may be transient, don't remember them
+    if cache and (html_content is not None or item["type"] != "app"):
+        cache.set(_fragment_key(uuid, word), html_content or "")
+    return html_content
+
+
+@api.route("/dicts/<uuid>/lookup/<word>")
+def lookup_word(uuid, word):
+    """Lookup a word in a specific dictionary. Returns raw HTML content."""
+    word = word.strip()
+    item = get_mdict().get(uuid)
+    if not item:
+        abort(404)
+
+    # Cache check: rendered fragment of this dictionary
+    html_content = _get_fragment(uuid, word)
+    if html_content is None:
+        html_content = _lookup_fragment(uuid, item, word)
+    if not html_content:
+        result = {"word": word, "uuid": uuid, "found": False, "html": ""}
+        return jsonify(result)
+
     result = {
         "word": word,
         "uuid": uuid,
@@ -144,122 +196,272 @@ def lookup_word(uuid, word):
         "found": True,
         "html": html_content,
     }
-
-    if cache:
-        cache.set(cache_key, result)
-
     return jsonify(result)
 
 
-@api.route("/lookup/<word>")
-def lookup_all(word):
-    """Lookup a word across all enabled dictionaries."""
-    word = word.strip()
-
-    # Cache check: aggregated lookup across all enabled dicts
-    cache = get_cache()
-    cache_key = "la:%s" % word.lower()
-    if cache:
-        cached = cache.get(cache_key)
-        if cached is not None:
-            # Still record history on cache hit
-            helper.add_history(word)
-            return jsonify(cached)
-
-    results = []
+def _submit_lookups(word):
+    """Start the lookup of a word in every enabled dictionary.
 
+    Returns (uuid, item, future) in dictionary order. Dictionaries whose
+    fragment is cached, or whose headword filter rules the word out, get
+    an already completed future. The fragments are read from the cache
+    with one get_many.
+    """
+    executor = get_lookup_executor()
+    items = []
     for uuid, item in get_mdict().items():
         if not item["enable"]:
             continue
+        if item["type"] == "mdict" and not item["query"].may_contain(word):
+            items.append((uuid, item, ""))
+        else:
+            items.append((uuid, item, None))
 
-        q = item["query"]
-        if item["type"] == "app":
-            records = q(word, item)
+    cache = get_cache()
+    probes = [uuid for uuid, _, html_content in items if html_content is None]
+    if cache and probes:
+        keys = [_fragment_key(uuid, word) for uuid in probes]
+        fragments = dict(zip(probes, cache.get_many(keys)))
+        items = [
+            (uuid, item, fragments[uuid] if html_content is None else html_content)
+            for uuid, item, html_content in items
+        ]
+
+    tasks = []
+    for uuid, item, html_content in items:
+        if html_content is not None:
+            future = Future()
+            future.set_result(html_content or None)
         else:
-            records = q.mdx_lookup(get_db(uuid), word, ignorecase=True)
-            for idx, record in enumerate(records):
-                mo = regex_word_link.match(record)
-                if mo:
-                    link = mo.group(2).strip()
-                    link_records = q.mdx_lookup(get_db(uuid), link, ignorecase=True)
-                    records[idx] = "\n\n".join(link_records)
-
-        if not records:
-            continue
+            # workers need the request context for url_for() and get_db()
+            task = copy_current_request_context(_lookup_fragment)
+            future = executor.submit(task, uuid, item, word)
+        tasks.append((uuid, item, future))
+    return tasks
 
-        prefix_resource = url_for("mdict.query_resource", uuid=uuid, resource="")
 
-        html_parts = []
-        count = 1
-        record_num = len(records)
-        for record in records:
-            if record.startswith("@@@LINK="):
-                record_num -= 1
+def _lookup_result(uuid, item, html_content):
+    return {
+        "uuid": uuid,
+        "title": item["title"],
+        "logo": url_for("mdict.query_resource", uuid=uuid, resource=item["logo"]),
+        "found": True,
+        "html": html_content,
+    }
 
-        for record in records:
-            record = helper.fix_html(record)
-            mo = regex_word_link.match(record)
-            if mo:
-                link = mo.group(2).strip()
-                html_parts.append(
-                    f'<p>See also: <a href="entry://{link}" '
-                    f'data-entry-word="{link}">{link}</a></p>'
-                )
-            else:
-                record = regex_src_schema.sub(r"\g<1>%s/\3" % prefix_resource, record)
-                record = regex_href_no_schema.sub(
-                    r"\g<1>%s/\2" % prefix_resource, record
-                )
-                record = regex_href_end_slash.sub(r"\1\3", record)
-                record = regex_href_schema_sound.sub(
-                    r' data-sound-url="%s/\3" \1\2\3' % prefix_resource, record
-                )
-                record = regex_href_schema_entry.sub(
-                    r' data-entry-word="\3" \1\2\3', record
-                )
-                if count > 1:
-                    record = regex_css.sub(r"\1data-\2\3", record)
-                if count < record_num:
-                    record = regex_js.sub(r"\1data-\2\3", record)
-                count += 1
-
-            html_parts.append(record)
-
-        reset_css_url = url_for(
-            "mdict.query_resource", uuid=uuid, resource="css/reset.css"
-        )
-        html_content = (
-            f'<link rel="stylesheet" href="{reset_css_url}">'
-            + "<hr />".join(html_parts)
-        )
 
-        results.append(
-            {
-                "uuid": uuid,
-                "title": item["title"],
-                "logo": url_for(
-                    "mdict.query_resource", uuid=uuid, resource=item["logo"]
-                ),
-                "found": True,
-                "html": html_content,
-            }
-        )
+@api.route("/lookup/<word>")
+def lookup_all(word):
+    """Lookup a word across all enabled dictionaries.
+
+    The response is assembled from the per-dictionary fragment cache, so
+    toggling a dictionary invalidates nothing. Missing fragments are looked
+    up in parallel on the lookup executor. Results keep the dictionary
+    order; dictionaries that miss the LOOKUP_TIMEOUT deadline are listed in
+    "pending" instead of delaying the response.
+    """
+    word = word.strip()
+
+    tasks = _submit_lookups(word)
+    done, _ = wait([future for _, _, future in tasks], timeout=Config.LOOKUP_TIMEOUT)
+
+    results = []
+    pending = []
+    for uuid, item, future in tasks:
+        if future not in done:
+            get_lookup_stats().timeout(uuid)
+            pending.append({"uuid": uuid, "title": item["title"]})
+            continue
+        html_content = future.result()
+        if html_content is None:
+            continue
+        results.append(_lookup_result(uuid, item, html_content))
 
     # Record history
     if results:
-        helper.add_history(word)
+        helper.add_history(word, [result["uuid"] for result in results])
 
     response_data = {
         "word": word,
         "results": results,
         "total": len(results),
+        "pending": pending,
     }
+    return jsonify(response_data)
 
-    # Cache the response (only if there were results)
-    if cache and results:
-        cache.set(cache_key, response_data)
 
-    return jsonify(response_data)
+def _ndjson(data):
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+@api.route("/lookup/<word>/stream")
+def lookup_all_stream(word):
+    """Streaming variant of lookup_all, as newline-delimited JSON.
+
+    Every dictionary that has the word produces one {"type": "result"} line
+    as soon as it is rendered, in completion order; its "index" is the
+    position in the dictionary order. A final {"type": "done"} line carries
+    the word, the total and the dictionaries that missed LOOKUP_TIMEOUT.
+    """
+    word = word.strip()
+
+    # start the lookups before the first byte is sent
+    tasks = _submit_lookups(word)
+
+    def generate():
+        positions = {future: index for index, (_, _, future) in enumerate(tasks)}
+        found = []
+        try:
+            for future in as_completed(positions, timeout=Config.LOOKUP_TIMEOUT):
+                index = positions.pop(future)
+                html_content = future.result()
+                if html_content is None:
+                    continue
+                uuid, item, _ = tasks[index]
+                result = _lookup_result(uuid, item, html_content)
+                yield _ndjson(dict(result, type="result", index=index))
+                found.append(uuid)
+        except TimeoutError:
+            pass
+
+        pending = []
+        for index in sorted(positions.values()):
+            uuid, item, _ = tasks[index]
+            get_lookup_stats().timeout(uuid)
+            pending.append({"uuid": uuid, "title": item["title"]})
+
+        if found:
+            helper.add_history(word, found)
+        yield _ndjson(
+            {"type": "done", "word": word, "total": len(found), "pending": pending}
+        )
+
+    response = Response(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
+    # keep reverse proxies from buffering the stream
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _lookup_many_records(uuid, item, words):
+    """Batch counterpart of _lookup_records, returns {word: [record, ...]}."""
+    q = item["query"]
+    records = q.mdx_lookup_many(get_db(uuid), words, ignorecase=True)
+    # resolve @@@LINK references with one more batch lookup
+    links = {}
+    for word_records in records.values():
+        for record in word_records:
+            mo = regex_word_link.match(record)
+            if mo:
+                links[record] = mo.group(2).strip()
+    if links:
+        link_records = q.mdx_lookup_many(
+            get_db(uuid), list(set(links.values())), ignorecase=True
+        )
+        for word_records in records.values():
+            for idx, record in enumerate(word_records):
+                if record in links:
+                    word_records[idx] = "\n\n".join(link_records[links[record]])
+    return records
+
+
+def _lookup_many_html(uuid, item, words):
+    """Lookup and render many words in one dictionary, {word: html} of the found ones."""
+    records = _lookup_many_records(uuid, item, words)
+    return {
+        word: _render_records(uuid, word_records)
+        for word, word_records in records.items()
+        if word_records
+    }
+
+
+def _lookup_many_fragments(uuid, item, words):
+    """_lookup_many_html that stores the results in the fragment cache."""
+    html_contents = _lookup_many_html(uuid, item, words)
+    cache = get_cache()
+    if cache:
+        cache.set_many(
+            {_fragment_key(uuid, word): html_contents.get(word, "") for word in words}
+        )
+    return html_contents
+
+
+@api.route("/lookup/batch", methods=["POST"])
+def lookup_batch():
+    """Lookup many words in one request.
+
+    Takes {"words": [...], "uuids": [...]}, at most BATCH_MAX_WORDS words.
+    Without "uuids" all enabled dictionaries are used. Translation plugins
+    are left out, they are online services queried one word at a time.
+    Cached fragments are used as they are; each dictionary is probed once
+    for the other words, in parallel on the lookup executor, and the
+    fragments it renders are cached. Returns the results keyed by word,
+    every list in dictionary order and empty for words that were not
+    found. Dictionaries that miss the LOOKUP_TIMEOUT deadline are listed
+    in "pending".
+    """
+    data = request.get_json(silent=True) or {}
+    words = data.get("words")
+    if not isinstance(words, list) or not all(isinstance(w, str) for w in words):
+        return jsonify({"error": "words must be a list of strings"}), 400
+    if len(words) > Config.BATCH_MAX_WORDS:
+        return jsonify({"error": "at most %d words per batch" % Config.BATCH_MAX_WORDS}), 400
+    words = list(dict.fromkeys(w.strip() for w in words if w.strip()))
+
+    mdicts = get_mdict()
+    uuids = data.get("uuids")
+    if uuids is None:
+        uuids = [uuid for uuid, item in mdicts.items() if item["enable"]]
+    elif not isinstance(uuids, list) or not all(uuid in mdicts for uuid in uuids):
+        return jsonify({"error": "uuids must be a list of dictionary uuids"}), 400
+
+    executor = get_lookup_executor()
+    cache = get_cache()
+    tasks = []
+    for uuid in uuids:
+        item = mdicts[uuid]
+        if item["type"] == "app" or not words:
+            continue
+        cached = {}
+        if cache:
+            fragments = cache.get_many([_fragment_key(uuid, word) for word in words])
+            cached = {word: html for word, html in zip(words, fragments) if html is not None}
+        missing = [word for word in words if word not in cached]
+        if missing:
+            # workers need the request context for url_for() and get_db()
+            task = copy_current_request_context(_lookup_many_fragments)
+            future = executor.submit(task, uuid, item, missing)
+        else:
+            future = Future()
+            future.set_result({})
+        tasks.append((uuid, item, cached, future))
+
+    done, _ = wait([task[-1] for task in tasks], timeout=Config.LOOKUP_TIMEOUT)
+
+    results = {word: [] for word in words}
+    pending = []
+    for uuid, item, cached, future in tasks:
+        if future not in done:
+            # not started yet, give the worker back to other requests
+            future.cancel()
+            get_lookup_stats().timeout(uuid)
+            pending.append({"uuid": uuid, "title": item["title"]})
+            continue
+        html_contents = future.result()
+        for word in words:
+            html_content = cached.get(word) or html_contents.get(word)
+            if html_content:
+                results[word].append(_lookup_result(uuid, item, html_content))
+
+    return jsonify(
+        {
+            "results": results,
+            "total": sum(1 for word_results in results.values() if word_results),
+            "pending": pending,
+        }
+    )
 
 
 @api.route("/suggest/<query>")
@@ -267,7 +469,12 @@ def suggest(query):
     """Autocomplete suggestions across all enabled dictionaries."""
     limit = request.args.get("limit", 20, type=int)
 
-    # Cache check: suggestions by prefix
+    # Plain prefixes are answered from the in-memory index once it is built
+    suggest_index = get_suggest_index()
+    if suggest_index and suggest_index.ready and "*" not in query:
+        return jsonify(suggest_index.suggest(query, limit))
+
+    # Cache check: wildcard suggestions
     cache = get_cache()
     cache_key = "s:%s:%d" % (query.lower(), limit)
     if cache:
@@ -292,6 +499,84 @@ def suggest(query):
     return jsonify(suggestions)
 
 
+@api.route("/fuzzy/<word>")
+def fuzzy(word):
+    """Did-you-mean suggestions: enabled headwords within max_edits edits
+    (0 to 2) of word, closest first, then the most frequent in ecdict.
+    """
+    max_edits = min(max(request.args.get("max_edits", 2, type=int), 0), 2)
+    limit = request.args.get("limit", 20, type=int)
+    suggest_index = get_suggest_index()
+    if not suggest_index or not suggest_index.ready:
+        return jsonify([])
+
+    # distance ranks first, the wider search is only needed when the
+    # closer one does not fill the limit
+    matches = suggest_index.fuzzy(word, min(max_edits, 1))
+    if len(matches) < limit and max_edits > 1:
+        matches = suggest_index.fuzzy(word, max_edits)
+
+    frequencies = helper.ecdict_frequencies(match.lower() for _, match in matches)
+
+    def rank(match):
+        bnc, frq = frequencies.get(match[1].lower(), (0, 0))
+        # unranked words last
+        return match[0], frq or bnc or float("inf"), match[1]
+
+    results = []
+    for distance, match in sorted(matches, key=rank)[:limit]:
+        bnc, frq = frequencies.get(match.lower(), (None, None))
+        results.append({"word": match, "distance": distance, "bnc": bnc, "frq": frq})
+    return jsonify(results)
+
+
+def _fulltext_db(item):
+    """The full-text index of an mdx dictionary, None when it has no
+    index or one older than the dictionary
+    """
+    query = item["query"]
+    fts_db = query.get_fulltext_db(query._mdx_db)
+    if not os.path.isfile(fts_db) or os.path.getmtime(fts_db) < os.path.getmtime(query._mdx_file):
+        return None
+    return fts_db
+
+
+@api.route("/fulltext")
+def fulltext_search():
+    """Search the records of the enabled dictionaries that have a full-text
+    index (see tools/build_fulltext.py), best matches first. Pages end
+    within the first MAX_RESULTS matches, "total" counts all of them.
+    """
+    q = request.args.get("q", "")
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", 20, type=int), 1), 100)
+    if page * per_page > MAX_RESULTS:
+        return jsonify({"error": "pages end at result %d" % MAX_RESULTS}), 400
+    result = {"query": q, "page": page, "per_page": per_page, "total": 0, "results": []}
+    match = match_query(q)
+    if not match:
+        return jsonify(result)
+
+    # every dictionary gives its best hits up to the end of the page, the
+    # page is cut from all of them ordered by score
+    hits = []
+    for uuid, item in get_mdict().items():
+        if item["type"] != "mdict" or not item["enable"]:
+            continue
+        fts_db = _fulltext_db(item)
+        if not fts_db:
+            continue
+        total, dict_hits = search_fulltext(fts_db, match, page * per_page)
+        result["total"] += total
+        hits.extend((score, uuid, item["title"], word, snippet) for score, word, snippet in dict_hits)
+    hits.sort(key=lambda hit: hit[0])
+    result["results"] = [
+        {"uuid": uuid, "title": title, "word": word, "snippet": snippet}
+        for _, uuid, title, word, snippet in hits[(page - 1) * per_page:page * per_page]
+    ]
+    return jsonify(result)
+
+
 @api.route("/history")
 def get_history():
     """Get search history."""
@@ -385,17 +670,15 @@ def word_meta(word):
 
 @api.route("/dicts/<uuid>/toggle", methods=["POST"])
 def toggle_dict(uuid):
-    """Toggle a dictionary on/off."""
-    item = get_mdict().get(uuid)
+    """Toggle a dictionary on/off, also one whose index is still building."""
+    item = get_indexer().get(uuid)
     if not item:
         abort(404)
     item["enable"] = not item["enable"]
     helper.mdict_enable(uuid, item["enable"])
-
-    # Invalidate lookup_all cache (depends on which dicts are enabled)
-    cache = get_cache()
-    if cache:
-        cache.delete_prefix("la:")
+    suggest_index = get_suggest_index()
+    if suggest_index:
+        suggest_index.set_enabled(uuid, item["enable"])
 
     return jsonify({"uuid": uuid, "enabled": item["enable"]})
 
@@ -498,9 +781,24 @@ def check_word_in_wordbooks():
 def cache_info():
     """Get cache backend info and stats."""
     cache = get_cache()
-    if not cache:
-        return jsonify({"backend": "none"})
-    return jsonify(cache.info())
+    info = cache.info() if cache else {"backend": "none"}
+    block_cache = get_block_cache()
+    if block_cache:
+        info["record_blocks"] = block_cache.info()
+    return jsonify(info)
+
+
+@api.route("/stats/lookup")
+def lookup_stats():
+    """Per-dictionary lookup latency histograms, slowest dictionaries first."""
+    stats = []
+    for uuid, info in get_lookup_stats().info().items():
+        item = get_mdict().get(uuid)
+        info["uuid"] = uuid
+        info["title"] = item["title"] if item else uuid
+        stats.append(info)
+    stats.sort(key=lambda info: info["total_ms"], reverse=True)
+    return jsonify(stats)
 
 
 @api.route("/cache/clear", methods=["POST"])
@@ -509,4 +807,7 @@ def cache_clear():
     cache = get_cache()
     if cache:
         cache.clear()
+    block_cache = get_block_cache()
+    if block_cache:
+        block_cache.clear()
     return jsonify({"ok": True})
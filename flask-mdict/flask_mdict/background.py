@@ -0,0 +1,118 @@
+"""Background index builds for INDEX_BACKGROUND=1.
+
+init_mdict(background=True) does not build missing or outdated indexes
+before the server starts; those dictionaries get a stand-in item with
+status "building". BackgroundIndexer keeps the stand-ins out of
+Config.MDICT, so lookups never see a dictionary without an index, builds
+them in worker processes (the most used dictionaries first) and puts each
+one into Config.MDICT, at its place in the dictionary order, as soon as its
+index is ready.
+"""
+
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import Config
+from . import helper
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundIndexer:
+    def __init__(self, mdicts, workers=1):
+        # the order of all dictionaries, ready or not
+        self._order = list(mdicts)
+        self.building = {
+            uuid: item for uuid, item in mdicts.items() if item["status"] != "ready"
+        }
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ready_items(self, mdicts):
+        return {uuid: item for uuid, item in mdicts.items() if uuid not in self.building}
+
+    def all_items(self):
+        """All dictionaries in order, the ones still building as their stand-ins."""
+        # building shrinks only after Config.MDICT has the dictionary
+        building = self.building
+        mdicts = Config.MDICT
+        return [
+            mdicts.get(uuid) or building[uuid]
+            for uuid in self._order
+            if uuid in mdicts or uuid in building
+        ]
+
+    def get(self, uuid):
+        building = self.building
+        return Config.MDICT.get(uuid) or building.get(uuid)
+
+    def start(self, usage, suggest_index=None):
+        """Start building, usage is {uuid: count}, more used dictionaries go first."""
+        order = sorted(self.building, key=lambda uuid: -usage.get(uuid, 0))
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(order, suggest_index),
+            name="index-builder",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _run(self, order, suggest_index):
+        # one worker process at least, even with INDEX_WORKERS=0
+        workers = max(1, min(self._workers, len(order)))
+        logger.info(
+            "Build %d indexes in the background, %d at a time..." % (len(order), workers)
+        )
+        try:
+            self._build(order, workers, suggest_index)
+        except Exception as e:
+            logger.exception("Background index builds failed")
+            for item in self.building.values():
+                if item["status"] == "building":
+                    item["status"] = "error"
+                    item["error"] = str(e)
+        logger.info("--- MDict is Ready ---")
+
+    def _build(self, order, workers, suggest_index):
+        # worker processes keep the builds from holding the GIL of the server.
+        # They are spawned, not forked: forking this process, which already
+        # runs the server threads, could copy their held locks into the workers
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+            futures = {}
+            for uuid in order:
+                item = self.building[uuid]
+                future = executor.submit(helper.build_index, item["mdx_file"], item["index_dir"])
+                futures[future] = uuid
+            for count, future in enumerate(as_completed(futures), 1):
+                uuid = futures[future]
+                item = self.building[uuid]
+                err = helper.log_build(count, len(order), item["mdx_file"], future.result)
+                if err is None:
+                    try:
+                        self._ready(uuid, suggest_index)
+                    except Exception as e:
+                        logger.exception("Cannot open %s" % item["mdx_file"])
+                        err = e
+                if err is not None:
+                    item["status"] = "error"
+                    item["error"] = str(err)
+
+    def _ready(self, uuid, suggest_index):
+        stand_in = self.building[uuid]
+        item = helper.init_mdx(stand_in["mdx_file"], stand_in["enable"], stand_in["index_dir"])
+        with self._lock:
+            # the stand-in may have been toggled meanwhile
+            item["enable"] = stand_in["enable"]
+            mdicts = dict(Config.MDICT)
+            mdicts[uuid] = item
+            Config.MDICT = {uuid: mdicts[uuid] for uuid in self._order if uuid in mdicts}
+            # readers iterate building, replace it instead of changing it
+            building = dict(self.building)
+            del building[uuid]
+            self.building = building
+        if suggest_index:
+            suggest_index.add(uuid, item)
@@ -0,0 +1,103 @@
+"""Bloom filters over the folded headwords of an mdx dictionary.
+
+A dictionary whose filter does not contain fold_key(word) has no record
+for the word, with or without ignorecase, so a lookup can skip it before
+touching its index or its file. A false positive, about FP_RATE of the
+words a dictionary does not have, only costs the probe that would have
+happened anyway.
+
+IndexBuilder2 saves the filter next to the index (name.mdx.bloom). The
+bit positions are derived from blake2b instead of hash(), which is salted
+per process, so a saved filter stays valid.
+
+File layout: MAGIC, number of bits, number of hashes (uint64, little-
+endian), then the bits.
+
+Building sets the bits with NumPy when it is installed, which gives the
+same filter several times faster.
+"""
+
+import os
+import math
+import struct
+from hashlib import blake2b
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAGIC = b'MDXBLM1\n'
+FP_RATE = 0.01
+
+_header = struct.Struct('<8sQQ')
+# a digest is two 64-bit hashes, the second one is made odd for double hashing
+_digest = struct.Struct('<QQ')
+_MASK64 = (1 << 64) - 1
+
+
+def _digest_of(key):
+    return blake2b(key.encode('utf-8'), digest_size=_digest.size).digest()
+
+
+class BloomFilter:
+    def __init__(self, num_bits, num_hashes, bits=None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self._bits = bytearray((num_bits + 7) // 8) if bits is None else bits
+
+    @classmethod
+    def from_keys(cls, keys, fp_rate=FP_RATE):
+        """Filter of keys, folded keys in any order, with duplicates or not"""
+        digests = bytearray()
+        for key in keys:
+            digests += _digest_of(key)
+        n = max(len(digests) // _digest.size, 1)
+        num_bits = max(64, int(-n * math.log(fp_rate) / math.log(2) ** 2))
+        bloom = cls(num_bits, max(1, round(num_bits / n * math.log(2))))
+        if numpy is not None:
+            bloom._set_numpy(digests)
+            return bloom
+        bits = bloom._bits
+        for h1, h2 in _digest.iter_unpack(digests):
+            h2 |= 1
+            for i in range(bloom.num_hashes):
+                pos = ((h1 + i * h2) & _MASK64) % num_bits
+                bits[pos >> 3] |= 1 << (pos & 7)
+        return bloom
+
+    def _set_numpy(self, digests):
+        hashes = numpy.frombuffer(digests, dtype='<u8').reshape(-1, 2)
+        h1 = hashes[:, 0]
+        h2 = hashes[:, 1] | numpy.uint64(1)
+        flags = numpy.zeros(self.num_bits, dtype=bool)
+        for i in range(self.num_hashes):
+            # uint64 arithmetic wraps around like the & _MASK64 above
+            flags[(h1 + numpy.uint64(i) * h2) % numpy.uint64(self.num_bits)] = True
+        self._bits = bytearray(numpy.packbits(flags, bitorder='little').tobytes())
+
+    def __contains__(self, key):
+        h1, h2 = _digest.unpack(_digest_of(key))
+        h2 |= 1
+        bits = self._bits
+        for i in range(self.num_hashes):
+            pos = ((h1 + i * h2) & _MASK64) % self.num_bits
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def save(self, fname):
+        tmp_name = fname + '.tmp'
+        with open(tmp_name, 'wb') as f:
+            f.write(_header.pack(MAGIC, self.num_bits, self.num_hashes))
+            f.write(self._bits)
+        os.replace(tmp_name, fname)
+
+    @classmethod
+    def load(cls, fname):
+        with open(fname, 'rb') as f:
+            data = f.read()
+        magic, num_bits, num_hashes = _header.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('%s is not a bloom filter' % fname)
+        return cls(num_bits, num_hashes, data[_header.size:])
@@ -26,6 +26,15 @@ class BaseCache(ABC):
     def set(self, key, value, ttl=None):
         """Set a cached value. ttl in seconds, None = no expiry."""
 
+    def get_many(self, keys):
+        """Get many cached values at once, a list with None for every miss."""
+        return [self.get(key) for key in keys]
+
+    def set_many(self, mapping, ttl=None):
+        """Set many cached values at once, mapping is {key: value}."""
+        for key, value in mapping.items():
+            self.set(key, value, ttl)
+
     @abstractmethod
     def delete_prefix(self, prefix):
         """Delete all keys matching a prefix."""
@@ -58,6 +67,14 @@ class MemoryCache(BaseCache):
         with self._lock:
             self._cache[key] = value
 
+    def get_many(self, keys):
+        with self._lock:
+            return [self._cache.get(key) for key in keys]
+
+    def set_many(self, mapping, ttl=None):
+        with self._lock:
+            self._cache.update(mapping)
+
     def delete_prefix(self, prefix):
         with self._lock:
             keys = [k for k in self._cache if k.startswith(prefix)]
@@ -104,6 +121,25 @@ class ValkeyCache(BaseCache):
         else:
             self._client.set(key, data)
 
+    def get_many(self, keys):
+        # one round trip for all keys
+        if not keys:
+            return []
+        return [
+            json.loads(data) if data is not None else None
+            for data in self._client.mget(keys)
+        ]
+
+    def set_many(self, mapping, ttl=None):
+        pipe = self._client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            data = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+            if ttl:
+                pipe.setex(key, ttl, data)
+            else:
+                pipe.set(key, data)
+        pipe.execute()
+
     def delete_prefix(self, prefix):
         cursor = 0
         while True:
@@ -126,10 +162,70 @@ class ValkeyCache(BaseCache):
         }
 
 
-def init_cache():
+class BlockCache:
+    """Thread-safe, byte-size-aware LRU of decompressed MDX/MDD record blocks.
+
+    Keys are ``(file name, file_pos)``; values are the decompressed block bytes.
+    The cache is shared by every dictionary, so ``maxbytes`` bounds the total
+    memory used for record blocks regardless of how many dictionaries are loaded.
+    """
+
+    def __init__(self, maxbytes=64 * 1024 * 1024):
+        from cachetools import LRUCache
+
+        self._cache = LRUCache(maxsize=maxbytes, getsizeof=len)
+        self._lock = threading.Lock()
+        self._maxbytes = maxbytes
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            block = self._cache.get(key)
+            if block is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return block
+
+    def set(self, key, block):
+        # a block larger than the whole cache would evict everything and then fail
+        if len(block) > self._maxbytes:
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            count = len(self._cache)
+            self._cache[key] = block
+            self._evictions += count + 1 - len(self._cache)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def info(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "maxbytes": self._maxbytes,
+                "currbytes": self._cache.currsize,
+                "blocks": len(self._cache),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def init_cache(num_dicts=1):
     """Initialize cache backend based on environment.
 
     Priority: REDIS_URL env var → fallback to in-memory LRU.
+
+    Entries are rendered fragments of one word in one dictionary, so the
+    in-memory LRU holds CACHE_SIZE (default 4096) words per dictionary:
+    CACHE_SIZE x num_dicts entries.
     """
     redis_url = os.environ.get("REDIS_URL")
     if redis_url:
@@ -143,7 +239,20 @@ def init_cache():
                 " * Valkey unavailable (%s), falling back to memory cache" % e
             )
 
-    maxsize = int(os.environ.get("CACHE_SIZE", "4096"))
+    maxsize = int(os.environ.get("CACHE_SIZE", "4096")) * max(num_dicts, 1)
     cache = MemoryCache(maxsize=maxsize)
     logger.info(" * Cache: in-memory LRU (maxsize=%d)" % maxsize)
     return cache
+
+
+def init_block_cache():
+    """Initialize the shared record block cache.
+
+    Size comes from BLOCK_CACHE_MB (default 64), 0 disables the cache.
+    """
+    maxbytes = int(float(os.environ.get("BLOCK_CACHE_MB", "64")) * 1024 * 1024)
+    if maxbytes <= 0:
+        logger.info(" * Record block cache: disabled")
+        return None
+    logger.info(" * Record block cache: %d MB" % (maxbytes // (1024 * 1024)))
+    return BlockCache(maxbytes=maxbytes)
@@ -0,0 +1,297 @@
+"""Compact binary index for INDEX_BACKEND=compact.
+
+The SQLite MDX_INDEX table repeats the position, sizes and compression
+type of a record block in the row of every key stored in it, and its
+B-tree plus key_index take about three times the size of the data. A
+compact index stores every record block once, in a block table, and per
+key only (block id, start, end) of its record within the decompressed
+block.
+
+The keys are sorted by their folded form (see fold_key), then by row
+order. The folded keys are front-coded in buckets of BUCKET_SIZE: the
+first one of a bucket is stored whole, the others as the number of
+leading bytes shared with the previous one plus the rest, followed by the
+key itself when it differs from its folded form. A lookup is a binary
+search over the first folded keys of the buckets followed by a scan of
+one or a few buckets, comparing UTF-8 bytes, on a read-only mmap of the
+file; no SQLite is involved.
+
+Records of the same key keep the order they were written in (the rowid
+order of MDX_INDEX). keys() returns all keys sorted, in the order SQLite
+lists them through key_index. like() decodes only the range of folded
+keys a pattern starting with ASCII text can match.
+
+File layout, little-endian, every section aligned to 8 bytes:
+
+    header     MAGIC, num_blocks, num_keys, num_buckets, BUCKET_SIZE
+    blocks     file_pos, compressed_size, decompressed_size,
+               record_block_type, offset: five uint64 arrays of num_blocks
+    keys       block id, record start, record end: three uint32 arrays
+    order      uint32 array, positions of the keys sorted by key text
+    buckets    uint64 array of num_buckets + 1 offsets into the key data
+    key data   per key: shared prefix (uint8), suffix size (uint16), key
+               size (uint16, 0 if the key is its folded form), suffix, key
+"""
+
+import os
+import re
+import mmap
+import struct
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from .word_query.mdict_query import fold_key
+from .wildcard import like_regex, like_prefix
+
+MAGIC = b'MDXIDX1\n'
+BUCKET_SIZE = 8
+
+_header = struct.Struct('<8sQQQQ')
+_key_head = struct.Struct('<BHH')
+_ascii_text = re.compile(r'[\x00-\x7f]*')
+
+# per ASCII character, the first and last character of the folded forms of
+# the precomposed characters made of it plus combining marks, see
+# CompactIndex._prefixed; all of them are in the BMP
+_composed = None
+
+
+def _composed_range(ch):
+    """(first, last) folded character ch followed by combining marks can
+    fold to, None when there is none
+    """
+    global _composed
+    if _composed is None:
+        composed = {}
+        for code in range(0x80, 0x10000):
+            char = chr(code)
+            decomposition = unicodedata.decomposition(char)
+            if not decomposition or decomposition.startswith('<'):
+                continue
+            base = unicodedata.normalize('NFD', char)[0]
+            folded = char.casefold()[0]
+            if base.isascii() and not folded.isascii():
+                composed.setdefault(base.lower(), []).append(folded)
+        _composed = {base: (min(chars), max(chars)) for base, chars in composed.items()}
+    return _composed.get(ch)
+
+
+def _aligned(data):
+    return data + b'\0' * (-len(data) % 8)
+
+
+def write_compact_index(fname, rows):
+    """Write the compact index of rows, MDX_INDEX rows in rowid order.
+
+    The file is written next to fname and moved over it when complete.
+    """
+    block_ids = {}
+    blocks = [array('Q') for _ in range(5)]
+    key_blocks = array('I')
+    key_starts = array('I')
+    key_ends = array('I')
+    keys = []
+    folds = []
+    for (key_text, file_pos, compressed_size, decompressed_size, record_block_type,
+         record_start, record_end, offset, key_fold) in rows:
+        block_id = block_ids.get(file_pos)
+        if block_id is None:
+            block_id = block_ids[file_pos] = len(block_ids)
+            for column, value in zip(blocks, (file_pos, compressed_size, decompressed_size,
+                                              record_block_type, offset)):
+                column.append(value)
+        key_blocks.append(block_id)
+        key_starts.append(record_start - offset)
+        key_ends.append(record_end - offset)
+        keys.append(key_text)
+        folds.append(key_fold)
+
+    # stable, keys with the same folded form stay in row order
+    sorted_keys = sorted(range(len(keys)), key=folds.__getitem__)
+    positions = array('I', bytes(4 * len(keys)))
+    for position, n in enumerate(sorted_keys):
+        positions[n] = position
+    # sorted like the BINARY collation of SQLite
+    order = array('I', (positions[n] for n in sorted(range(len(keys)), key=keys.__getitem__)))
+    del positions
+
+    bucket_pos = array('Q')
+    key_data = bytearray()
+    previous = b''
+    for position, n in enumerate(sorted_keys):
+        fold = folds[n].encode('utf-8')
+        key = keys[n]
+        key = b'' if key == folds[n] else key.encode('utf-8')
+        shared = 0
+        if position % BUCKET_SIZE == 0:
+            bucket_pos.append(len(key_data))
+        else:
+            limit = min(len(fold), len(previous), 255)
+            while shared < limit and fold[shared] == previous[shared]:
+                shared += 1
+        key_data += _key_head.pack(shared, len(fold) - shared, len(key))
+        key_data += fold[shared:]
+        key_data += key
+        previous = fold
+    bucket_pos.append(len(key_data))
+
+    sections = [_header.pack(MAGIC, len(block_ids), len(keys), len(bucket_pos) - 1, BUCKET_SIZE)]
+    sections.extend(column.tobytes() for column in blocks)
+    for column in (key_blocks, key_starts, key_ends):
+        sections.append(array('I', (column[n] for n in sorted_keys)).tobytes())
+    sections.append(order.tobytes())
+    sections.append(bucket_pos.tobytes())
+    sections.append(bytes(key_data))
+
+    tmp_name = fname + '.tmp'
+    with open(tmp_name, 'wb') as f:
+        for data in sections:
+            f.write(_aligned(data))
+    os.replace(tmp_name, fname)
+
+
+class CompactIndex:
+    """Read-only view on a compact index file, safe to share between threads."""
+
+    def __init__(self, fname):
+        with open(fname, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        magic, num_blocks, num_keys, num_buckets, self._bucket_size = _header.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError('%s is not a compact index' % fname)
+        pos = _header.size
+
+        def section(fmt, count):
+            nonlocal pos
+            size = struct.calcsize(fmt) * count
+            data = view[pos:pos + size].cast(fmt)
+            pos += size + (-size % 8)
+            return data
+
+        (self._file_pos, self._compressed_size, self._decompressed_size,
+         self._record_block_type, self._offset) = [section('Q', num_blocks) for _ in range(5)]
+        self._blocks = section('I', num_keys)
+        self._starts = section('I', num_keys)
+        self._ends = section('I', num_keys)
+        self._order = section('I', num_keys)
+        self._bucket_pos = section('Q', num_buckets + 1)
+        self._key_data = view[pos:]
+        self._num_keys = num_keys
+        # first folded key of every bucket, what the binary search runs on
+        self._heads = [self._head(i) for i in range(num_buckets)]
+
+    def __len__(self):
+        return self._num_keys
+
+    def _head(self, i):
+        """First folded key of bucket i, stored whole"""
+        pos = self._bucket_pos[i]
+        _, size, _ = _key_head.unpack_from(self._key_data, pos)
+        pos += _key_head.size
+        return bytes(self._key_data[pos:pos + size])
+
+    def _scan(self, position):
+        """(position, folded key, key) from the bucket of position on, the
+        keys as UTF-8 bytes, empty for a key that is its folded form
+        """
+        data = self._key_data
+        unpack_from = _key_head.unpack_from
+        head_size = _key_head.size
+        i = position // self._bucket_size
+        position = i * self._bucket_size
+        pos = self._bucket_pos[i]
+        fold = b''
+        while position < self._num_keys:
+            shared, size, key_size = unpack_from(data, pos)
+            pos += head_size
+            fold = fold[:shared] + data[pos:pos + size]
+            pos += size
+            yield position, fold, data[pos:pos + key_size]
+            pos += key_size
+            position += 1
+
+    def _index(self, position):
+        block = self._blocks[position]
+        offset = self._offset[block]
+        return {
+            'file_pos': self._file_pos[block],
+            'compressed_size': self._compressed_size[block],
+            'decompressed_size': self._decompressed_size[block],
+            'record_block_type': self._record_block_type[block],
+            'record_start': offset + self._starts[position],
+            'record_end': offset + self._ends[position],
+            'offset': offset,
+        }
+
+    def _find(self, key_fold):
+        """(position, key) of every key whose folded form is key_fold, in row order"""
+        target = key_fold.encode('utf-8')
+        # the first match may be at the end of the bucket before the first
+        # head >= key_fold
+        i = max(bisect_left(self._heads, target) - 1, 0)
+        found = []
+        for position, fold, key in self._scan(i * self._bucket_size):
+            if fold == target:
+                found.append((position, str(key, 'utf-8') if key else key_fold))
+            elif fold > target:
+                break
+        return found
+
+    def lookup(self, keyword, ignorecase=None):
+        """Index dicts (as IndexBuilder2._row_to_index) of the records of keyword"""
+        return [index for _, index in self.lookup_ranked(keyword, ignorecase)]
+
+    def lookup_ranked(self, keyword, ignorecase=None):
+        """(rank, index dict) of the records of keyword, ranks are in row order"""
+        found = self._find(fold_key(keyword))
+        if not ignorecase:
+            found = [(position, key) for position, key in found if key == keyword]
+        return [(position, self._index(position)) for position, _ in found]
+
+    def keys(self):
+        """All keys, sorted"""
+        sorted_keys = [str(key or fold, 'utf-8') for _, fold, key in self._scan(0)]
+        return [sorted_keys[position] for position in self._order]
+
+    def folds(self):
+        """The folded form of every key, in sort order"""
+        return (str(fold, 'utf-8') for _, fold, _ in self._scan(0))
+
+    def _between(self, start, end):
+        """Keys whose folded form is >= start and < end"""
+        start = start.encode('utf-8')
+        end = end.encode('utf-8')
+        i = max(bisect_left(self._heads, start) - 1, 0)
+        for _, fold, key in self._scan(i * self._bucket_size):
+            if fold >= end:
+                break
+            if fold >= start:
+                yield str(key or fold, 'utf-8')
+
+    def _prefixed(self, prefix):
+        """Keys a LIKE pattern starting with prefix, ASCII text, can match:
+        the keys whose folded form starts with the lowercase prefix, and
+        those where a combining mark after the last character of prefix
+        made a precomposed character of it
+        """
+        prefix = prefix.lower()
+        head, last = prefix[:-1], prefix[-1]
+        keys = list(self._between(prefix, head + chr(ord(last) + 1)))
+        composed = _composed_range(last)
+        if composed:
+            first, final = composed
+            keys.extend(self._between(head + first, head + chr(ord(final) + 1)))
+        return keys
+
+    def like(self, pattern):
+        """Keys matching the SQLite LIKE pattern, sorted. A pattern starting
+        with ASCII text only decodes the keys in the range of its folded
+        form, the others every key.
+        """
+        match = like_regex(pattern).fullmatch
+        prefix = _ascii_text.match(like_prefix(pattern)).group()
+        if not prefix:
+            return [key for key in self.keys() if match(key)]
+        return sorted(key for key in self._prefixed(prefix) if match(key))
@@ -11,6 +11,8 @@ class DBDict(object):
     _db_name = None
     _meta = None
     is_mdd = False
+    # bound parameters per statement, SQLite < 3.32 allows at most 999
+    MAX_SQL_VARIABLES = 900
 
     def __init__(self, db_name):
         if not os.path.exists(db_name):
@@ -91,6 +93,26 @@ class DBDict(object):
             record.append(value)
         return record
 
+    def mdx_lookup_many(self, conn, words, ignorecase=True):
+        """Lookup many words with one query per chunk, returns {word: [record, ...]}."""
+        lookup_result = {word: [] for word in words}
+        probes = {}
+        for word in lookup_result:
+            probes.setdefault(word.lower() if ignorecase else word, []).append(word)
+        column = 'lower(entry)' if ignorecase else 'entry'
+        probe_keys = list(probes)
+        for i in range(0, len(probe_keys), self.MAX_SQL_VARIABLES):
+            chunk = probe_keys[i:i + self.MAX_SQL_VARIABLES]
+            sql = 'SELECT %s AS probe, paraphrase FROM mdx WHERE %s IN (%s) ORDER BY rowid' % (
+                column, column, ','.join('?' * len(chunk)))
+            for row in conn.execute(sql, chunk).fetchall():
+                value = row['paraphrase']
+                if self._meta['zip']:
+                    value = zlib.decompress(value).decode(self._meta['encoding'])
+                for word in probes[row['probe']]:
+                    lookup_result[word].append(value)
+        return lookup_result
+
     def mdd_lookup(self, conn, word, ignorecase=True):
         if not self._is_mdd:
             return []
@@ -0,0 +1,148 @@
+"""Full-text search over the records of mdx dictionaries.
+
+The full-text index of a dictionary is an optional SQLite FTS5 database
+next to its index db (name.mdx.fts.db), built offline with
+tools/build_fulltext.py. /api/fulltext searches the ones that exist.
+
+The records are read block by block through the header-only index pass
+(see readmdict2.Index.iter_index), their tags stripped, and inserted in
+batches of blocks. The number of blocks done is committed with every
+batch, so an interrupted build resumes at the next block, and only one
+batch of records is in memory at a time. The build writes
+name.mdx.fts.db.part and moves it over name.mdx.fts.db when complete, the
+server never sees a partial index.
+"""
+
+import os
+import re
+import html
+import sqlite3
+from itertools import groupby
+from operator import itemgetter
+
+from .word_query.readmdict2 import MDX, INDEX_FIELDS
+from .pool import connection_pool
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+BATCH_BLOCKS = 32
+# bm25 weights of the headword and record columns
+WEIGHTS = (5.0, 1.0)
+# deepest result /api/fulltext pages reach, every dictionary ranks its
+# best hits up to the end of the page
+MAX_RESULTS = 1000
+
+# snippet() marks the matches with these, <mark> once the text is escaped
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+
+regex_drop = re.compile(r"<(style|script)\b.*?</\1\s*>", re.DOTALL | re.IGNORECASE)
+regex_tag = re.compile(r"<[^>]+?>")
+regex_space = re.compile(r"\s+")
+
+
+def record_text(record):
+    """Plain text of a record: no tags, styles or scripts, entities decoded"""
+    text = regex_drop.sub(" ", record)
+    text = regex_tag.sub(" ", text)
+    return regex_space.sub(" ", html.unescape(text)).strip()
+
+
+def _record_rows(query, f, rows):
+    """(headword, text) of the records of one block, links left out"""
+    index = dict(zip(INDEX_FIELDS, rows[0]))
+    record_block = query.get_record_block(f, index)
+    for key_text, *_, record_start, record_end, offset in rows:
+        record = query.decode_record(record_block[record_start - offset:record_end - offset])
+        if not record.startswith("@@@LINK="):
+            yield key_text, record_text(record)
+
+
+def build_fulltext(query, fname, tokenizer=TOKENIZER, batch_blocks=BATCH_BLOCKS, progress=None):
+    """Build the full-text index fname of query, an IndexBuilder2, or resume
+    an interrupted build of it. progress(blocks, records) is called after
+    every batch with the totals so far.
+    """
+    part_name = fname + ".part"
+    m_time = "%s" % os.path.getmtime(query._mdx_file)
+    conn = sqlite3.connect(part_name)
+    conn.execute("CREATE TABLE IF NOT EXISTS META (key text PRIMARY KEY, value text)")
+    meta = dict(conn.execute("SELECT key, value FROM META"))
+    if meta.get("m_time") != m_time or meta.get("tokenizer") != tokenizer:
+        # a new build, or the dictionary changed since the interrupted one
+        conn.execute("DROP TABLE IF EXISTS fulltext")
+        conn.execute(
+            "CREATE VIRTUAL TABLE fulltext USING fts5(key_text, content, tokenize='%s')"
+            % tokenizer.replace("'", "''")
+        )
+        meta = {"m_time": m_time, "tokenizer": tokenizer, "blocks": "0", "records": "0"}
+        conn.executemany("INSERT OR REPLACE INTO META VALUES (?,?)", meta.items())
+        conn.commit()
+    done = int(meta["blocks"])
+    records = int(meta["records"])
+
+    def commit(batch, blocks):
+        nonlocal records
+        conn.executemany("INSERT INTO fulltext (key_text, content) VALUES (?,?)", batch)
+        records += len(batch)
+        conn.executemany(
+            "UPDATE META SET value = ? WHERE key = ?",
+            [(str(blocks), "blocks"), (str(records), "records")],
+        )
+        conn.commit()
+        if progress:
+            progress(blocks, records)
+
+    mdx = MDX(query._mdx_file)
+    batch = []
+    blocks = 0
+    with open(query._mdx_file, "rb") as f:
+        # the rows of a block are consecutive, skipped blocks are never read
+        rows_by_block = groupby(mdx.iter_index(check_block=False), itemgetter(1))
+        for blocks, (_, rows) in enumerate(rows_by_block, 1):
+            if blocks <= done:
+                continue
+            batch.extend(_record_rows(query, f, list(rows)))
+            if blocks % batch_blocks == 0:
+                commit(batch, blocks)
+                batch = []
+    commit(batch, blocks)
+    conn.execute("INSERT INTO fulltext (fulltext) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+    os.replace(part_name, fname)
+
+
+def _marked(snippet):
+    return html.escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+def match_query(text):
+    """FTS5 query matching records with all words of text, a trailing *
+    matches a prefix. Every word is quoted, so no syntax reaches FTS5.
+    """
+    terms = []
+    for word in text.split():
+        prefix = "*" if word.endswith("*") else ""
+        word = word.rstrip("*")
+        if word:
+            terms.append('"%s"%s' % (word.replace('"', '""'), prefix))
+    return " ".join(terms)
+
+
+def search_fulltext(fname, match, limit):
+    """Number of records matching the FTS5 query match, and (score, headword,
+    snippet) of the best limit of them, lower scores first. The snippets
+    are HTML, matches in <mark>.
+    """
+    with connection_pool.connection(fname) as conn:
+        total = conn.execute(
+            "SELECT count(*) FROM fulltext WHERE fulltext MATCH ?", (match,)
+        ).fetchone()[0]
+        cursor = conn.execute(
+            "SELECT bm25(fulltext, ?, ?) AS score, key_text,"
+            " snippet(fulltext, 1, ?, ?, '…', 24) FROM fulltext"
+            " WHERE fulltext MATCH ? ORDER BY score LIMIT ?",
+            WEIGHTS + (_MARK_START, _MARK_END, match, limit),
+        )
+        hits = [(score, key_text, _marked(snippet)) for score, key_text, snippet in cursor]
+    return total, hits
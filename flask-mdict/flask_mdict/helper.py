@@ -1,11 +1,15 @@
 import re
 import sys
+import time
 import uuid
 import os.path
 import sqlite3
 import datetime
 import csv
 import logging
+from collections import Counter
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from importlib import import_module
 
 from flask import url_for
@@ -91,6 +95,24 @@ def ecdict_random_word(tag):
     return row["word"]
 
 
+def ecdict_frequencies(words):
+    """{word: (bnc, frq)} of the words found in ecdict, their BNC and COCA
+    frequency ranks (0 when unranked).
+    """
+    db = get_db("wfd_db")
+    if not db:
+        return {}
+    words = list(words)
+    frequencies = {}
+    # stay below the SQLite limit of variables per statement
+    for n in range(0, len(words), 500):
+        chunk = words[n:n + 500]
+        sql = "SELECT word, bnc, frq FROM ecdict WHERE word IN (%s)" % ",".join("?" * len(chunk))
+        for row in db.execute(sql, chunk):
+            frequencies[row["word"]] = (row["bnc"] or 0, row["frq"] or 0)
+    return frequencies
+
+
 def query_word_meta(word):
     TAGs = {
         "zk": "中考",
@@ -164,6 +186,10 @@ def init_flask_mdict():
         db.execute(sql)
         db.commit()
 
+    # lookups answered per dictionary, to build the most used indexes first
+    sql = "CREATE TABLE IF NOT EXISTS dict_usage(uuid TEXT PRIMARY KEY, count INT, last_time DATETIME);"
+    db.execute(sql)
+
     # wordbook
     sql = "CREATE TABLE IF NOT EXISTS wordbook(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP);"
     db.execute(sql)
@@ -206,7 +232,8 @@ def mdict_enable(uuid, value=None):
             return True
 
 
-def add_history(word):
+def add_history(word, uuids=()):
+    """Record a looked up word, and a use of every dictionary in uuids that had it."""
     db = get_db("app_db")
     if not db:
         logger.error("no app db")
@@ -215,9 +242,18 @@ def add_history(word):
     c = db.cursor()
     sql = "INSERT INTO history (word, count, last_time) VALUES(?, 1, ?) ON CONFLICT(word) DO UPDATE SET count = count + 1, last_time = ?;"
     c.execute(sql, (word, now, now))
+    sql = "INSERT INTO dict_usage (uuid, count, last_time) VALUES(?, 1, ?) ON CONFLICT(uuid) DO UPDATE SET count = count + 1, last_time = ?;"
+    c.executemany(sql, [(uuid, now, now) for uuid in uuids])
     db.commit()
 
 
+def get_dict_usage():
+    """{dictionary uuid: number of lookups it answered}"""
+    with sqlite3.connect(Config.DB_NAMES["app_db"]) as conn:
+        rows = conn.execute("SELECT uuid, count FROM dict_usage;")
+        return dict(rows.fetchall())
+
+
 def get_history(max_num=500):
     db = get_db("app_db")
     if not db:
@@ -256,7 +292,156 @@ def export_history(sio):
     return sio
 
 
-def init_mdict(mdict_dir, index_dir=None):
+def _dict_uuid(fname):
+    return str(uuid.uuid3(uuid.NAMESPACE_URL, fname.replace("\\", "/"))).upper()
+
+
+def _mdict_index_dir(index_dir, dict_uuid):
+    if not index_dir:
+        return None
+    mdict_index_dir = os.path.join(index_dir, dict_uuid)
+    if not os.path.exists(mdict_index_dir):
+        os.makedirs(mdict_index_dir)
+    return mdict_index_dir
+
+
+def build_index(mdx_file, index_dir):
+    """Open mdx_file, which builds its missing or outdated index files"""
+    start = time.time()
+    IndexBuilder2(mdx_file, index_dir=index_dir)
+    return time.time() - start
+
+
+def log_build(count, total, mdx_file, build):
+    """Run build and log its progress, returns the exception if it failed"""
+    try:
+        elapsed = build()
+    except Exception as err:
+        logger.error("\t[%d/%d] %s: %s" % (count, total, os.path.basename(mdx_file), err))
+        return err
+    logger.info("\t[%d/%d] %s (%.1fs)" % (count, total, os.path.basename(mdx_file), elapsed))
+
+
+def build_indexes(builds, workers=1):
+    """Build the indexes of (mdx_file, index_dir) pairs, in parallel processes with workers > 1.
+
+    Every build writes the .db files of its own dictionary. A failed build
+    is only logged here, opening the dictionary afterwards tries again.
+    """
+    if not builds:
+        return
+    workers = min(workers, len(builds))
+    logger.info("Build %d indexes, %d at a time..." % (len(builds), workers))
+    start = time.time()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(build_index, mdx_file, mdict_index_dir): mdx_file
+                for mdx_file, mdict_index_dir in builds
+            }
+            for count, future in enumerate(as_completed(futures), 1):
+                log_build(count, len(builds), futures[future], future.result)
+    else:
+        for count, (mdx_file, mdict_index_dir) in enumerate(builds, 1):
+            log_build(
+                count, len(builds), mdx_file,
+                partial(build_index, mdx_file, mdict_index_dir),
+            )
+    logger.info("Built %d indexes in %.1fs" % (len(builds), time.time() - start))
+
+
+def _find_logo(root, name):
+    logo = "logo.ico"
+    for ext in ["ico", ".jpg", ".png"]:
+        if os.path.exists(os.path.join(root, name + ext)):
+            logo = name + ext
+            break
+    return logo
+
+
+def init_mdx(mdx_file, enable, index_dir=None):
+    """Open an mdx dictionary, building its index if needed, and describe it."""
+    root, fname = os.path.split(mdx_file)
+    name = os.path.splitext(fname)[0]
+    idx = IndexBuilder2(mdx_file, index_dir=index_dir)
+    if not idx._title or idx._title == "Title (No HTML code allowed)":
+        title = name
+    else:
+        title = idx._title
+        title = regex_tag.sub(" ", title)
+
+    abouts = []
+    abouts.append("<ul>")
+    abouts.append("<li>%s</li>" % os.path.basename(idx._mdx_file))
+    logger.info("\t+ %s" % os.path.basename(idx._mdx_file))
+    for mdd in idx._mdd_files:
+        abouts.append("<li>%s</li>" % os.path.basename(mdd))
+        logger.info("\t+ %s" % os.path.basename(mdd))
+    abouts.append("</ul><hr />")
+    if (
+        idx._description
+        == "<font size=5 color=red>Paste the description of this product in HTML source code format here</font>"
+    ):
+        text = ""
+    else:
+        text = fix_html(idx._description)
+    about_html = os.path.join(root, "about_%s.html" % name)
+    if not os.path.exists(about_html):
+        with open(about_html, "wt", encoding="utf-8") as f:
+            f.write(text)
+    if False:
+        text = regex_style.sub("", text)
+        text = regex_ln.sub("\n", text)
+        text = regex_tag.sub(" ", text)
+        text = [t for t in [t.strip() for t in text.split("\n")] if t]
+        abouts.append("<p>" + "<br />\n".join(text) + "</p>")
+    else:
+        abouts.append(text)
+    about = "\n".join(abouts)
+    return {
+        "title": title,
+        "uuid": _dict_uuid(mdx_file),
+        "logo": _find_logo(root, name),
+        "about": about,
+        "root_path": root,
+        "query": idx,
+        "cache": {},
+        "type": "mdict",
+        "error": "",
+        "enable": enable,
+        "status": "ready",
+    }
+
+
+def _building_mdx(mdx_file, enable, index_dir=None):
+    """Stand-in for an mdx dictionary whose index is built in the background."""
+    root, fname = os.path.split(mdx_file)
+    name = os.path.splitext(fname)[0]
+    return {
+        "title": name,
+        "uuid": _dict_uuid(mdx_file),
+        "logo": _find_logo(root, name),
+        "about": "",
+        "root_path": root,
+        "query": None,
+        "cache": {},
+        "type": "mdict",
+        "error": "",
+        "enable": enable,
+        "status": "building",
+        "mdx_file": mdx_file,
+        "index_dir": index_dir,
+    }
+
+
+def init_mdict(mdict_dir, index_dir=None, index_workers=1, background=False):
+    """Find the dictionaries under mdict_dir.
+
+    Missing or outdated indexes are built first, in index_workers
+    processes. With background, they are not built here: those
+    dictionaries get an item with status "building" instead, to be built
+    by a BackgroundIndexer.
+    """
     mdicts = {}
     db_names = {}
     mdict_setting = {}
@@ -264,6 +449,20 @@ def init_mdict(mdict_dir, index_dir=None):
         rows = conn.execute("SELECT name, value FROM setting;")
         for row in rows:
             mdict_setting[row[0]] = row[1] == "1"
+    # build what is missing first, every dictionary in its own process
+    index_builds = []
+    for root, dirs, files in os.walk(mdict_dir, followlinks=True):
+        for fname in files:
+            if fname.endswith(".mdx"):
+                mdx_file = os.path.join(root, fname)
+                mdict_index_dir = _mdict_index_dir(index_dir, _dict_uuid(mdx_file))
+                if IndexBuilder2.needs_build(mdx_file, mdict_index_dir):
+                    index_builds.append((mdx_file, mdict_index_dir))
+    if background:
+        building = set(mdx_file for mdx_file, _ in index_builds)
+    else:
+        building = set()
+        build_indexes(index_builds, index_workers)
     for root, dirs, files in os.walk(mdict_dir, followlinks=True):
         for fname in files:
             if (
@@ -276,9 +475,7 @@ def init_mdict(mdict_dir, index_dir=None):
                 if not d.is_ok():
                     continue
                 # mdict db
-                dict_uuid = str(
-                    uuid.uuid3(uuid.NAMESPACE_URL, db_file.replace("\\", "/"))
-                ).upper()
+                dict_uuid = _dict_uuid(db_file)
                 name = os.path.splitext(fname)[0]
                 enable = mdict_setting.get(dict_uuid, True)
                 logger.info(
@@ -288,16 +485,11 @@ def init_mdict(mdict_dir, index_dir=None):
                 logger.info("\tfind %s:mdx" % fname)
                 if d.is_mdd():
                     logger.info("\tfind %s:mdd" % fname)
-                logo = "logo.ico"
-                for ext in ["ico", ".jpg", ".png"]:
-                    if os.path.exists(os.path.join(root, name + ext)):
-                        logo = name + ext
-                        break
                 db_names[dict_uuid] = db_file
                 mdicts[dict_uuid] = {
                     "title": d.title(),
                     "uuid": dict_uuid,
-                    "logo": logo,
+                    "logo": _find_logo(root, name),
                     "about": d.about(),
                     "root_path": root,
                     "query": d,
@@ -305,77 +497,25 @@ def init_mdict(mdict_dir, index_dir=None):
                     "type": "mdict_db",
                     "error": "",
                     "enable": enable,
+                    "status": "ready",
                 }
             elif fname.endswith(".mdx"):
                 name = os.path.splitext(fname)[0]
-                logo = "logo.ico"
-                for ext in ["ico", ".jpg", ".png"]:
-                    if os.path.exists(os.path.join(root, name + ext)):
-                        logo = name + ext
-                        break
                 mdx_file = os.path.join(root, fname)
-                dict_uuid = str(
-                    uuid.uuid3(uuid.NAMESPACE_URL, mdx_file.replace("\\", "/"))
-                ).upper()
+                dict_uuid = _dict_uuid(mdx_file)
                 enable = mdict_setting.get(dict_uuid, True)
+                mdict_index_dir = _mdict_index_dir(index_dir, dict_uuid)
+                if mdx_file in building:
+                    logger.info(
+                        'Index MDICT "%s" {%s} in the background...' % (name, dict_uuid)
+                    )
+                    mdicts[dict_uuid] = _building_mdx(mdx_file, enable, mdict_index_dir)
+                    continue
                 logger.info(
                     'Initialize MDICT "%s" {%s} [%s]...'
                     % (name, dict_uuid, "Enable" if enable else "Disable")
                 )
-
-                if index_dir:
-                    mdict_index_dir = os.path.join(index_dir, dict_uuid)
-                    if not os.path.exists(mdict_index_dir):
-                        os.makedirs(mdict_index_dir)
-                else:
-                    mdict_index_dir = None
-                idx = IndexBuilder2(mdx_file, index_dir=mdict_index_dir)
-                if not idx._title or idx._title == "Title (No HTML code allowed)":
-                    title = name
-                else:
-                    title = idx._title
-                    title = regex_tag.sub(" ", title)
-
-                abouts = []
-                abouts.append("<ul>")
-                abouts.append("<li>%s</li>" % os.path.basename(idx._mdx_file))
-                logger.info("\t+ %s" % os.path.basename(idx._mdx_file))
-                for mdd in idx._mdd_files:
-                    abouts.append("<li>%s</li>" % os.path.basename(mdd))
-                    logger.info("\t+ %s" % os.path.basename(mdd))
-                abouts.append("</ul><hr />")
-                if (
-                    idx._description
-                    == "<font size=5 color=red>Paste the description of this product in HTML source code format here</font>"
-                ):
-                    text = ""
-                else:
-                    text = fix_html(idx._description)
-                about_html = os.path.join(root, "about_%s.html" % name)
-                if not os.path.exists(about_html):
-                    with open(about_html, "wt", encoding="utf-8") as f:
-                        f.write(text)
-                if False:
-                    text = regex_style.sub("", text)
-                    text = regex_ln.sub("\n", text)
-                    text = regex_tag.sub(" ", text)
-                    text = [t for t in [t.strip() for t in text.split("\n")] if t]
-                    abouts.append("<p>" + "<br />\n".join(text) + "</p>")
-                else:
-                    abouts.append(text)
-                about = "\n".join(abouts)
-                mdicts[dict_uuid] = {
-                    "title": title,
-                    "uuid": dict_uuid,
-                    "logo": logo,
-                    "about": about,
-                    "root_path": root,
-                    "query": idx,
-                    "cache": {},
-                    "type": "mdict",
-                    "error": "",
-                    "enable": enable,
-                }
+                mdicts[dict_uuid] = init_mdx(mdx_file, enable, mdict_index_dir)
 
     init_plugins(mdicts, mdict_setting, db_names)
 
@@ -399,6 +539,7 @@ def init_plugins(mdicts, mdict_setting, db_names):
             config = module.init()
             if config["enable"]:
                 config["plugins_dir"] = plugins_dir
+                config["status"] = "ready"
                 dict_uuid = config["uuid"]
                 mdicts[dict_uuid] = config
                 enable = mdict_setting.get(dict_uuid, False)
@@ -437,24 +578,42 @@ regex_opened_tag = re.compile(r"<([a-z]+)(?: .*?)?>", re.DOTALL | re.IGNORECASE)
 regex_closed_tag = re.compile(r"</([a-z]+)>", re.IGNORECASE)
 
 
+# void elements, never closed
+single_tags = frozenset(["img", "link", "input", "br", "hr", "p", "meta"])
+
+
 def fix_html(html_data):
-    opened_tags = regex_opened_tag.findall(html_data)
-    closed_tags = regex_closed_tag.findall(html_data)
-    opened_tags = [tag.lower() for tag in opened_tags]
-    closed_tags = [tag.lower() for tag in closed_tags]
-    # remove single tag
-    for tag in ["img", "link", "input", "br", "hr", "p", "meta"]:
-        while tag in opened_tags:
-            opened_tags.remove(tag)
-        while tag in closed_tags:
-            closed_tags.remove(tag)
+    """Balance the tags of a record.
+
+    Missing closing tags are appended, innermost first, and opening tags for
+    unmatched closing tags are prepended. The last opened tags of a name are
+    matched with the first closing tags of that name.
+    """
+    opened_tags = [
+        tag
+        for tag in map(str.lower, regex_opened_tag.findall(html_data))
+        if tag not in single_tags
+    ]
+    closed_tags = [
+        tag
+        for tag in map(str.lower, regex_closed_tag.findall(html_data))
+        if tag not in single_tags
+    ]
     if len(opened_tags) == len(closed_tags):
         return html_data
-    for tag in opened_tags[::-1]:
-        if tag in closed_tags:
-            closed_tags.remove(tag)
+    unmatched = Counter(closed_tags)
+    matched = Counter()
+    suffix = []
+    for tag in reversed(opened_tags):
+        if unmatched[tag]:
+            unmatched[tag] -= 1
+            matched[tag] += 1
         else:
-            html_data += "</%s>" % tag
+            suffix.append("</%s>" % tag)
+    prefix = []
     for tag in closed_tags:
-        html_data = "<%s>" % tag + html_data
-    return html_data
+        if matched[tag]:
+            matched[tag] -= 1
+        else:
+            prefix.append("<%s>" % tag)
+    return "".join(reversed(prefix)) + html_data + "".join(suffix)
@@ -4,8 +4,20 @@ import sqlite3
 import re
 import os.path
 import ast
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, nullcontext
 
-from .word_query.mdict_query import IndexBuilder
+from .word_query.mdict_query import IndexBuilder, fold_key
+from .word_query.readmdict2 import MDX, MDD
+from .pool import file_pool, connection_pool
+from .compact_index import CompactIndex, write_compact_index
+from .bloom import BloomFilter
+from .wildcard import WildcardIndex
+
+logger = logging.getLogger(__name__)
 
 version = '1.2'
 
@@ -13,6 +25,27 @@ version = '1.2'
 class IndexBuilder2(IndexBuilder):
     _mdd_files = None
     _index_dir = None
+    # headword filter, see bloom
+    _bloom = None
+    # index of the mdx keys for wildcard searches, built on first use, see
+    # wildcard. The builds of all dictionaries share one thread, so only
+    # one key list is in memory at a time; a failed build is retried by a
+    # query after WILDCARD_RETRY seconds
+    _wildcard = None
+    _wildcard_future = None
+    _wildcard_failed = 0
+    wildcard_error = None
+    _wildcard_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='wildcard')
+    WILDCARD_RETRY = 300
+    # decompressed record blocks shared by all instances, see cache.BlockCache
+    block_cache = None
+    # bound parameters per statement, SQLite < 3.32 allows at most 999
+    MAX_SQL_VARIABLES = 900
+    # INDEX_BACKEND, where the index rows go: "sqlite" keeps them in the
+    # MDX_INDEX table of the .db file, "compact" in a compact index file
+    # next to it (see compact_index) and the .db file only has META
+    INDEX_BACKENDS = ('sqlite', 'compact')
+    index_backend = os.environ.get('INDEX_BACKEND', 'sqlite')
 
     def __init__(self, fname, encoding="", passcode=None,
                  force_rebuild=False, enable_history=False,
@@ -27,6 +60,8 @@ class IndexBuilder2(IndexBuilder):
         self._description = ''
         self._sql_index = sql_index
         self._check = check
+        self._compact_indexes = {}
+        self._wildcard_lock = threading.Lock()
 
         dirname = os.path.dirname(self._mdx_file)
         basename = os.path.basename(self._mdx_file)
@@ -35,15 +70,9 @@ class IndexBuilder2(IndexBuilder):
         self._index_dir = index_dir or dirname
         self._mdx_db = self.get_index_db(self._mdx_file, self._index_dir)
 
-        self._mdd_files = []
+        self._mdd_files = self.find_mdd_files(self._mdx_file)
         if os.path.isfile(os.path.join(dirname, name + '.mdd')):
             self._mdd_file = os.path.join(dirname, name + '.mdd')
-            self._mdd_files.append(self._mdd_file)
-        regex_mdd = re.compile(r'^(.+?)\..+?\.mdd$')
-        for fname in os.listdir(dirname):
-            m = regex_mdd.match(fname)
-            if m and m.group(1) == name:
-                self._mdd_files.append(os.path.join(dirname, fname))
 
         if force_rebuild or self.is_update(self._mdx_file, self._index_dir):
             self._make_mdx_index(self.get_index_db(self._mdx_file, self._index_dir))
@@ -68,6 +97,8 @@ class IndexBuilder2(IndexBuilder):
             cursor = conn.execute("SELECT * FROM META WHERE key = \"description\"")
             for cc in cursor:
                 self._description = cc[1]
+            conn.close()
+            self.upgrade_index(self._mdx_db)
 
         if self._mdd_file and self.is_update(self._mdd_file, self._index_dir):
             self._mdd_db = self.get_index_db(self._mdd_file, self._index_dir)
@@ -83,6 +114,32 @@ class IndexBuilder2(IndexBuilder):
                     mdd_file
                 )
 
+        for mdd_file in self._mdd_files:
+            self.upgrade_index(self.get_index_db(mdd_file, self._index_dir))
+
+        self._bloom = self._load_bloom()
+
+    @staticmethod
+    def find_mdd_files(mdx_file):
+        """ name.mdd first if it exists, then name.*.mdd """
+        dirname = os.path.dirname(mdx_file)
+        name, _ = os.path.splitext(os.path.basename(mdx_file))
+        mdd_files = []
+        if os.path.isfile(os.path.join(dirname, name + '.mdd')):
+            mdd_files.append(os.path.join(dirname, name + '.mdd'))
+        regex_mdd = re.compile(r'^(.+?)\..+?\.mdd$')
+        for fname in os.listdir(dirname):
+            m = regex_mdd.match(fname)
+            if m and m.group(1) == name:
+                mdd_files.append(os.path.join(dirname, fname))
+        return mdd_files
+
+    @classmethod
+    def needs_build(cls, mdx_file, index_dir=None):
+        """ whether opening mdx_file builds the index of it or of one of its mdd files """
+        return any(cls.is_update(fname, index_dir)
+                   for fname in [mdx_file] + cls.find_mdd_files(mdx_file))
+
     @classmethod
     def get_index_db(cls, mdx_file, index_dir=None):
         if index_dir:
@@ -102,29 +159,108 @@ class IndexBuilder2(IndexBuilder):
 
         conn = sqlite3.connect(db_name)
         c = conn.cursor()
-        c.execute('SELECT * FROM META where key = "m_time"')
+        c.execute('SELECT * FROM META where key IN ("m_time", "index_backend")')
         row = dict(c.fetchall())
         conn.close()
         if not row or m_time != row['m_time']:
             return True
+        # built by the other backend, indexes without index_backend are sqlite ones
+        if row.get('index_backend', 'sqlite') != cls.index_backend:
+            return True
+        if cls.index_backend == 'compact' and not os.path.isfile(cls.get_compact_index(db_name)):
+            return True
 
-    def _make_mdx_index(self, db_name):
-        super(IndexBuilder2, self)._make_mdx_index(db_name)
+    @staticmethod
+    def get_compact_index(db_name):
+        """ the compact index file of an index db, name.mdx.db -> name.mdx.idx """
+        return os.path.splitext(db_name)[0] + '.idx'
+
+    @staticmethod
+    def get_bloom_file(db_name):
+        """ the bloom filter file of an index db, name.mdx.db -> name.mdx.bloom """
+        return os.path.splitext(db_name)[0] + '.bloom'
+
+    @staticmethod
+    def get_fulltext_db(db_name):
+        """ the full-text index of an index db, name.mdx.db -> name.mdx.fts.db """
+        return os.path.splitext(db_name)[0] + '.fts.db'
 
+    def _key_folds(self):
+        if self.index_backend == 'compact':
+            yield from self._compact(self._mdx_db).folds()
+            return
+        with closing(sqlite3.connect(self._mdx_db)) as conn:
+            for row in conn.execute('SELECT key_fold FROM MDX_INDEX'):
+                yield row[0]
+
+    def _load_bloom(self):
+        """ the bloom filter of the mdx keys, built from the index when it is
+            missing or older than the index
+        """
+        bloom_file = self.get_bloom_file(self._mdx_db)
+        if (os.path.isfile(bloom_file)
+                and os.path.getmtime(bloom_file) >= os.path.getmtime(self._mdx_db)):
+            return BloomFilter.load(bloom_file)
+        bloom = BloomFilter.from_keys(self._key_folds())
+        bloom.save(bloom_file)
+        return bloom
+
+    def may_contain(self, keyword):
+        """ False when no key of the mdx folds like keyword, whatever ignorecase is """
+        return self._bloom is None or fold_key(keyword) in self._bloom
+
+    @staticmethod
+    def upgrade_index(db_name):
+        """ add the case-folded key column to an index built before it existed """
+        conn = sqlite3.connect(db_name)
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(MDX_INDEX)')]
+        # no MDX_INDEX table with the compact backend
+        if columns and 'key_fold' not in columns:
+            conn.create_function('fold_key', 1, fold_key, deterministic=True)
+            conn.execute('ALTER TABLE MDX_INDEX ADD COLUMN key_fold text')
+            conn.execute('UPDATE MDX_INDEX SET key_fold = fold_key(key_text)')
+            conn.execute('CREATE INDEX key_fold_index ON MDX_INDEX (key_fold)')
+            conn.commit()
+        conn.close()
+
+    def _mdx_index_rows(self, rows):
+        """ also index the keys with punctuation replaced by spaces, after all others """
         pattern = '[%s ]' % string.punctuation.replace('@', '')
         regex_strip = re.compile(pattern)
 
-        conn = sqlite3.connect(db_name)
-        c = conn.cursor()
         fix_keys = []
-        for row in c.execute('SELECT * FROM MDX_INDEX').fetchall():
+        for row in super(IndexBuilder2, self)._mdx_index_rows(rows):
+            yield row
             fix_key = regex_strip.sub(' ', row[0].strip())
             if fix_key != row[0]:
-                fix_keys.append((fix_key,) + row[1:])
-        c.executemany('INSERT INTO MDX_INDEX VALUES (?,?,?,?,?,?,?,?)', fix_keys)
-        conn.commit()
+                fix_keys.append((fix_key,) + row[1:8] + (fold_key(fix_key),))
+        yield from fix_keys
+
+    def _make_mdx_index(self, db_name):
+        compact_index = self.get_compact_index(db_name)
+        if self.index_backend == 'compact':
+            if os.path.exists(db_name):
+                os.remove(db_name)
+            mdx = MDX(self._mdx_file)
+            self._mdx_db = db_name
+            write_compact_index(
+                compact_index,
+                self._mdx_index_rows(mdx.iter_index(check_block=self._check)),
+            )
+            conn = sqlite3.connect(db_name)
+            self._write_meta(conn.cursor(), mdx.get_meta())
+            conn.commit()
+            conn.close()
+        else:
+            super(IndexBuilder2, self)._make_mdx_index(db_name)
+            if os.path.exists(compact_index):
+                os.remove(compact_index)
+
+        conn = sqlite3.connect(db_name)
+        c = conn.cursor()
         m_time = '%s' % os.path.getmtime(self._mdx_file)
-        c.execute('INSERT INTO META VALUES (?,?)', ('m_time', m_time))
+        c.executemany('INSERT INTO META VALUES (?,?)',
+                      [('m_time', m_time), ('index_backend', self.index_backend)])
         conn.commit()
         conn.close()
 
@@ -139,88 +275,252 @@ class IndexBuilder2(IndexBuilder):
             # second mdd
             self._mdd_file = mdd_name
         m_time = '%s' % os.path.getmtime(self._mdd_file)
-        super(IndexBuilder2, self)._make_mdd_index(db_name)
+        compact_index = self.get_compact_index(db_name)
+        if self.index_backend == 'compact':
+            mdd = MDD(self._mdd_file)
+            write_compact_index(
+                compact_index,
+                self._fold_rows(mdd.iter_index(check_block=self._check)),
+            )
+        else:
+            super(IndexBuilder2, self)._make_mdd_index(db_name)
+            if os.path.exists(compact_index):
+                os.remove(compact_index)
         self._mdd_file = old_mdd_file
 
         conn = sqlite3.connect(db_name)
         c = conn.cursor()
         c.execute('''CREATE TABLE META (key text, value text)''')
         conn.commit()
-        c.execute('INSERT INTO META VALUES (?,?)', ('m_time', m_time))
+        c.executemany('INSERT INTO META VALUES (?,?)',
+                      [('m_time', m_time), ('index_backend', self.index_backend)])
         conn.commit()
         conn.close()
 
+    @classmethod
+    def get_record_block(cls, fmdx, index):
+        block_cache = cls.block_cache
+        # stored blocks cost no decompression, serve them straight from the file
+        if block_cache is None or index['record_block_type'] == 0:
+            return super(IndexBuilder2, cls).get_record_block(fmdx, index)
+        key = (fmdx.name, index['file_pos'])
+        record_block = block_cache.get(key)
+        if record_block is None:
+            record_block = super(IndexBuilder2, cls).get_record_block(fmdx, index)
+            block_cache.set(key, record_block)
+        return record_block
+
+    def _compact(self, db_name):
+        """ the CompactIndex of an index db, opened on first use """
+        index = self._compact_indexes.get(db_name)
+        if index is None:
+            index = CompactIndex(self.get_compact_index(db_name))
+            self._compact_indexes[db_name] = index
+        return index
+
+    @staticmethod
+    def _connection(conn, db):
+        """Use the caller's connection when given, otherwise a pooled one."""
+        if conn is not None:
+            return nullcontext(conn)
+        return connection_pool.connection(db)
+
     @staticmethod
-    def lookup_indexes(db, keyword, ignorecase=None):
+    def lookup_indexes(conn, keyword, ignorecase=None):
         indexes = []
-        with sqlite3.connect(db) as conn:
-            if ignorecase:
-                sql = 'SELECT * FROM MDX_INDEX WHERE lower(key_text) = ?'
-                cursor = conn.execute(sql, (keyword.lower(), ))
-            else:
-                sql = 'SELECT * FROM MDX_INDEX WHERE key_text = ?'
-                cursor = conn.execute(sql, (keyword, ))
-
-            for result in cursor:
-                index = {}
-                index['file_pos'] = result[1]
-                index['compressed_size'] = result[2]
-                index['decompressed_size'] = result[3]
-                index['record_block_type'] = result[4]
-                index['record_start'] = result[5]
-                index['record_end'] = result[6]
-                index['offset'] = result[7]
-                indexes.append(index)
+        if ignorecase:
+            sql = 'SELECT * FROM MDX_INDEX WHERE key_fold = ?'
+            cursor = conn.execute(sql, (fold_key(keyword), ))
+        else:
+            sql = 'SELECT * FROM MDX_INDEX WHERE key_text = ?'
+            cursor = conn.execute(sql, (keyword, ))
+
+        for result in cursor:
+            indexes.append(IndexBuilder2._row_to_index(result))
         return indexes
 
+    @staticmethod
+    def _row_to_index(result):
+        index = {}
+        index['file_pos'] = result[1]
+        index['compressed_size'] = result[2]
+        index['decompressed_size'] = result[3]
+        index['record_block_type'] = result[4]
+        index['record_start'] = result[5]
+        index['record_end'] = result[6]
+        index['offset'] = result[7]
+        return index
+
     def mdx_lookup(self, conn, keyword, ignorecase=None):
-        if not os.path.exists(self._mdx_db):
+        if not self.may_contain(keyword) or not os.path.exists(self._mdx_db):
             return []
         # return super(IndexBuilder2, self).mdx_lookup(keyword, ignorecase)
         # super mdx_lookup code
         lookup_result_list = []
-        indexes = self.lookup_indexes(self._mdx_db, keyword, ignorecase)
-        with open(self._mdx_file, 'rb') as mdx_file:
+        if self.index_backend == 'compact':
+            indexes = self._compact(self._mdx_db).lookup(keyword, ignorecase)
+        else:
+            with self._connection(conn, self._mdx_db) as conn:
+                indexes = self.lookup_indexes(conn, keyword, ignorecase)
+        with file_pool.open(self._mdx_file) as mdx_file:
             for index in indexes:
                 lookup_result_list.append(self.get_mdx_by_index(mdx_file, index))
         return lookup_result_list
 
+    def mdx_lookup_many(self, conn, keywords, ignorecase=None):
+        """Lookup many keywords at once, returns {keyword: [record, ...]}.
+
+        The sqlite index is probed with one `IN (...)` query per chunk of
+        keywords, the compact one once per keyword, and the hits are read
+        in file order, so every record block is read and decompressed once
+        per call however many keywords it holds. Records of one keyword
+        keep the order of mdx_lookup.
+        """
+        lookup_result = {keyword: [] for keyword in keywords}
+        if not keywords or not os.path.exists(self._mdx_db):
+            return lookup_result
+        probes = {}
+        for keyword in filter(self.may_contain, lookup_result):
+            probes.setdefault(fold_key(keyword) if ignorecase else keyword, []).append(keyword)
+
+        # (rank, probe, index), ranks keep the order of mdx_lookup
+        found = []
+        if self.index_backend == 'compact':
+            compact = self._compact(self._mdx_db)
+            for probe, probe_keywords in probes.items():
+                for rank, index in compact.lookup_ranked(probe_keywords[0], ignorecase):
+                    found.append((rank, probe, index))
+        else:
+            column = 'key_fold' if ignorecase else 'key_text'
+            # column 9 is key_fold, shifted by one for the rowid
+            probe_column = 9 if ignorecase else 1
+            probe_keys = list(probes)
+            with self._connection(conn, self._mdx_db) as conn:
+                for i in range(0, len(probe_keys), self.MAX_SQL_VARIABLES):
+                    chunk = probe_keys[i:i + self.MAX_SQL_VARIABLES]
+                    sql = 'SELECT rowid, * FROM MDX_INDEX WHERE %s IN (%s)' % (
+                        column, ','.join('?' * len(chunk)))
+                    for row in conn.execute(sql, chunk):
+                        found.append((row[0], row[probe_column], self._row_to_index(row[1:])))
+
+        hits = []
+        with file_pool.open(self._mdx_file) as mdx_file:
+            block_pos = record_block = None
+            for rank, probe, index in sorted(
+                    found, key=lambda hit: (hit[2]['file_pos'], hit[2]['record_start'])):
+                if index['file_pos'] != block_pos:
+                    block_pos = index['file_pos']
+                    record_block = self.get_record_block(mdx_file, index)
+                data = record_block[index['record_start'] - index['offset']:
+                                    index['record_end'] - index['offset']]
+                hits.append((rank, probe, self.decode_record(data)))
+
+        for _, probe, record in sorted(hits, key=lambda hit: hit[0]):
+            for keyword in probes[probe]:
+                lookup_result[keyword].append(record)
+        return lookup_result
+
     def mdd_lookup(self, conn, keyword, ignorecase=None):
         """ MDD is resource file, should always return one file """
         for mdd_file in self._mdd_files:
             mdd_db = self.get_index_db(mdd_file, self._index_dir)
             if not os.path.exists(mdd_db):
                 continue
-            indexes = self.lookup_indexes(mdd_db, keyword, ignorecase)
+            if self.index_backend == 'compact':
+                indexes = self._compact(mdd_db).lookup(keyword, ignorecase)
+            else:
+                # conn belongs to the mdx index, mdd indexes always come from the pool
+                with connection_pool.connection(mdd_db) as mdd_conn:
+                    indexes = self.lookup_indexes(mdd_conn, keyword, ignorecase)
             if indexes:
-                with open(mdd_file, 'rb') as mdd_fobj:
+                with file_pool.open(mdd_file) as mdd_fobj:
                     return self.get_mdd_by_index(mdd_fobj, indexes[0])
 
     @staticmethod
-    def get_keys(db, query=''):
-        if not db:
-            return []
-        with sqlite3.connect(db) as conn:
-            if query:
-                if '*' in query:
-                    query = query.replace('*', '%')
-                else:
-                    query = query + '%'
-                sql = 'SELECT key_text FROM MDX_INDEX WHERE key_text LIKE ?;'
-                cursor = conn.execute(sql, (query,))
-            else:
-                sql = 'SELECT key_text FROM MDX_INDEX;'
-                cursor = conn.execute(sql)
+    def _like_pattern(query):
+        if '*' in query:
+            return query.replace('*', '%')
+        return query + '%'
+
+    @staticmethod
+    def get_keys(conn, query=''):
+        if query:
+            query = IndexBuilder2._like_pattern(query)
+            sql = 'SELECT key_text FROM MDX_INDEX WHERE key_text LIKE ?;'
+            cursor = conn.execute(sql, (query,))
+        else:
+            sql = 'SELECT key_text FROM MDX_INDEX;'
+            cursor = conn.execute(sql)
 
-            keys = [item[0] for item in cursor]
-            return keys
+        keys = [item[0] for item in cursor]
+        return keys
+
+    def _get_compact_keys(self, db_name, query=''):
+        compact = self._compact(db_name)
+        if query:
+            return compact.like(self._like_pattern(query))
+        return compact.keys()
+
+    @staticmethod
+    def _is_wildcard(query):
+        """ a leading or inner *, which LIKE can only answer by a full scan """
+        return '*' in query.rstrip('*')
+
+    def _build_wildcard(self):
+        try:
+            self._wildcard = WildcardIndex(self.get_mdx_keys(None))
+            self.wildcard_error = None
+        except Exception as err:
+            logger.exception('Cannot build the wildcard index of %s' % self._mdx_file)
+            self.wildcard_error = str(err)
+            self._wildcard_failed = time.monotonic()
+
+    def _wildcard_index(self):
+        """ the WildcardIndex of the mdx keys, None until it is built, the
+            first call (or the first after a failed build) queues building it
+        """
+        with self._wildcard_lock:
+            future = self._wildcard_future
+            if future is None or (
+                    future.done() and self.wildcard_error
+                    and time.monotonic() - self._wildcard_failed >= self.WILDCARD_RETRY):
+                self.wildcard_error = None
+                self._wildcard_future = self._wildcard_executor.submit(self._build_wildcard)
+        return self._wildcard
+
+    @property
+    def wildcard_status(self):
+        """ state of the wildcard index: None (not needed yet), "building",
+            "ready" or "error"
+        """
+        if self._wildcard is not None:
+            return 'ready'
+        if self._wildcard_future is None:
+            return None
+        return 'error' if self.wildcard_error else 'building'
 
     def get_mdx_keys(self, conn, query=''):
-        return self.get_keys(self._mdx_db, query)
+        if not os.path.exists(self._mdx_db):
+            return []
+        if query and self._is_wildcard(query):
+            wildcard = self._wildcard_index()
+            keys = wildcard.like(self._like_pattern(query)) if wildcard else None
+            if keys is not None:
+                return keys
+        if self.index_backend == 'compact':
+            return self._get_compact_keys(self._mdx_db, query)
+        with self._connection(conn, self._mdx_db) as conn:
+            return self.get_keys(conn, query)
 
     def get_mdd_keys(self, conn, query=''):
         keys = []
         for mdd_file in self._mdd_files:
             mdd_db = self.get_index_db(mdd_file, self._index_dir)
-            keys.extend(self.get_keys(mdd_db, query))
+            if not os.path.exists(mdd_db):
+                continue
+            if self.index_backend == 'compact':
+                keys.extend(self._get_compact_keys(mdd_db, query))
+                continue
+            with connection_pool.connection(mdd_db) as mdd_conn:
+                keys.extend(self.get_keys(mdd_conn, query))
         return keys
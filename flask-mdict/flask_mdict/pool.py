@@ -0,0 +1,202 @@
+"""Long-lived, thread-safe readers for MDX/MDD files and their indexes.
+
+Every lookup used to open() the dictionary file, read one record block and
+close it again. FilePool keeps one descriptor per file for the life of the
+process and serves positional reads (pread) from it, so concurrent lookups
+share the descriptor without seeking it. A file that is replaced on disk
+(different inode, size or mtime) is reopened on the next check.
+
+With MDICT_MMAP=1 the files are memory-mapped instead and reads return
+memoryview slices of the mapping, so record blocks reach the decompressor
+(and stored blocks / MDD resources reach the response) without being
+copied into intermediate bytes objects.
+
+ConnectionPool does the same for the SQLite index databases (.mdx.db,
+.mdd.db): read-only connections are kept and handed out per lookup instead
+of connecting on every query, which also keeps each connection's prepared
+statement cache warm.
+"""
+
+import os
+import mmap
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+logger = logging.getLogger(__name__)
+
+
+class _Handle:
+    """One open descriptor plus the stat identity it was opened with."""
+
+    def __init__(self, fname, ident, use_mmap=False):
+        self.name = fname
+        self.ident = ident
+        self.size = ident[3]
+        self.checked = time.monotonic()
+        # unbuffered, the descriptor is closed when the last reader drops it
+        self._file = open(fname, "rb", buffering=0)
+        self._fd = self._file.fileno()
+        self._lock = threading.Lock()
+        # the mapping stays alive as long as any slice handed out refers to it
+        self._map = None
+        if use_mmap and self.size:
+            self._map = memoryview(mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ))
+
+    def pread(self, size, pos):
+        if size < 0:
+            size = max(self.size - pos, 0)
+        if self._map is not None:
+            return self._map[pos:pos + size]
+        if hasattr(os, "pread"):
+            return os.pread(self._fd, size, pos)
+        # no positional read on Windows, serialize seek + read instead
+        with self._lock:
+            self._file.seek(pos)
+            return self._file.read(size)
+
+
+class PooledFile:
+    """File-like view on a pooled descriptor with its own read position.
+
+    Supports the subset of the file API used by the index readers
+    (seek/tell/read and the context manager protocol). close() does not
+    close the shared descriptor. In mmap mode read() returns a read-only
+    memoryview instead of bytes.
+    """
+
+    def __init__(self, handle):
+        self._handle = handle
+        self._pos = 0
+        self.name = handle.name
+
+    def seek(self, pos, whence=0):
+        if whence == 1:
+            pos += self._pos
+        elif whence == 2:
+            pos += self._handle.size
+        self._pos = pos
+        return pos
+
+    def tell(self):
+        return self._pos
+
+    def read(self, size=-1):
+        data = self._handle.pread(size, self._pos)
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FilePool:
+    """Per-process pool of read-only file descriptors keyed by file name."""
+
+    def __init__(self, check_interval=2.0, use_mmap=False):
+        # seconds between stat() checks for a replaced file
+        self._check_interval = check_interval
+        self.use_mmap = use_mmap
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def open(self, fname):
+        return PooledFile(self._get(fname))
+
+    def _get(self, fname):
+        handle = self._handles.get(fname)
+        if handle is not None and time.monotonic() - handle.checked < self._check_interval:
+            return handle
+        with self._lock:
+            handle = self._handles.get(fname)
+            st = os.stat(fname)
+            ident = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+            if handle is None or handle.ident != ident:
+                handle = _Handle(fname, ident, self.use_mmap)
+                self._handles[fname] = handle
+            else:
+                handle.checked = time.monotonic()
+            return handle
+
+
+class ConnectionPool:
+    """Bounded pool of read-only SQLite connections per index database.
+
+    Connections are opened with immutable=1 and query_only, so SQLite skips
+    file locking and change detection. The pool does that itself instead:
+    a database that is replaced on disk (rebuilt index) gets a new identity
+    and its old connections are dropped.
+    """
+
+    def __init__(self, max_idle=8, check_interval=2.0, cached_statements=64):
+        # idle connections kept per database, extra ones are closed on release
+        self._max_idle = max_idle
+        self._check_interval = check_interval
+        self._cached_statements = cached_statements
+        self._idle = {}
+        self._idents = {}
+        self._lock = threading.Lock()
+
+    def _ident(self, db):
+        now = time.monotonic()
+        ident, checked = self._idents.get(db, (None, 0))
+        if now - checked >= self._check_interval:
+            st = os.stat(db)
+            ident = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+            self._idents[db] = (ident, now)
+        return ident
+
+    def _connect(self, db):
+        uri = "file:%s?mode=ro&immutable=1" % pathname2url(os.path.abspath(db))
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self._cached_statements,
+        )
+        conn.execute("PRAGMA query_only = ON;")
+        return conn
+
+    @contextmanager
+    def connection(self, db):
+        with self._lock:
+            ident = self._ident(db)
+            idle = self._idle.setdefault(db, [])
+            entry = None
+            while idle:
+                entry = idle.pop()
+                if entry[0] == ident:
+                    break
+                entry[1].close()
+                entry = None
+        if entry is None:
+            entry = (ident, self._connect(db))
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                idle = self._idle.setdefault(db, [])
+                if entry[0] == self._idents[db][0] and len(idle) < self._max_idle:
+                    idle.append(entry)
+                else:
+                    entry[1].close()
+
+
+# shared by every IndexBuilder2 instance
+file_pool = FilePool()
+connection_pool = ConnectionPool()
+
+
+def init_file_pool():
+    """Configure the shared pool, MDICT_MMAP=1 enables memory-mapped reads."""
+    file_pool.use_mmap = os.environ.get("MDICT_MMAP", "").lower() in ("1", "true", "yes")
+    logger.info(" * Dictionary file reader: %s" % ("mmap" if file_pool.use_mmap else "pread"))
@@ -0,0 +1,183 @@
+"""Single-pass rewriting of resource and entry links in dictionary records.
+
+The query views used to run a chain of regular expression substitutions
+over every record, one per kind of link, each copying the whole record:
+
+    [ "]src="...       -> prefixed with the resource url (leading / or
+                          file:/// dropped, data: urls left alone)
+    [ "]href="...      -> prefixed with the resource url, unless http(s)://,
+                          sound://, entry:// or #anchor
+    [ "]href="...../"  -> the first /" or /' after the href loses its /
+    href="sound://..." -> data-sound-url="<resource url>/..." added
+    href="entry://..." -> data-entry-word / data-entry-url added
+    <link ... href="   -> data-href, for every record but the first
+    <script ... src="  -> data-src, for every record but the last
+
+RecordRewriter does all of them while scanning the record once. As with
+the regular expressions, an attribute value ends at the first quote of
+either kind and never spans lines. The output is the same as the chain's
+for any record without empty attribute values.
+"""
+
+import re
+
+# one token per rewritten attribute, plus the tags whose attributes get renamed
+_regex_token = re.compile(r"""<(?:link|script)|[ "](?:src|href)=["']""")
+_regex_value_end = re.compile(r"""["'\n]""")
+_regex_end_slash = re.compile(r"""/["']|\n""")
+
+
+def _value_end(record, start):
+    """Index of the quote closing a `.+?["']` match at start, -1 if there is none.
+
+    As in the regular expressions, the value takes at least one character,
+    which may be a quote itself, and does not span lines.
+    """
+    if start >= len(record) or record[start] == "\n":
+        return -1
+    mo = _regex_value_end.search(record, start + 1)
+    if mo is None or mo.group() == "\n":
+        return -1
+    return mo.start()
+
+
+class RecordRewriter:
+    """Rewrites the records of one dictionary.
+
+    prefix_resource is the url of the dictionary's resources, "/" and the
+    resource name are appended to it. With mark_links, sound:// and entry://
+    links get a data-sound-url and a data-entry-word attribute, or
+    data-entry-url when entry_url (the url the entry word is appended to)
+    is given.
+    """
+
+    def __init__(self, prefix_resource, mark_links=True, entry_url=None):
+        self.prefix_resource = prefix_resource + "/"
+        self.mark_links = mark_links
+        if entry_url is None:
+            self._entry_attr = ' data-entry-word="'
+        else:
+            self._entry_attr = ' data-entry-url="%s' % entry_url
+
+    def rewrite(self, record, keep_css=True, keep_js=True):
+        """Rewrite one record.
+
+        keep_css=False renames the href of <link> tags to data-href and
+        keep_js=False the src of <script> tags to data-src.
+        """
+        parts = []
+        # copied up to pos
+        pos = 0
+        # every rule skips the tokens inside its previous match, like re.sub
+        src_until = href_until = slash_until = mark_until = 0
+        # the trailing-slash rule matches from an href up to the first /" or
+        # /' on the line, which need not be in that href's own value
+        slash = -1
+        # the <link / <script tag waiting for its attribute, by its line end
+        pending = {"link": None, "script": None}
+        line_end = -1
+        prefix_resource = self.prefix_resource
+
+        for mo in _regex_token.finditer(record):
+            token = mo.group()
+            start = mo.start()
+            if start > line_end:
+                line_end = record.find("\n", start)
+                if line_end < 0:
+                    line_end = len(record)
+            if token[0] == "<":
+                tag = "link" if token[1] == "l" else "script"
+                # the regex matches from the first tag on the line
+                if pending[tag] != line_end:
+                    pending[tag] = line_end
+                continue
+
+            value = mo.end()
+            # characters dropped at the start of the value, text inserted there
+            skip = 0
+            prefix = ""
+            before = ""
+
+            if token[1] == "s":
+                if start >= src_until:
+                    if record.startswith("/", value):
+                        skips = (1, 0)
+                    elif record.startswith("file:///", value):
+                        skips = (8, 0)
+                    else:
+                        skips = (0,)
+                    for skip in skips:
+                        if record.startswith("data:", value + skip):
+                            continue
+                        end = _value_end(record, value + skip)
+                        if end >= 0:
+                            prefix = prefix_resource
+                            src_until = end + 1
+                            break
+                    else:
+                        skip = 0
+                keep, tag = keep_js, "script"
+            else:
+                if start >= slash_until:
+                    # drop the previous slash before looking for the next one
+                    if pos <= slash < start:
+                        parts.append(record[pos:slash])
+                        pos = slash + 1
+                    found = _regex_end_slash.search(record, value + 1)
+                    if found is None:
+                        slash_until = len(record)
+                    elif found.group() == "\n":
+                        # no match on the rest of this line
+                        slash_until = found.start()
+                    elif record[value] != "\n":
+                        slash = found.start()
+                        slash_until = found.end()
+
+                if record.startswith(("sound://", "entry://"), value):
+                    # this rule sees the text after the slash is dropped
+                    first = value + 8 if slash != value + 8 else value + 9
+                    if self.mark_links and start >= mark_until and record[first:first + 1] not in ("#", ""):
+                        end = _value_end(record, first + 1 if slash != first + 1 else first + 2)
+                        if end >= 0:
+                            rest = record[value + 8:end + 1]
+                            if value + 8 <= slash <= end:
+                                rest = rest[:slash - value - 8] + rest[slash - value - 7:]
+                            if record[value] == "s":
+                                before = ' data-sound-url="%s%s" ' % (prefix_resource, rest)
+                            else:
+                                before = '%s%s" ' % (self._entry_attr, rest)
+                            mark_until = end + 1
+                elif (start >= href_until and record[value:value + 1] not in ("#", "")
+                        and not record.startswith(("http://", "https://"), value)):
+                    end = _value_end(record, value + 1)
+                    if end >= 0:
+                        prefix = prefix_resource
+                        href_until = end + 1
+                keep, tag = keep_css, "link"
+
+            rename = False
+            if pending[tag] is not None and token[0] == " " and token[-1] == '"':
+                rename = pending[tag] == line_end and not keep
+                pending[tag] = None
+
+            if not (prefix or before or rename):
+                continue
+            if pos <= slash < start:
+                parts.append(record[pos:slash])
+                pos = slash + 1
+            parts.append(record[pos:start])
+            parts.append(before)
+            if rename:
+                parts.append(" data-" + token[1:])
+            else:
+                parts.append(token)
+            parts.append(prefix)
+            pos = value + skip
+
+        if pos <= slash:
+            parts.append(record[pos:slash])
+            pos = slash + 1
+        if not parts:
+            return record
+        parts.append(record[pos:])
+        return "".join(parts)
@@ -0,0 +1,64 @@
+"""Per-dictionary lookup latency histograms."""
+
+import threading
+from bisect import bisect_left
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram, bucket bounds in milliseconds."""
+
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self):
+        # one extra bucket for everything slower than the last bound
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.timeouts = 0
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect_left(self.BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def info(self):
+        return {
+            "count": self.count,
+            "timeouts": self.timeouts,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            # counts[i] is the number of lookups <= bounds_ms[i], the last one is unbounded
+            "bounds_ms": list(self.BUCKETS_MS),
+            "counts": list(self.counts),
+        }
+
+
+class LookupStats:
+    """Thread-safe collection of latency histograms keyed by dictionary uuid."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def _get(self, uuid):
+        histogram = self._histograms.get(uuid)
+        if histogram is None:
+            histogram = self._histograms[uuid] = LatencyHistogram()
+        return histogram
+
+    def observe(self, uuid, seconds):
+        with self._lock:
+            self._get(uuid).observe(seconds)
+
+    def timeout(self, uuid):
+        with self._lock:
+            self._get(uuid).timeouts += 1
+
+    def info(self):
+        with self._lock:
+            return {uuid: h.info() for uuid, h in self._histograms.items()}
+
@@ -0,0 +1,356 @@
+"""In-memory prefix index for /api/suggest.
+
+All headwords of all dictionaries are folded (see fold_key), deduplicated
+and kept in one sorted list, so a prefix query is a binary search followed
+by a short forward scan. Each key carries a bitmap of the dictionaries that
+contain it; enabling or disabling a dictionary only flips a bit in the
+enabled mask instead of rebuilding the index.
+
+The keys are kept as one UTF-8 buffer plus an array of offsets into it,
+and every key as the id of its bitmap among the distinct ones, so a key
+takes its UTF-8 size plus 12 bytes rather than two Python objects. Only
+the display words that differ from their folded key are stored apart.
+The index is built in a background thread at startup; until it is ready
+/api/suggest queries the dictionaries instead.
+
+fuzzy() finds the keys within a few edits of a word by walking the same
+sorted list like a trie: keys sharing a prefix with the previous key reuse
+its rows of the Levenshtein table, and once every cell of a row exceeds
+the allowed edits, all keys under that prefix are skipped with a galloping
+search on the UTF-8 buffer.
+"""
+
+import time
+import logging
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import closing
+
+from .word_query.mdict_query import fold_key
+
+logger = logging.getLogger(__name__)
+
+
+class _Keys:
+    """Sorted strings stored as one UTF-8 buffer and the offsets into it"""
+
+    def __init__(self, strings=(), data=None, offsets=None):
+        if data is None:
+            data = bytearray()
+            offsets = array("Q", [0])
+            for string in strings:
+                data += string.encode("utf-8")
+                offsets.append(len(data))
+        self.data = bytes(data)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def find(self, string, i):
+        """First position from i on whose string is not below string, UTF-8
+        bytes, galloping as the next such position is usually close
+        """
+        data = self.data
+        offsets = self.offsets
+        size = len(offsets) - 1
+        end = i
+        step = 1
+        while end < size and data[offsets[end]:offsets[end + 1]] < string:
+            i = end + 1
+            end = i + step
+            step *= 2
+        end = min(end, size)
+        while i < end:
+            middle = (i + end) // 2
+            if data[offsets[middle]:offsets[middle + 1]] < string:
+                i = middle + 1
+            else:
+                end = middle
+        return i
+
+    def prefix_end(self, prefix, i):
+        """First position from i on whose string does not start with prefix,
+        the strings from i on that start with it come first
+        """
+        prefix = prefix.encode("utf-8")
+        data = self.data
+        offsets = self.offsets
+        size = len(offsets) - 1
+        # the strings are compared as UTF-8, in place; galloping first as the
+        # run of strings with a prefix is usually short
+        end = i
+        step = 1
+        while end < size and data.startswith(prefix, offsets[end], offsets[end + 1]):
+            i = end + 1
+            end = i + step
+            step *= 2
+        end = min(end, size)
+        while i < end:
+            middle = (i + end) // 2
+            if data.startswith(prefix, offsets[middle], offsets[middle + 1]):
+                i = middle + 1
+            else:
+                end = middle
+        return i
+
+
+class SuggestIndex:
+    def __init__(self):
+        # (folded keys, {position: display word} of the words that are not
+        # their folded key, bitmap id per key, distinct dictionary bitmaps),
+        # swapped as a whole
+        self._data = (_Keys(), {}, array("I"), [])
+        self._bits = {}
+        self._enabled = 0
+        self._lock = threading.Lock()
+        self._writer = threading.Lock()
+        # set once build() is over, ready only if it succeeded
+        self._built = threading.Event()
+        self.ready = False
+
+    @staticmethod
+    def _load_keys(item, db_name):
+        if item["type"] == "mdict":
+            return item["query"].get_mdx_keys(None)
+        if item["type"] == "mdict_db":
+            with closing(sqlite3.connect(db_name)) as conn:
+                conn.row_factory = sqlite3.Row
+                return item["query"].get_mdx_keys(conn, "")
+        return []
+
+    @staticmethod
+    def _merge(merged, words, bit):
+        for word in words:
+            key = fold_key(word)
+            entry = merged.get(key)
+            if entry is None:
+                # reuse the folded string when the word is already folded
+                merged[key] = [key if word == key else word, bit]
+            else:
+                if word == key:
+                    entry[0] = key
+                entry[1] |= bit
+
+    @staticmethod
+    def _pack(merged):
+        """The index data of merged, {key: [word, bitmap]}"""
+        keys = sorted(merged)
+        words = {}
+        mask_ids = array("I")
+        masks = {}
+        for position, key in enumerate(keys):
+            word, mask = merged[key]
+            if word != key:
+                words[position] = word
+            mask_ids.append(masks.setdefault(mask, len(masks)))
+        return _Keys(keys), words, mask_ids, list(masks)
+
+    @staticmethod
+    def _insert(data, merged):
+        """data with the entries of merged, {key: [word, bitmap]}, added: the
+        keys are merged into the sorted buffer, the runs of keys between
+        them copied as they are
+        """
+        keys, words, mask_ids, masks = data
+        old_data = keys.data
+        old_offsets = keys.offsets
+        new_data = bytearray()
+        new_offsets = array("Q", [0])
+        new_mask_ids = array("I")
+        new_words = {}
+        masks = list(masks)
+        mask_index = {mask: mask_id for mask_id, mask in enumerate(masks)}
+
+        def mask_id(mask):
+            if mask not in mask_index:
+                mask_index[mask] = len(masks)
+                masks.append(mask)
+            return mask_index[mask]
+
+        def copy(start, end):
+            shift = len(new_data) - old_offsets[start]
+            new_data.extend(old_data[old_offsets[start]:old_offsets[end]])
+            new_offsets.extend(offset + shift for offset in old_offsets[start + 1:end + 1])
+            new_mask_ids.extend(mask_ids[start:end])
+
+        # old positions of the keys inserted before them, and of the old
+        # keys now shown as their folded form
+        inserted = []
+        folded = set()
+        done = 0
+        for key in sorted(merged):
+            word, mask = merged[key]
+            encoded = key.encode("utf-8")
+            position = keys.find(encoded, done)
+            copy(done, position)
+            if position < len(keys) and old_data[old_offsets[position]:old_offsets[position + 1]] == encoded:
+                # a key the index has, from other dictionaries too
+                new_mask_ids.append(mask_id(masks[mask_ids[position]] | mask))
+                if word == key:
+                    folded.add(position)
+                done = position + 1
+            else:
+                inserted.append(position)
+                if word != key:
+                    new_words[len(new_offsets) - 1] = word
+                new_mask_ids.append(mask_id(mask))
+                done = position
+            new_data.extend(encoded)
+            new_offsets.append(len(new_data))
+        copy(done, len(keys))
+        for position, word in words.items():
+            if position not in folded:
+                new_words[position + bisect_right(inserted, position)] = word
+        return _Keys(data=new_data, offsets=new_offsets), new_words, new_mask_ids, masks
+
+    def start(self, mdicts, db_names):
+        """build() in a background thread, the dictionaries as they are now"""
+        mdicts = dict(mdicts)
+        thread = threading.Thread(
+            target=self.build, args=(mdicts, db_names), name="suggest-index", daemon=True
+        )
+        thread.start()
+
+    def build(self, mdicts, db_names):
+        """Index the keys of every mdx and db dictionary, enabled or not."""
+        start = time.time()
+        merged = {}
+        bits = {}
+        try:
+            for uuid, item in mdicts.items():
+                if item["type"] not in ("mdict", "mdict_db"):
+                    continue
+                bit = 1 << len(bits)
+                bits[uuid] = bit
+                self._merge(merged, self._load_keys(item, db_names.get(uuid)), bit)
+            data = self._pack(merged)
+            del merged
+            with self._lock:
+                self._data = data
+                self._bits = bits
+                # read now, dictionaries may have been toggled meanwhile
+                self._enabled = sum(bit for uuid, bit in bits.items() if mdicts[uuid]["enable"])
+                self.ready = True
+        except Exception:
+            logger.exception("Cannot build the suggest index")
+            return
+        finally:
+            self._built.set()
+        logger.info(
+            " * Suggest index: %d keys from %d dictionaries (%.1fs)"
+            % (len(data[0]), len(bits), time.time() - start)
+        )
+
+    def add(self, uuid, item, db_name=None):
+        """Index the keys of one more dictionary, one whose index was built later."""
+        if item["type"] not in ("mdict", "mdict_db"):
+            return
+        start = time.time()
+        words = self._load_keys(item, db_name)
+        # after the startup build, which would replace the data added here
+        self._built.wait()
+        # a single writer at a time; suggest() keeps reading the old data and
+        # set_enabled() only waits for the swap
+        with self._writer:
+            bit = self._bits.get(uuid) or 1 << len(self._bits)
+            merged = {}
+            self._merge(merged, words, bit)
+            data = self._insert(self._data, merged)
+            with self._lock:
+                self._data = data
+                self._bits[uuid] = bit
+                if item["enable"]:
+                    self._enabled |= bit
+        logger.info(
+            " * Suggest index: %d keys after adding %s (%.1fs)"
+            % (len(self._data[0]), item["title"], time.time() - start)
+        )
+
+    def set_enabled(self, uuid, enable):
+        with self._lock:
+            bit = self._bits.get(uuid, 0)
+            if enable:
+                self._enabled |= bit
+            else:
+                self._enabled &= ~bit
+
+    def suggest(self, prefix, limit=20):
+        keys, words, mask_ids, masks = self._data
+        enabled = self._enabled
+        prefix = fold_key(prefix)
+        suggestions = []
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and len(suggestions) < limit:
+            key = keys[i]
+            if not key.startswith(prefix):
+                break
+            if masks[mask_ids[i]] & enabled:
+                suggestions.append(words.get(i, key))
+            i += 1
+        return suggestions
+
+    def fuzzy(self, word, max_edits=2):
+        """(distance, word) of the enabled keys within max_edits edits of word
+        (insertions, deletions or substitutions of a character), closest first.
+        """
+        keys, words, mask_ids, masks = self._data
+        enabled = self._enabled
+        target = fold_key(word)
+        size = len(target)
+        # distances above max_edits are all stored as cap, cells outside the
+        # band |depth - j| <= max_edits never get below it
+        cap = max_edits + 1
+        # rows[d] is the row of the Levenshtein table for the first d
+        # characters of the current key
+        rows = [[min(j, cap) for j in range(size + 1)]]
+        previous = ""
+        found = []
+        i = 0
+        count = len(keys)
+        # keys[i] without a method call, this loop visits most keys
+        data = keys.data
+        offsets = keys.offsets
+        while i < count:
+            key = data[offsets[i]:offsets[i + 1]].decode("utf-8")
+            shared = 0
+            limit = min(len(key), len(previous))
+            while shared < limit and key[shared] == previous[shared]:
+                shared += 1
+            del rows[shared + 1:]
+            for depth in range(shared + 1, len(key) + 1):
+                ch = key[depth - 1]
+                above = rows[-1]
+                row = [cap] * (size + 1)
+                best = cap
+                first = depth - max_edits
+                if first <= 0:
+                    row[0] = best = depth
+                    first = 1
+                for j in range(first, min(size, depth + max_edits) + 1):
+                    cost = above[j - 1] + (target[j - 1] != ch)
+                    if above[j] < cost:
+                        cost = above[j] + 1
+                    if row[j - 1] < cost:
+                        cost = row[j - 1] + 1
+                    row[j] = cost
+                    if cost < best:
+                        best = cost
+                rows.append(row)
+                if best > max_edits:
+                    # no key starting with key[:depth] can get closer
+                    previous = key[:depth]
+                    i = keys.prefix_end(previous, i + 1)
+                    break
+            else:
+                previous = key
+                if rows[-1][size] <= max_edits and masks[mask_ids[i]] & enabled:
+                    found.append((rows[-1][size], words.get(i, key)))
+                i += 1
+        found.sort(key=lambda match: match[0])
+        return found
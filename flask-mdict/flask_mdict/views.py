@@ -9,8 +9,9 @@ from flask import render_template, send_file, url_for,  \
     redirect, abort, jsonify, request, make_response
 
 from .forms import WordForm
-from . import mdict, get_mdict, get_db, Config
+from . import mdict, get_mdict, get_db, get_suggest_index, get_indexer, Config
 from . import helper
+from .rewriter import RecordRewriter
 
 
 regex_word_link = re.compile(r'^(@@@LINK=)(.+)$')
@@ -20,15 +21,6 @@ regex_src_schema = re.compile(r'([ "]src=["\'])(/|file:///)?(?!data:)(.+?["\'])'
 regex_href_end_slash = re.compile(r'([ "]href=["\'].+?)(/)(["\'])')
 # sound://
 regex_href_schema_sound = re.compile(r'([ "]href=["\'])(sound://)([^#].+?["\'])')
-# entry://
-regex_href_schema_entry = re.compile(r'([ "]href=["\'])(entry://)([^#].+?["\'])')
-# /xxx/xxx.css
-regex_href_no_schema = re.compile(r'([ "]href=["\'])(?!http://|https://|sound://|entry://)([^#].+?["\'])')
-
-# css
-regex_css = re.compile(r'(<link.*? )(href)(=".+?>)')
-# js
-regex_js = re.compile(r'(<script.*? )(src)(=".+?>)')
 
 
 @mdict.route('/search/<part>')
@@ -82,7 +74,7 @@ def query_resource(uuid, resource):
         if resource not in item and ext in ['css', 'js', 'png', 'jpg', 'woff2']:
             if resource.endswith('.css'):
                 try:
-                    s_data = data.decode('utf-8')
+                    s_data = str(data, 'utf-8')
                     s_data = helper.fix_css('#class_%s' % uuid, s_data)
                     data = s_data.encode('utf-8')
                     item['error'] = ''
@@ -92,7 +84,7 @@ def query_resource(uuid, resource):
                     item['error'] = err_msg
                     abort(404)
             if Config.MDICT_CACHE:
-                item['cache'][resource] = data        # cache css file
+                item['cache'][resource] = bytes(data)        # cache css file
 
         bio = io.BytesIO()
         bio.write(data)
@@ -146,6 +138,7 @@ def query_word(uuid, word):
     if item['error']:
         html_content.append('<div style="color: red;">%s</div>' % item['error'])
     prefix_resource = url_for('.query_resource', uuid=uuid, resource='')
+    rewriter = RecordRewriter(prefix_resource, entry_url=url_for('.query_word', uuid=uuid, word=''))
     found_word = len(records) > 0
     count = 1
     record_num = len(records)
@@ -168,29 +161,9 @@ def query_word(uuid, word):
                 else:
                     return redirect(url_for('.query_word', uuid=uuid, word=link))
         else:
-            # for <img src="<add:resource/>..."
-            record = regex_src_schema.sub(r'\g<1>%s/\3' % prefix_resource, record)
-            # for <a href="sound://<add:resouce>..."
-            # record = regex_href_schema_sound.sub(r'\1\g<2>%s/\3' % prefix_resource, record)
-            # for <a href="<add:resource/>image.png"
-            record = regex_href_no_schema.sub(r'\g<1>%s/\2' % prefix_resource, record)
-            # remove /
-            record = regex_href_end_slash.sub(r'\1\3', record)
-            # for <a href="entry://...", alread in query word page, do not add
-            # record = regex_href_schema_entry.sub(r'\1\2\3', record)
-            # record = regex_href_schema_entry.sub(r'\1\g<2>%s/\3' % prefix_entry, record)
-            # sound://
-            record = regex_href_schema_sound.sub(r' data-sound-url="%s/\3" \1\2\3' % prefix_resource, record)
-            # entry://
-            query_word_url = url_for('.query_word', uuid=uuid, word='')
-            record = regex_href_schema_entry.sub(r' data-entry-url="%s\3" \1\2\3' % query_word_url, record)
-
-            # keep first css
-            if count > 1:
-                record = regex_css.sub(r'\1data-\2\3', record)
-            # keep last js
-            if count < record_num:
-                record = regex_js.sub(r'\1data-\2\3', record)
+            # resource urls, sound:// and entry:// links
+            # keep first css, keep last js
+            record = rewriter.rewrite(record, keep_css=count == 1, keep_js=count >= record_num)
             count += 1
 
         html_content.append(record)
@@ -211,7 +184,7 @@ def query_word(uuid, word):
     }
     word_meta = helper.query_word_meta(word)
     if not nohistory and found_word:
-        helper.add_history(word)
+        helper.add_history(word, [uuid])
     history = helper.get_history()
     return render_template(
         'mdict/query.html',
@@ -246,7 +219,7 @@ def query_word_all():
 
     word = word.strip()
     contents = {}
-    found_word = False
+    found_uuids = []
     for uuid, item in get_mdict().items():
         prefix_resource = url_for('.query_resource', uuid=uuid, resource='')
         q = item['query']
@@ -267,7 +240,9 @@ def query_word_all():
             html_content = []
             if item['error']:
                 html_content.append('<div style="color: red;">%s</div>' % item['error'])
-            found_word = found_word or len(records) > 0
+            rewriter = RecordRewriter(prefix_resource, entry_url=url_for('.query_word', uuid=uuid, word=''))
+            if records:
+                found_uuids.append(uuid)
             count = 1
             record_num = len(records)
             for record in records:
@@ -284,27 +259,9 @@ def query_word_all():
                     else:
                         record = f'''<p>See also: <a data-entry-url="{url_for(".query_word", uuid=uuid, word=link)}" href="entry://{link}">{link}</a></p>'''
                 else:
-                    record = regex_href_end_slash.sub(r'\1\3', record)
-                    # add dict uuid into url
-                    # for resource
-                    record = regex_src_schema.sub(r'\g<1>%s/\3' % prefix_resource, record)
-                    # record = regex_href_schema_sound.sub(r'\1\g<2>%s/\3' % prefix_resource, record)
-                    record = regex_href_no_schema.sub(r'\g<1>%s/\2' % prefix_resource, record)
-                    # for dict data
-                    # record = regex_href_schema_entry.sub(r'\1\g<2>%s/\3' % prefix_entry, record)
-
-                    # sound://
-                    record = regex_href_schema_sound.sub(r' data-sound-url="%s/\3" \1\2\3' % prefix_resource, record)
-                    # entry://
-                    query_word_url = url_for('.query_word', uuid=uuid, word='')
-                    record = regex_href_schema_entry.sub(r' data-entry-url="%s\3" \1\2\3' % query_word_url, record)
-
-                    # keep first css
-                    if count > 1:
-                        record = regex_css.sub(r'\1data-\2\3', record)
-                    # keep last js
-                    if count < record_num:
-                        record = regex_js.sub(r'\1data-\2\3', record)
+                    # add dict uuid into resource urls, sound:// and entry:// links
+                    # keep first css, keep last js
+                    record = rewriter.rewrite(record, keep_css=count == 1, keep_js=count >= record_num)
                     count += 1
 
                 html_content.append(record)
@@ -326,8 +283,8 @@ def query_word_all():
 
     word_meta = helper.query_word_meta(word)
 
-    if not nohistory and found_word:
-        helper.add_history(word)
+    if not nohistory and found_uuids:
+        helper.add_history(word, found_uuids)
     history = helper.get_history()
     return render_template(
         'mdict/query.html',
@@ -388,7 +345,7 @@ def query_word_lite(uuid, word):
                 items.append(get_mdict().get(f))
 
     html_contents = []
-    found_word = False
+    found_uuids = []
     for item in items:
         # entry and word, load from mdx, db
         cur_uuid = item['uuid']
@@ -427,8 +384,10 @@ def query_word_lite(uuid, word):
         html.append(item['title'])
         html.append('</div>')
         prefix_resource = f'{url_for(".query_resource", uuid=cur_uuid, resource="", _external=True)}'
+        # sound:// and entry:// are handled by url_replace below
+        rewriter = RecordRewriter(prefix_resource, mark_links=False)
         # prefix_entry = f'{url_for(".query_word_lite", uuid=cur_uuid, word="", _external=True)}'
-        found_word = found_word or len(records) > 0
+        found_uuids.append(cur_uuid)
         count = 1
         record_num = len(records)
         for record in records:
@@ -463,23 +422,9 @@ def query_word_lite(uuid, word):
                             _external=True, _scheme=scheme,
                         ))
             else:
-                # remove http:// from sound:// and entry://
-                record = regex_href_end_slash.sub(r'\1\3', record)
-                # <img src="<add:resource/>...
-                record = regex_src_schema.sub(r'\g<1>%s/\3' % prefix_resource, record)
-                # <a href="sound://<add:resource/>...
-                # record = regex_href_schema_sound.sub(r'\1\g<2>%s/\3' % prefix_resource[7:], record)
-                # <a href="<add:resource/>image.png
-                record = regex_href_no_schema.sub(r'\g<1>%s/\2' % prefix_resource, record)
-                # entry://
-                # record = regex_href_schema_entry.sub(r'\1\g<2>%s\3' % prefix_entry[7:], record)
-
-                # keep first css
-                if count > 1:
-                    record = regex_css.sub(r'\1data-\2\3', record)
-                # keep last js
-                if count < record_num:
-                    record = regex_js.sub(r'\1data-\2\3', record)
+                # <img src="<add:resource/>..., <a href="<add:resource/>image.png
+                # keep first css, keep last js
+                record = rewriter.rewrite(record, keep_css=count == 1, keep_js=count >= record_num)
                 count += 1
 
             html.append(record)
@@ -499,18 +444,21 @@ def query_word_lite(uuid, word):
             break
     resp = make_response('<hr class="seprator" />'.join(html_contents))
     resp.headers['Access-Control-Allow-Origin'] = '*'
-    if not nohistory and found_word:
-        helper.add_history(word)
+    if not nohistory and found_uuids:
+        helper.add_history(word, found_uuids)
     return resp
 
 
 @mdict.route('/toggle/<uuid>')
 def mdict_toggle(uuid):
-    item = get_mdict().get(uuid)
+    item = get_indexer().get(uuid)
     if not item:
         abort(404)
     item['enable'] = not item['enable']
     helper.mdict_enable(uuid, item['enable'])
+    suggest_index = get_suggest_index()
+    if suggest_index:
+        suggest_index.set_enabled(uuid, item['enable'])
     return jsonify(status='ok', uuid=uuid, enable=item['enable'])
 
 
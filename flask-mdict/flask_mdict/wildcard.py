@@ -0,0 +1,116 @@
+"""In-memory index for wildcard key searches.
+
+A LIKE pattern with a leading or inner % cannot use the B-tree of
+MDX_INDEX, so SQLite scans every key. A WildcardIndex narrows a pattern
+down to candidate keys first:
+
+    prefix     the literal text before the first wildcard, a binary search
+               over the key ids sorted by key
+    suffix     the literal text after the last wildcard, a binary search
+               over the key ids sorted by reversed key
+    infix      every literal piece of three characters or more, the key ids
+               listed for each of its trigrams
+
+The candidate lists are intersected, smallest first, and the candidates
+are checked against the pattern itself, so the keys found and their
+order are exactly those of the LIKE query. Like LIKE, the index ignores
+the case of ASCII letters only. A pattern without a literal piece to
+narrow it down (like *a*b*) is left to LIKE.
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+
+# LIKE folds the case of ASCII letters only, str.lower() does more
+_ascii_lower = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+_wildcards = re.compile("[%_]")
+
+
+def like_regex(pattern):
+    """Regex of an SQLite LIKE pattern: % and _ wildcards, ASCII letters ignore case"""
+    parts = []
+    for ch in pattern:
+        if ch == '%':
+            parts.append('.*')
+        elif ch == '_':
+            parts.append('.')
+        elif ch.isascii() and ch.isalpha():
+            parts.append('[%s%s]' % (ch.lower(), ch.upper()))
+        else:
+            parts.append(re.escape(ch))
+    return re.compile(''.join(parts), re.S)
+
+
+def like_prefix(pattern):
+    """Literal text of an SQLite LIKE pattern before its first wildcard"""
+    return _wildcards.split(pattern, 1)[0]
+
+
+class WildcardIndex:
+    """Index of keys, a list sorted like SQLite lists MDX_INDEX keys"""
+
+    def __init__(self, keys):
+        self._keys = keys
+        lowered = []
+        for key in keys:
+            lower = key.translate(_ascii_lower)
+            # most keys are lowercase already, share the string
+            lowered.append(key if lower == key else lower)
+        self._lowered = lowered
+        ids = range(len(keys))
+        self._by_prefix = array('I', sorted(ids, key=lowered.__getitem__))
+        self._by_suffix = array('I', sorted(ids, key=lambda i: lowered[i][::-1]))
+        trigrams = {}
+        get = trigrams.get
+        for i, key in enumerate(lowered):
+            for trigram in {key[n:n + 3] for n in range(len(key) - 2)}:
+                trigram_ids = get(trigram)
+                if trigram_ids is None:
+                    trigrams[trigram] = [i]
+                else:
+                    trigram_ids.append(i)
+        self._trigrams = {trigram: array('I', ids) for trigram, ids in trigrams.items()}
+
+    def _range(self, ids, text, key):
+        """ids[start:end], the ids whose key(id) starts with text"""
+        start = bisect_left(ids, text, key=key)
+        end = bisect_left(ids, text + '\U0010ffff', start, key=key)
+        return ids[start:end]
+
+    def _candidates(self, pattern):
+        """Ids of a superset of the keys matching pattern, None when every
+        key is a candidate
+        """
+        pieces = _wildcards.split(pattern.translate(_ascii_lower))
+        lowered = self._lowered
+        choices = []
+        if pieces[0]:
+            choices.append(self._range(self._by_prefix, pieces[0], lowered.__getitem__))
+        if len(pieces) > 1 and pieces[-1]:
+            choices.append(self._range(
+                self._by_suffix, pieces[-1][::-1], lambda i: lowered[i][::-1]))
+        for piece in pieces:
+            for n in range(len(piece) - 2):
+                choices.append(self._trigrams.get(piece[n:n + 3], ()))
+        if not choices:
+            return None
+        choices.sort(key=len)
+        candidates = set(choices[0])
+        for ids in choices[1:]:
+            # checking a few keys against the pattern is cheaper
+            if len(candidates) <= 64:
+                break
+            candidates.intersection_update(ids)
+        return sorted(candidates)
+
+    def like(self, pattern):
+        """Keys matching the SQLite LIKE pattern, sorted, None when the
+        pattern has nothing the index can narrow it down with
+        """
+        candidates = self._candidates(pattern)
+        if candidates is None:
+            return None
+        match = like_regex(pattern).fullmatch
+        keys = self._keys
+        return [keys[i] for i in candidates if match(keys[i])]
@@ -0,0 +1,62 @@
+"""
+    fastSalsa20.py -- Salsa20 with the 64-byte blocks computed in NumPy lanes
+
+    Same class API as pureSalsa20.Salsa20. Every block of the key stream
+    depends only on the key, the IV and its counter, so encryptBytes() puts
+    the 16 state words of all blocks into uint32 arrays and runs the rounds
+    once over all of them instead of once per block.
+
+    Importing this module raises ImportError when NumPy is not installed;
+    readmdict falls back to pureSalsa20 then.
+"""
+import numpy
+
+from .pureSalsa20 import Salsa20 as PureSalsa20
+
+# quarter rounds (a, b, c, d) of a column round followed by a row round
+_double_round = (
+    (0, 4, 8, 12), (5, 9, 13, 1), (10, 14, 2, 6), (15, 3, 7, 11),
+    (0, 1, 2, 3), (5, 6, 7, 4), (10, 11, 8, 9), (15, 12, 13, 14),
+)
+
+
+def _rotl(w, n):
+    return (w << numpy.uint32(n)) | (w >> numpy.uint32(32 - n))
+
+
+def salsa20_keystream(ctx, counter, blocks, nRounds=20):
+    """ Key stream of blocks 64-byte blocks from the 16-word state ctx,
+        the block counter starting at counter.
+        """
+    state = numpy.array(ctx, dtype=numpy.int64).astype(numpy.uint32)
+    state = numpy.repeat(state[:, None], blocks, axis=1)
+    counters = numpy.arange(blocks, dtype=numpy.uint64) + numpy.uint64(counter)
+    state[8] = counters & numpy.uint64(0xffffffff)
+    state[9] = counters >> numpy.uint64(32)
+
+    x = [row.copy() for row in state]
+    for i in range(nRounds // 2):
+        for a, b, c, d in _double_round:
+            x[b] ^= _rotl(x[a] + x[d], 7)
+            x[c] ^= _rotl(x[b] + x[a], 9)
+            x[d] ^= _rotl(x[c] + x[b], 13)
+            x[a] ^= _rotl(x[d] + x[c], 18)
+    out = numpy.stack(x) + state
+    # word i of every block, block after block
+    return out.T.astype('<u4').tobytes()
+
+
+class Salsa20(PureSalsa20):
+    def encryptBytes(self, data):
+        assert type(data) == bytes, 'data must be byte string'
+        assert self._lastChunk64, 'previous chunk not multiple of 64 bytes'
+        lendata = len(data)
+        blocks = (lendata + 63) // 64
+        counter = self.getCounter()
+        stream = salsa20_keystream(self.ctx, counter, blocks, self.rounds)
+        munged = numpy.frombuffer(data, dtype=numpy.uint8) ^ numpy.frombuffer(stream, dtype=numpy.uint8, count=lendata)
+        self.setCounter((counter + blocks) % 2**64)
+        self._lastChunk64 = not lendata % 64
+        return munged.tobytes()
+
+    decryptBytes = encryptBytes
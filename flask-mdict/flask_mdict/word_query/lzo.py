@@ -1,99 +1,49 @@
-import math
-
-
-class FlexBuffer():
-
-    def __init__(self):
-
-        self.blockSize = None
-        self.c = None
-        self.l = None
-        self.buf = None
-
-    def require(self, n):
-        
-        r = self.c - self.l + n
-        if r > 0:
-            self.l = self.l + self.blockSize * math.ceil(r / self.blockSize)
-            #tmp = bytearray(self.l)
-            #for i in len(self.buf):
-            #    tmp[i] = self.buf[i]
-            #self.buf = tmp
-            self.buf = self.buf + bytearray(self.l - len(self.buf))
-        self.c = self.c + n
-        return self.buf
-
-    def alloc(self, initSize, blockSize):
-        
-        if blockSize:
-            sz = blockSize
-        else:
-            sz = 4096
-        self.blockSize = self.roundUp(sz)
-        self.c = 0
-        self.l = self.roundUp(initSize) | 0
-        self.l += self.blockSize - (self.l % self.blockSize)
-        self.buf = bytearray(self.l)
-        return self.buf
-
-    def roundUp(self, n):
-        
-        r = n % 4
-        if r == 0:
-            return n
-        else:
-            return n + 4 - r
+from struct import pack
 
-    def reset(self):
+# python-lzo, the C library, when it is installed
+try:
+    import lzo as _lzo
+except ImportError:
+    _lzo = None
 
-        self.c = 0
-        self.l = len(self.buf)
 
-    def pack(self, size):
-        
-        return self.buf[0:size]
+_TOP_LOOP = 1
+_FIRST_LITERAL_RUN = 2
+_MATCH = 3
+_MATCH_DONE = 4
+_MATCH_NEXT = 5
 
-def _decompress(inBuf, outBuf):
 
-    c_top_loop = 1
-    c_first_literal_run = 2
-    c_match = 3
-    c_copy_match = 4
-    c_match_done = 5
-    c_match_next = 6
+def _decompress(inBuf, out):
+    """LZO1X decompression of inBuf into the bytearray out, returns the output size
 
-    out = outBuf.buf
+    Literal runs and matches are copied as slices. Writing a slice that
+    reaches past the end of out grows it, so out only has to be
+    preallocated to the expected size.
+    """
     op = 0
     ip = 0
     t = inBuf[ip]
-    state = c_top_loop
-    m_pos = 0
-    ip_end = len(inBuf)
+    state = _TOP_LOOP
 
     if t > 17:
         ip = ip + 1
         t = t - 17
         if t < 4:
-            state = c_match_next
+            state = _MATCH_NEXT
         else:
-            out = outBuf.require(t)
-            while True:
-                out[op] = inBuf[ip]
-                op = op + 1
-                ip = ip + 1
-                t = t - 1
-                if not t > 0: break
-            state = c_first_literal_run
+            out[op:op + t] = inBuf[ip:ip + t]
+            op = op + t
+            ip = ip + t
+            state = _FIRST_LITERAL_RUN
 
     while True:
-        if_block = False
-
         ##
-        if state == c_top_loop:
+        if state == _TOP_LOOP:
             t = inBuf[ip]
             ip = ip + 1
             if t >= 16:
-                state = c_match
+                state = _MATCH
                 continue
             if t == 0:
                 while inBuf[ip] == 0:
@@ -103,144 +53,103 @@ def _decompress(inBuf, outBuf):
                 ip = ip + 1
 
             t = t + 3
-            out = outBuf.require(t)
-            while True:
-                out[op] = inBuf[ip]
-                op = op + 1
-                ip = ip + 1
-                t = t - 1
-                if not t > 0: break
+            out[op:op + t] = inBuf[ip:ip + t]
+            op = op + t
+            ip = ip + t
             # emulate c switch
-            state = c_first_literal_run
+            state = _FIRST_LITERAL_RUN
 
         ##
-        if state == c_first_literal_run:
+        if state == _FIRST_LITERAL_RUN:
             t = inBuf[ip]
             ip = ip + 1
             if t >= 16:
-                state = c_match
+                state = _MATCH
                 continue
             m_pos = op - 0x801 - (t >> 2) - (inBuf[ip] << 2)
             ip = ip + 1
-            out = outBuf.require(3)
-            out[op] = out[m_pos]
-            op = op + 1
-            m_pos = m_pos + 1
-            out[op] = out[m_pos]
-            op = op + 1
-            m_pos = m_pos + 1
-            out[op] = out[m_pos]
-            op = op + 1
-
-            state = c_match_done
-            continue
-
-        ##
-        if state == c_match:
-            if t >= 64:
-                m_pos = op - 1 - ((t >> 2) & 7) - (inBuf[ip] << 3)
-                ip = ip + 1
-                t = (t >> 5) - 1
-                state = c_copy_match
-                continue
-            elif t >= 32:
-                t = t & 31
-                if t == 0:
-                    while inBuf[ip] == 0:
-                        t = t + 255
-                        ip = ip + 1
-                    t = t + 31 + inBuf[ip]
+            # at least 0x801 bytes back, never overlaps
+            out[op:op + 3] = out[m_pos:m_pos + 3]
+            op = op + 3
+            state = _MATCH_DONE
+
+        # matches, each followed by up to 3 literals, until one has none
+        while True:
+            if state == _MATCH:
+                if t >= 64:
+                    m_pos = op - 1 - ((t >> 2) & 7) - (inBuf[ip] << 3)
                     ip = ip + 1
-                m_pos = op - 1 - ((inBuf[ip] + (inBuf[ip + 1] << 8)) >> 2)
-                ip = ip + 2
-            elif t >= 16:
-                m_pos = op - ((t & 8) << 11)
-                t = t & 7
-                if t == 0:
-                    while inBuf[ip] == 0:
-                        t = t + 255
+                    t = (t >> 5) - 1
+                elif t >= 32:
+                    t = t & 31
+                    if t == 0:
+                        while inBuf[ip] == 0:
+                            t = t + 255
+                            ip = ip + 1
+                        t = t + 31 + inBuf[ip]
                         ip = ip + 1
-                    t = t + 7 + inBuf[ip]
+                    m_pos = op - 1 - ((inBuf[ip] + (inBuf[ip + 1] << 8)) >> 2)
+                    ip = ip + 2
+                elif t >= 16:
+                    m_pos = op - ((t & 8) << 11)
+                    t = t & 7
+                    if t == 0:
+                        while inBuf[ip] == 0:
+                            t = t + 255
+                            ip = ip + 1
+                        t = t + 7 + inBuf[ip]
+                        ip = ip + 1
+                    m_pos = m_pos - ((inBuf[ip] + (inBuf[ip + 1] << 8)) >> 2)
+                    ip = ip + 2
+                    if m_pos == op:
+                        # end of stream
+                        return op
+                    m_pos = m_pos - 0x4000
+                else:
+                    m_pos = op - 1 - (t >> 2) - (inBuf[ip] << 2)
                     ip = ip + 1
-                m_pos = m_pos - ((inBuf[ip] + (inBuf[ip + 1] << 8)) >> 2)
-                ip = ip + 2
-                if m_pos == op:
+                    t = 0
+
+                # copy match
+                t = t + 2
+                if op - m_pos >= t:
+                    out[op:op + t] = out[m_pos:m_pos + t]
+                else:
+                    # the match overlaps its own output, it repeats the last op - m_pos bytes
+                    out[op:op + t] = (out[m_pos:op] * (t // (op - m_pos) + 1))[:t]
+                op = op + t
+
+            # match done
+            if state != _MATCH_NEXT:
+                t = inBuf[ip - 2] & 3
+                if t == 0:
+                    state = _TOP_LOOP
                     break
-                m_pos = m_pos - 0x4000
-            else:
-                m_pos = op - 1 - (t >> 2) - (inBuf[ip] << 2);
-                ip = ip + 1
-                out = outBuf.require(2)
-                out[op] = out[m_pos]
-                op = op + 1
-                m_pos = m_pos + 1
-                out[op] = out[m_pos]
-                op = op + 1
-                state = c_match_done
-                continue
-
-            if t >= 6 and (op - m_pos) >= 4:
-                if_block = True
-                t += 2
-                out = outBuf.require(t)
-                while True:
-                    out[op] = out[m_pos]
-                    op += 1
-                    m_pos += 1
-                    t -= 1
-                    if not t > 0: break
-            #emulate c switch
-            state = c_copy_match
-        
-        ##
-        if state == c_copy_match:
-            if not if_block:
-                t += 2
-                out = outBuf.require(t)
-                while True:
-                    out[op] = out[m_pos]
-                    op += 1
-                    m_pos += 1
-                    t -= 1
-                    if not t > 0: break
-            #emulating c switch
-            state = c_match_done
- 
-        ##
-        if state == c_match_done:
-            t = inBuf[ip - 2] & 3
-            if t == 0:
-                state = c_top_loop
-                continue
-            #emulate c switch
-            state = c_match_next
 
-        ##
-        if state == c_match_next:
-            out = outBuf.require(1)
-            out[op] = inBuf[ip]
-            op += 1
-            ip += 1
-            if t > 1:
-                out = outBuf.require(1)
-                out[op] = inBuf[ip]
-                op += 1
-                ip += 1
-                if t > 2:
-                    out = outBuf.require(1)
-                    out[op] = inBuf[ip]
-                    op += 1
-                    ip += 1
+            # match next
+            out[op:op + t] = inBuf[ip:ip + t]
+            op = op + t
+            ip = ip + t
             t = inBuf[ip]
-            ip += 1
-            state = c_match
-            continue
+            ip = ip + 1
+            state = _MATCH
+
 
-    return bytes(outBuf.pack(op))
+def decompress(input, initSize=16000, blockSize=8192):
+    """Decompress LZO1X data in pure Python.
 
-def decompress(input, initSize = 16000, blockSize = 8192):
-    output = FlexBuffer()
-    output.alloc(initSize, blockSize)
-    return _decompress(bytearray(input), output)
+    initSize is the expected size of the output, the decompressed size
+    stored with every MDict block; the output buffer is allocated once at
+    that size. blockSize is no longer used.
+    """
+    out = bytearray(initSize)
+    size = _decompress(bytes(input), out)
+    del out[size:]
+    return bytes(out)
 
 
+def decompress_block(input, size):
+    """Decompress an LZO1X block of size bytes, with python-lzo if it is installed."""
+    if _lzo is not None:
+        return _lzo.decompress(b'\xf0' + pack('>I', size) + bytes(input))
+    return decompress(input, size)
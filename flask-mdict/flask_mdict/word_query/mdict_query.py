@@ -2,7 +2,7 @@
 
 
 from .readmdict2 import MDX, MDD
-from struct import pack, unpack
+from struct import unpack
 from io import BytesIO
 import re
 import sys
@@ -10,15 +10,12 @@ import os
 import sqlite3
 import json
 import ast
+import unicodedata
 
 # zlib compression is used for engine version >=2.0
 import zlib
 # LZO compression is used for engine version < 2.0
-try:
-    from . import lzo
-except ImportError:
-    lzo = None
-    #print("LZO compression support is not available")
+from . import lzo
 
 # 2x3 compatible
 if sys.hexversion >= 0x03000000:
@@ -27,6 +24,11 @@ if sys.hexversion >= 0x03000000:
 version = '1.1'
 
 
+def fold_key(key_text):
+    """Normalized form of a headword used for case-insensitive lookups."""
+    return unicodedata.normalize('NFKC', key_text).casefold()
+
+
 class IndexBuilder(object):
     #todo: enable history
     def __init__(self, fname, encoding = "", passcode = None, force_rebuild = False, enable_history = False, sql_index = True, check = False):
@@ -121,44 +123,30 @@ class IndexBuilder(object):
                 txt_styled = txt_styled + style[0] + p + style[1]
         return txt_styled
 
-    def _make_mdx_index(self, db_name):
-        if os.path.exists(db_name):
-            os.remove(db_name)
-        mdx = MDX(self._mdx_file)
-        self._mdx_db = db_name
-        returned_index = mdx.get_index(check_block = self._check)
-        index_list = returned_index['index_dict_list']
+    @staticmethod
+    def _bulk_connect(db_name):
+        """Connection for building a new index database.
+
+        The database is deleted and rebuilt if a build does not finish, so
+        it goes without a rollback journal and without fsync.
+        """
         conn = sqlite3.connect(db_name)
-        c = conn.cursor()
-        c.execute(
-            ''' CREATE TABLE MDX_INDEX
-               (key_text text not null,
-                file_pos integer,
-                compressed_size integer,
-                decompressed_size integer,
-                record_block_type integer,
-                record_start integer,
-                record_end integer,
-                offset integer
-                )'''
-        )
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        return conn
 
-        tuple_list = [
-            (item['key_text'],
-                     item['file_pos'],
-                     item['compressed_size'],
-                     item['decompressed_size'],
-                     item['record_block_type'],
-                     item['record_start'],
-                     item['record_end'],
-                     item['offset']
-                     )
-            for item in index_list
-            ]
-        c.executemany('INSERT INTO MDX_INDEX VALUES (?,?,?,?,?,?,?,?)',
-                      tuple_list)
-        # build the metadata table
-        meta = returned_index['meta']
+    @staticmethod
+    def _fold_rows(rows):
+        """MDX_INDEX rows, the index rows plus their folded key"""
+        for row in rows:
+            yield row + (fold_key(row[0]),)
+
+    def _mdx_index_rows(self, rows):
+        """MDX_INDEX rows of the index rows of an mdx file"""
+        return self._fold_rows(rows)
+
+    def _write_meta(self, c, meta):
+        """Create the META table of an mdx index and keep meta in the class members"""
         c.execute(
             '''CREATE TABLE META
                (key text,
@@ -180,21 +168,56 @@ class IndexBuilder(object):
              ('version', version)
              ]
             )
-        
+        #set class member
+        self._encoding = meta['encoding']
+        self._stylesheet = meta['stylesheet']
+        self._title = meta['title']
+        self._description = meta['description']
+
+    def _make_mdx_index(self, db_name):
+        if os.path.exists(db_name):
+            os.remove(db_name)
+        mdx = MDX(self._mdx_file)
+        self._mdx_db = db_name
+        meta = mdx.get_meta()
+        conn = self._bulk_connect(db_name)
+        c = conn.cursor()
+        c.execute(
+            ''' CREATE TABLE MDX_INDEX
+               (key_text text not null,
+                file_pos integer,
+                compressed_size integer,
+                decompressed_size integer,
+                record_block_type integer,
+                record_start integer,
+                record_end integer,
+                offset integer,
+                key_fold text
+                )'''
+        )
+
+        # the rows go from the record block parser straight into a single
+        # transaction, without a list of all of them in between
+        c.executemany('INSERT INTO MDX_INDEX VALUES (?,?,?,?,?,?,?,?,?)',
+                      self._mdx_index_rows(mdx.iter_index(check_block = self._check)))
+        # build the metadata table
+        self._write_meta(c, meta)
+
+        # indexes are created after the load, not updated row by row
         if self._sql_index:
             c.execute(
                 '''
                 CREATE INDEX key_index ON MDX_INDEX (key_text)
                 '''
                 )
+            c.execute(
+                '''
+                CREATE INDEX key_fold_index ON MDX_INDEX (key_fold)
+                '''
+                )
 
         conn.commit()
         conn.close()
-        #set class member
-        self._encoding = meta['encoding']
-        self._stylesheet = meta['stylesheet']
-        self._title = meta['title']
-        self._description = meta['description']
 
 
     def _make_mdd_index(self, db_name):
@@ -202,41 +225,34 @@ class IndexBuilder(object):
             os.remove(db_name)
         mdd = MDD(self._mdd_file)
         self._mdd_db = db_name
-        returned_index = mdd.get_index(check_block = self._check)
-        index_list = returned_index['index_dict_list']
-        conn = sqlite3.connect(db_name)
+        conn = self._bulk_connect(db_name)
         c = conn.cursor()
+        # key_text is unique, through key_index created after the load
         c.execute(
             ''' CREATE TABLE MDX_INDEX
-               (key_text text not null unique,
+               (key_text text not null,
                 file_pos integer,
                 compressed_size integer,
                 decompressed_size integer,
                 record_block_type integer,
                 record_start integer,
                 record_end integer,
-                offset integer
+                offset integer,
+                key_fold text
                 )'''
         )
 
-        tuple_list = [
-            (item['key_text'],
-                     item['file_pos'],
-                     item['compressed_size'],
-                     item['decompressed_size'],
-                     item['record_block_type'],
-                     item['record_start'],
-                     item['record_end'],
-                     item['offset']
-                     )
-            for item in index_list
-            ]
-        c.executemany('INSERT INTO MDX_INDEX VALUES (?,?,?,?,?,?,?,?)',
-                      tuple_list)
+        c.executemany('INSERT INTO MDX_INDEX VALUES (?,?,?,?,?,?,?,?,?)',
+                      self._fold_rows(mdd.iter_index(check_block = self._check)))
+        c.execute(
+            '''
+            CREATE UNIQUE INDEX key_index ON MDX_INDEX (key_text)
+            '''
+            )
         if self._sql_index:
             c.execute(
                 '''
-                CREATE UNIQUE INDEX key_index ON MDX_INDEX (key_text)
+                CREATE INDEX key_fold_index ON MDX_INDEX (key_fold)
                 '''
                 )
 
@@ -244,7 +260,7 @@ class IndexBuilder(object):
         conn.close()
 
     @staticmethod
-    def get_data_by_index(fmdx, index):
+    def get_record_block(fmdx, index):
         fmdx.seek(index['file_pos'])
         record_block_compressed = fmdx.read(index['compressed_size'])
         record_block_type = index['record_block_type']
@@ -257,23 +273,26 @@ class IndexBuilder(object):
             _record_block = record_block_compressed[8:]
             # lzo compression
         elif record_block_type == 1:
-            if lzo is None:
-                print("LZO compression is not supported")
-                # decompress
-            header = b'\xf0' + pack('>I', index['decompressed_size'])
-            _record_block = lzo.decompress(record_block_compressed[8:], initSize = decompressed_size, blockSize=1308672)
+            _record_block = lzo.decompress_block(record_block_compressed[8:], decompressed_size)
                 # zlib compression
         elif record_block_type == 2:
             # decompress
             _record_block = zlib.decompress(record_block_compressed[8:])
+        return _record_block
 
+    @classmethod
+    def get_data_by_index(cls, fmdx, index):
+        _record_block = cls.get_record_block(fmdx, index)
         data = _record_block[index['record_start'] - index['offset']:index['record_end'] - index['offset']]
         return data
 
     def get_mdx_by_index(self, fmdx, index):
         data = self.get_data_by_index(fmdx,index)
+        return self.decode_record(data)
 
-        record  = data.decode(self._encoding, errors='ignore').strip(u'\x00').encode('utf-8')
+    def decode_record(self, data):
+        # data may be a memoryview of a memory-mapped file
+        record  = str(data, self._encoding, errors='ignore').strip(u'\x00').encode('utf-8')
         if self._stylesheet:
             record = self._replace_stylesheet(record)
         record = record.decode('utf-8')
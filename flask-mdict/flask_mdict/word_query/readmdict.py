@@ -21,17 +21,20 @@ from struct import pack, unpack
 from io import BytesIO
 import re
 import sys
+from math import gcd as _gcd
+from functools import lru_cache
 
 from .ripemd128 import ripemd128
-from .pureSalsa20 import Salsa20
+# the NumPy backend computes all blocks of the key stream at once
+try:
+    from .fastSalsa20 import Salsa20
+except ImportError:
+    from .pureSalsa20 import Salsa20
 
 # zlib compression is used for engine version >=2.0
 import zlib
-# LZO compression is used for engine version < 2.0
-try:
-    import lzo
-except ImportError:
-    lzo = None
+# LZO compression is used for engine version < 2.0, python-lzo when installed
+from . import lzo
 
 # xxhash is used for engine version >= 3.0
 try:
@@ -55,27 +58,52 @@ def _unescape_entities(text):
     return text
 
 
+# byte -> byte with its nibbles swapped
+_swap_nibbles = bytes((i >> 4 | i << 4) & 0xff for i in range(256))
+
+
 def _fast_decrypt(data, key):
     """
     XOR decryption
+
+    Every byte is nibble-swapped and XORed with the previous ciphertext
+    byte, its position and the key. The terms are independent of each
+    other, so they are combined a whole stream at a time.
+    """
+    size = len(data)
+    if not size:
+        return b''
+    swapped = data.translate(_swap_nibbles)
+    previous = b'\x36' + data[:-1]
+    # position and key repeat every lcm(256, len(key)) bytes
+    period = 256 * len(key) // _gcd(256, len(key))
+    mask = bytes((i & 0xff) ^ key[i % len(key)] for i in range(period))
+    mask = (mask * (size // period + 1))[:size]
+    t = (int.from_bytes(swapped, 'little') ^ int.from_bytes(previous, 'little')
+         ^ int.from_bytes(mask, 'little'))
+    return t.to_bytes(size, 'little')
+
+
+@lru_cache(maxsize=16)
+def _salsa_keystream(encrypt_key, size):
     """
-    b = bytearray(data)
-    key = bytearray(key)
-    previous = 0x36
-    for i in range(len(b)):
-        t = (b[i] >> 4 | b[i] << 4) & 0xff
-        t = t ^ previous ^ (i & 0xff) ^ key[i % len(key)]
-        previous = b[i]
-        b[i] = t
-    return bytes(b)
+    salsa20 (8 rounds) key stream, the same for every block encrypted with the key
+    """
+    s20 = Salsa20(key=encrypt_key, IV=b"\x00"*8, rounds=8)
+    return s20.encryptBytes(b"\x00" * size)
 
 
 def _salsa_decrypt(ciphertext, encrypt_key):
     """
     salsa20 (8 rounds) decryption
     """
-    s20 = Salsa20(key=encrypt_key, IV=b"\x00"*8, rounds=8)
-    return s20.encryptBytes(ciphertext)
+    size = len(ciphertext)
+    if not size:
+        return b''
+    # record blocks encrypt at most 255 bytes, one stream covers them all
+    stream = _salsa_keystream(encrypt_key, -(-size // 256) * 256)
+    t = int.from_bytes(ciphertext, 'little') ^ int.from_bytes(stream[:size], 'little')
+    return t.to_bytes(size, 'little')
 
 
 def _decrypt_regcode_by_userid(reg_code, userid):
@@ -176,10 +204,7 @@ class MDict(object):
         if compression_method == 0:
             decompressed_block = decrypted_block
         elif compression_method == 1:
-            if lzo is None:
-                raise RuntimeError("LZO compression is not supported")
-            header = b'\xf0' + pack('>I', decompressed_size)
-            decompressed_block = lzo.decompress(header + decrypted_block)
+            decompressed_block = lzo.decompress_block(decrypted_block, decompressed_size)
         elif compression_method == 2:
             decompressed_block = zlib.decompress(decrypted_block)
         else:
@@ -263,29 +288,27 @@ class MDict(object):
         return key_list
 
     def _split_key_block(self, key_block):
-        key_list = []
-        key_start_index = 0
-        while key_start_index < len(key_block):
-            # the corresponding record's offset in record block
-            key_id = unpack(self._number_format, key_block[key_start_index:key_start_index+self._number_width])[0]
-            # key text ends with '\x00'
-            if self._encoding == 'UTF-16':
-                delimiter = b'\x00\x00'
-                width = 2
+        # every key is the corresponding record's offset in record block
+        # followed by the key text, which ends with '\x00', or with '\x00\x00'
+        # at a character boundary for UTF-16
+        if self._encoding == 'UTF-16':
+            regex_key = re.compile(b'(.{%d})((?:..)*?)\x00\x00' % self._number_width, re.DOTALL)
+        else:
+            regex_key = re.compile(b'(.{%d})(.*?)\x00' % self._number_width, re.DOTALL)
+        keys = regex_key.findall(key_block)
+        key_ids = unpack('%s%d%s' % (self._number_format[0], len(keys), self._number_format[1:]),
+                         b''.join([key_id for key_id, _ in keys]))
+        key_texts = [key_text for _, key_text in keys]
+        if self._encoding == 'UTF-8':
+            # valid UTF-8 stays the same when decoded and encoded again
+            try:
+                b'\x00'.join(key_texts).decode('utf-8')
+            except UnicodeDecodeError:
+                pass
             else:
-                delimiter = b'\x00'
-                width = 1
-            i = key_start_index + self._number_width
-            while i < len(key_block):
-                if key_block[i:i+width] == delimiter:
-                    key_end_index = i
-                    break
-                i += width
-            key_text = key_block[key_start_index+self._number_width:key_end_index]\
-                .decode(self._encoding, errors='ignore').encode('utf-8').strip()
-            key_start_index = key_end_index + width
-            key_list += [(key_id, key_text)]
-        return key_list
+                return list(zip(key_ids, [key_text.strip() for key_text in key_texts]))
+        return [(key_id, key_text.decode(self._encoding, errors='ignore').encode('utf-8').strip())
+                for key_id, key_text in zip(key_ids, key_texts)]
 
     def _read_header(self):
         f = open(self._fname, 'rb')
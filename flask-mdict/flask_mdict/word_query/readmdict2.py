@@ -1,8 +1,17 @@
+import os
 from struct import unpack
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 from .readmdict import MDX as MDXBase, MDD as MDDBase
 
 
+# fields of an index row, the columns of MDX_INDEX without key_fold
+INDEX_FIELDS = (
+    'key_text', 'file_pos', 'compressed_size', 'decompressed_size',
+    'record_block_type', 'record_start', 'record_end', 'offset',
+)
+
+
 class Index():
     def get_index(self, check_block=True):
         if self._version >= 3:
@@ -10,6 +19,78 @@ class Index():
         else:
             return self.get_index_v1v2(check_block=check_block)
 
+    def iter_index(self, check_block=True):
+        """Index rows (see INDEX_FIELDS) of all records in file order.
+
+        Unlike get_index, the rows are generated one by one instead of
+        being collected in a list of dicts first.
+        """
+        if self._version >= 3:
+            blocks = self._record_blocks_v3(check_block)
+        else:
+            blocks = self._record_blocks_v1v2(check_block)
+        return self._iter_index_blocks(blocks)
+
+    def get_meta(self):
+        # 这里比 mdd 部分稍有不同，应该还需要传递编码以及样式表信息
+        meta = {}
+        meta['encoding'] = self._encoding
+        meta['stylesheet'] = self._stylesheet
+        meta['version'] = self._version
+        if self._version >= 3:
+            meta['title'] = self.header[b'Title'].decode(self._encoding)
+        else:
+            meta['title'] = self.header[b'Title'].decode(self._encoding, errors='ignore')
+        meta['description'] = meta['title']
+        return meta
+
+    def _iter_index_blocks(self, blocks):
+        """Split the records of the key list over blocks, a list of
+        (file_pos, compressed_size, decompressed_size, record_block_type)
+        """
+        offset = 0
+        i = 0
+        num_keys = len(self._key_list)
+        for file_pos, compressed_size, decompressed_size, record_block_type in blocks:
+            # split record block according to the offset info from key block
+            while i < num_keys:
+                record_start, key_text = self._key_list[i]
+                # reach the end of current record block
+                # next block
+                if record_start - offset >= decompressed_size:
+                    break
+                # record end index
+                if i < num_keys - 1:
+                    record_end = self._key_list[i + 1][0]
+                else:
+                    record_end = decompressed_size + offset
+                yield (key_text.decode("utf-8"), file_pos, compressed_size, decompressed_size,
+                       record_block_type, record_start, record_end, offset)
+                i += 1
+            offset += decompressed_size
+
+    def _check_blocks(self, f, blocks, data_offset=0):
+        """Decode every record block, which verifies its adler32 checksum.
+
+        The blocks are read in file order and decoded in a thread pool
+        (zlib and adler32 release the GIL), with a bounded number of blocks
+        in flight. The data of a block starts data_offset bytes after its
+        file_pos.
+        """
+        workers = min(32, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for file_pos, compressed_size, decompressed_size, _ in blocks:
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                f.seek(file_pos + data_offset)
+                block = f.read(compressed_size)
+                pending.add(executor.submit(self._decode_block, block, decompressed_size))
+            for future in pending:
+                future.result()
+
     def get_index_v1v2(self, check_block=True):
         # 获取 mdx 文件的索引列表，格式为
         # key_text(关键词，可以由后面的 keylist 得到)
@@ -21,8 +102,11 @@ class Index():
         # record_end
         # offset
         # 所需 metadata
-        index_dict_list = []
+        blocks = self._record_blocks_v1v2(check_block)
+        index_dict_list = [dict(zip(INDEX_FIELDS, row)) for row in self._iter_index_blocks(blocks)]
+        return {"index_dict_list": index_dict_list, 'meta': self.get_meta()}
 
+    def _record_blocks_v1v2(self, check_block):
         f = open(self._fname, 'rb')
         f.seek(self._record_block_offset)
 
@@ -42,112 +126,46 @@ class Index():
             size_counter += self._number_width * 2
         assert (size_counter == record_block_info_size)
 
-        # actual record block
-        offset = 0
-        i = 0
-        size_counter = 0
+        # actual record block, only the 4-byte type of each is read
+        blocks = []
+        current_pos = f.tell()
         for compressed_size, decompressed_size in record_block_info_list:
-            current_pos = f.tell()
-            record_block_compressed = f.read(compressed_size)
-            record_block_type, = unpack('<L', record_block_compressed[:4])
-
-            # split record block according to the offset info from key block
-            while i < len(self._key_list):
-                index_dict = {}
-                index_dict['file_pos'] = current_pos
-                index_dict['compressed_size'] = compressed_size
-                index_dict['decompressed_size'] = decompressed_size
-                index_dict['record_block_type'] = record_block_type
-
-                record_start, key_text = self._key_list[i]
-                index_dict['record_start'] = record_start
-                index_dict['key_text'] = key_text.decode("utf-8")
-                index_dict['offset'] = offset
-
-                # reach the end of current record block
-                # next block
-                if record_start - offset >= decompressed_size:
-                    break
-
-                # record end index
-                if i < len(self._key_list) - 1:
-                    record_end = self._key_list[i + 1][0]
-                else:
-                    record_end = decompressed_size + offset
-                index_dict['record_end'] = record_end
-                i += 1
-                index_dict_list.append(index_dict)
-            offset += decompressed_size
-            size_counter += compressed_size
+            f.seek(current_pos)
+            record_block_type, = unpack('<L', f.read(4))
+            blocks.append((current_pos, compressed_size, decompressed_size, record_block_type))
+            current_pos += compressed_size
+        size_counter = sum(compressed_size for compressed_size, _ in record_block_info_list)
         assert (size_counter == record_block_size)
 
+        if check_block:
+            self._check_blocks(f, blocks)
         f.close()
-        # 这里比 mdd 部分稍有不同，应该还需要传递编码以及样式表信息
-        meta = {}
-        meta['encoding'] = self._encoding
-        meta['stylesheet'] = self._stylesheet
-        meta['version'] = self._version
-        meta['title'] = self.header[b'Title'].decode(self._encoding, errors='ignore')
-        meta['description'] = meta['title']
-        return {"index_dict_list": index_dict_list, 'meta': meta}
+        return blocks
 
     def get_index_v3(self, check_block=False):
-        index_dict_list = []
+        blocks = self._record_blocks_v3(check_block)
+        index_dict_list = [dict(zip(INDEX_FIELDS, row)) for row in self._iter_index_blocks(blocks)]
+        return {"index_dict_list": index_dict_list, 'meta': self.get_meta()}
 
+    def _record_blocks_v3(self, check_block):
         f = open(self._fname, 'rb')
         f.seek(self._record_block_offset)
 
-        offset = 0
-        i = 0
-        size_counter = 0
-
         num_record_blocks = self._read_int32(f)
         num_bytes = self._read_number(f)  # noqa
+        # only the header of each block is read: its sizes and 4-byte type
+        blocks = []
         for j in range(num_record_blocks):
             current_pos = f.tell()
-            decompressed_size = self._read_int32(f)
-            compressed_size = self._read_int32(f)
-            record_block_compressed = f.read(compressed_size)
-            record_block_type, = unpack('<L', record_block_compressed[:4])
-
-            # split record block according to the offset info from key block
-            while i < len(self._key_list):
-                index_dict = {}
-                index_dict['file_pos'] = current_pos
-                index_dict['compressed_size'] = compressed_size
-                index_dict['decompressed_size'] = decompressed_size
-                index_dict['record_block_type'] = record_block_type
-
-                record_start, key_text = self._key_list[i]
-                index_dict['record_start'] = record_start
-                index_dict['key_text'] = key_text.decode("utf-8")
-                index_dict['offset'] = offset
-
-                # reach the end of current record block
-                if record_start - offset >= decompressed_size:
-                    break
-                # record end index
-                if i < len(self._key_list) - 1:
-                    record_end = self._key_list[i + 1][0]
-                else:
-                    record_end = decompressed_size + offset
-
-                index_dict['record_end'] = record_end
-                i += 1
-                index_dict_list.append(index_dict)
-
-            offset += decompressed_size
-            size_counter += compressed_size
+            decompressed_size, compressed_size = unpack('>II', f.read(8))
+            record_block_type, = unpack('<L', f.read(4))
+            blocks.append((current_pos, compressed_size, decompressed_size, record_block_type))
+            f.seek(current_pos + 8 + compressed_size)
 
+        if check_block:
+            self._check_blocks(f, blocks, data_offset=8)
         f.close()
-        # 这里比 mdd 部分稍有不同，应该还需要传递编码以及样式表信息
-        meta = {}
-        meta['encoding'] = self._encoding
-        meta['version'] = self._version
-        meta['stylesheet'] = self._stylesheet
-        meta['title'] = self.header[b'Title'].decode(self._encoding)
-        meta['description'] = self.header[b'Title'].decode(self._encoding)
-        return {"index_dict_list": index_dict_list, 'meta': meta}
+        return blocks
 
 
 class MDX(MDXBase, Index):
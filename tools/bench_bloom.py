@@ -0,0 +1,70 @@
+"""Measure how many index probes the headword Bloom filters save.
+
+Opens the given MDX files (building their indexes and filters if needed)
+and looks up words taken from their keys, plus as many random strings,
+in every dictionary the way lookup_all does. Reports the probes made
+without and with the filters, the false positives, and the time of
+all lookups with and without the filters. The records found must be the
+same.
+
+    python tools/bench_bloom.py dicts/*.mdx -n 2000
+"""
+
+import os
+import sys
+import time
+import random
+import string
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.mdict_query2 import IndexBuilder2  # noqa: E402
+
+
+def lookup_all(dicts, words):
+    return [[q.mdx_lookup(None, word, ignorecase=True) for q in dicts] for word in words]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filenames', nargs='+', help='MDX files')
+    parser.add_argument('-n', '--number', type=int, default=2000, help='number of words from the keys')
+    args = parser.parse_args()
+
+    dicts = [IndexBuilder2(fname) for fname in args.filenames]
+    rng = random.Random(0)
+    keys = [key for q in dicts for key in q.get_mdx_keys(None)]
+    words = [rng.choice(keys) for _ in range(args.number)]
+    words += [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 12)))
+              for _ in range(args.number)]
+
+    # warm up the connection pools and the page cache
+    lookup_all(dicts, words)
+    start = time.perf_counter()
+    found = lookup_all(dicts, words)
+    filtered = time.perf_counter() - start
+
+    passed = sum(q.may_contain(word) for q in dicts for word in words)
+    hits = sum(1 for records in found for r in records if r)
+    total = len(dicts) * len(words)
+    print('%d words x %d dictionaries: %d probes without filters, %d with (%.1f%% saved)' % (
+        len(words), len(dicts), total, passed, 100.0 * (total - passed) / total))
+    print('%d found, %d false positives (%.2f%% of the misses)' % (
+        hits, passed - hits, 100.0 * (passed - hits) / max(total - hits, 1)))
+
+    blooms = [q._bloom for q in dicts]
+    for q in dicts:
+        q._bloom = None
+    start = time.perf_counter()
+    unfiltered = lookup_all(dicts, words)
+    elapsed = time.perf_counter() - start
+    for q, bloom in zip(dicts, blooms):
+        q._bloom = bloom
+    assert unfiltered == found
+    print('lookups %.1f us/word without filters, %.1f us/word with' % (
+        elapsed / len(words) * 1e6, filtered / len(words) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Check and benchmark readmdict._fast_decrypt against the per-byte loop.
+
+Decrypts random data of several sizes and key lengths with both versions,
+checks that the results are identical and times both on one large buffer,
+about the size of the key block info of a big encrypted dictionary.
+
+    python tools/bench_decrypt.py
+    python tools/bench_decrypt.py -s 16
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.word_query.readmdict import _fast_decrypt  # noqa: E402
+
+
+def fast_decrypt_loop(data, key):
+    """_fast_decrypt before it worked on whole streams"""
+    b = bytearray(data)
+    key = bytearray(key)
+    previous = 0x36
+    for i in range(len(b)):
+        t = (b[i] >> 4 | b[i] << 4) & 0xff
+        t = t ^ previous ^ (i & 0xff) ^ key[i % len(key)]
+        previous = b[i]
+        b[i] = t
+    return bytes(b)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-s', '--size', type=float, default=4, help='benchmark buffer size in MB')
+    args = parser.parse_args()
+
+    mismatches = 0
+    checks = 0
+    for size in (0, 1, 2, 255, 256, 257, 4095, 65536 + 3):
+        for key_size in (1, 7, 16, 20, 32):
+            data = os.urandom(size)
+            key = os.urandom(key_size)
+            checks += 1
+            if _fast_decrypt(data, key) != fast_decrypt_loop(data, key):
+                mismatches += 1
+    print('compared %d buffers, %d mismatches' % (checks, mismatches))
+
+    data = os.urandom(int(args.size * 1024 * 1024))
+    key = os.urandom(16)
+    for name, func in (('per byte', fast_decrypt_loop), ('streams', _fast_decrypt)):
+        start = time.perf_counter()
+        func(data, key)
+        elapsed = time.perf_counter() - start
+        print('%-9s %8.1f MB/s' % (name, args.size / elapsed))
+
+
+if __name__ == '__main__':
+    main()
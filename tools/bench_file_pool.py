@@ -0,0 +1,77 @@
+"""Microbenchmark: open-per-lookup reads vs. the pooled pread reader.
+
+Simulates record block reads the way IndexBuilder2.mdx_lookup performs them:
+one (seek, read) of a block-sized chunk at a random offset per lookup.
+
+    python tools/bench_file_pool.py                 # temporary 64 MB file
+    python tools/bench_file_pool.py some.mdx -n 50000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.pool import FilePool  # noqa: E402
+
+
+def bench_open_per_call(fname, offsets, size):
+    start = time.perf_counter()
+    for pos in offsets:
+        with open(fname, 'rb') as f:
+            f.seek(pos)
+            f.read(size)
+    return time.perf_counter() - start
+
+
+def bench_pooled(fname, offsets, size):
+    pool = FilePool()
+    start = time.perf_counter()
+    for pos in offsets:
+        with pool.open(fname) as f:
+            f.seek(pos)
+            f.read(size)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filename', nargs='?', help='file to read from, default: temporary file')
+    parser.add_argument('-n', '--number', type=int, default=20000, help='number of reads')
+    parser.add_argument('-s', '--size', type=int, default=16 * 1024, help='bytes per read')
+    args = parser.parse_args()
+
+    tmp_name = None
+    fname = args.filename
+    if not fname:
+        fd, tmp_name = tempfile.mkstemp(suffix='.mdx')
+        with os.fdopen(fd, 'wb') as f:
+            for _ in range(64):
+                f.write(os.urandom(1024 * 1024))
+        fname = tmp_name
+
+    try:
+        file_size = os.path.getsize(fname)
+        random.seed(0)
+        offsets = [random.randrange(0, max(file_size - args.size, 1)) for _ in range(args.number)]
+
+        # warm the page cache so both runs measure syscalls, not the disk
+        bench_pooled(fname, offsets, args.size)
+
+        t_open = bench_open_per_call(fname, offsets, args.size)
+        t_pool = bench_pooled(fname, offsets, args.size)
+        print('file: %s (%d bytes), %d reads of %d bytes' % (fname, file_size, args.number, args.size))
+        print('open per call: %8.2f us/read' % (t_open / args.number * 1e6))
+        print('pooled pread:  %8.2f us/read' % (t_pool / args.number * 1e6))
+        print('speedup:       %8.2fx' % (t_open / t_pool))
+    finally:
+        if tmp_name:
+            os.remove(tmp_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Check and benchmark helper.fix_html against the previous list-based version.
+
+Compares the output of both implementations on random tag soup (balanced,
+missing and extra closing tags, mixed case, void elements) and on the
+records of the given MDX files, then times both on entries with thousands
+of tags.
+
+    python tools/bench_fix_html.py
+    python tools/bench_fix_html.py oald10.mdx -n 2000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.helper import fix_html, regex_opened_tag, regex_closed_tag  # noqa: E402
+from flask_mdict.word_query.readmdict import MDX  # noqa: E402
+
+
+def fix_html_lists(html_data):
+    """fix_html before the Counter rewrite, quadratic in the number of tags"""
+    opened_tags = regex_opened_tag.findall(html_data)
+    closed_tags = regex_closed_tag.findall(html_data)
+    opened_tags = [tag.lower() for tag in opened_tags]
+    closed_tags = [tag.lower() for tag in closed_tags]
+    # remove single tag
+    for tag in ['img', 'link', 'input', 'br', 'hr', 'p', 'meta']:
+        while tag in opened_tags:
+            opened_tags.remove(tag)
+        while tag in closed_tags:
+            closed_tags.remove(tag)
+    if len(opened_tags) == len(closed_tags):
+        return html_data
+    for tag in opened_tags[::-1]:
+        if tag in closed_tags:
+            closed_tags.remove(tag)
+        else:
+            html_data += '</%s>' % tag
+    for tag in closed_tags:
+        html_data = '<%s>' % tag + html_data
+    return html_data
+
+
+TAGS = ['div', 'span', 'b', 'i', 'a', 'font', 'DIV', 'Span', 'p', 'br', 'img', 'sup']
+
+
+def random_html(tags, rng):
+    parts = []
+    stack = []
+    for _ in range(tags):
+        r = rng.random()
+        if r < 0.45:
+            tag = rng.choice(TAGS)
+            parts.append('<%s class="c%d">' % (tag, rng.randint(0, 9)) if rng.random() < 0.5 else '<%s>' % tag)
+            stack.append(tag)
+        elif r < 0.9 and stack:
+            # mostly well nested, sometimes out of order or dropped
+            tag = stack.pop(rng.randrange(len(stack)) if rng.random() < 0.1 else -1)
+            if rng.random() < 0.95:
+                parts.append('</%s>' % tag)
+        else:
+            parts.append('</%s>' % rng.choice(TAGS))
+        parts.append('text')
+    return ''.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filenames', nargs='*', help='MDX files whose records are compared too')
+    parser.add_argument('-n', '--number', type=int, default=2000, help='number of random documents')
+    parser.add_argument('-t', '--tags', type=int, default=5000, help='tags in the benchmark entries')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    corpus = [random_html(rng.randint(0, 60), rng) for _ in range(args.number)]
+    for fname in args.filenames:
+        mdx = MDX(fname)
+        corpus.extend(value.decode(mdx._encoding, errors='ignore') for _, value in mdx.items())
+    mismatches = sum(1 for html in corpus if fix_html(html) != fix_html_lists(html))
+    print('compared %d documents, %d mismatches' % (len(corpus), mismatches))
+
+    entries = [random_html(args.tags, rng) for _ in range(10)]
+    for name, func in (('list based', fix_html_lists), ('counter based', fix_html)):
+        start = time.perf_counter()
+        for html in entries:
+            func(html)
+        print('%-14s %8.2f ms/entry (%d tags)' % (name, (time.perf_counter() - start) / len(entries) * 1000, args.tags))
+
+
+if __name__ == '__main__':
+    main()
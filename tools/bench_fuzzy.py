@@ -0,0 +1,86 @@
+"""Benchmark the fuzzy headword search of the suggest index.
+
+Indexes the keys of the given MDX files like /api/suggest does, then times
+SuggestIndex.fuzzy for words taken from the keys with one or two random
+edits, at every number of allowed edits up to --max-edits. With --check
+the matches are compared with a plain Levenshtein distance to every key.
+
+    python tools/bench_fuzzy.py dicts/*.mdx -n 200 --check
+"""
+
+import os
+import sys
+import time
+import random
+import string
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.mdict_query2 import IndexBuilder2  # noqa: E402
+from flask_mdict.suggest import SuggestIndex  # noqa: E402
+from flask_mdict.word_query.mdict_query import fold_key  # noqa: E402
+
+
+def levenshtein(a, b):
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        above, row = row, [i]
+        for j, cb in enumerate(b, 1):
+            row.append(min(row[j - 1] + 1, above[j] + 1, above[j - 1] + (ca != cb)))
+    return row[-1]
+
+
+def misspell(rng, word):
+    for _ in range(rng.randint(1, 2)):
+        pos = rng.randrange(len(word) + 1)
+        edit = rng.choice('isd') if word else 'i'
+        if edit == 'i':
+            word = word[:pos] + rng.choice(string.ascii_lowercase) + word[pos:]
+        elif edit == 's':
+            word = word[:pos] + rng.choice(string.ascii_lowercase) + word[pos + 1:]
+        else:
+            word = word[:pos] + word[pos + 1:]
+    return word
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filenames', nargs='+', help='MDX files')
+    parser.add_argument('-n', '--number', type=int, default=200, help='number of words looked up')
+    parser.add_argument('--max-edits', type=int, default=2, help='largest number of edits tried')
+    parser.add_argument('--check', action='store_true', help='compare with a scan of every key')
+    args = parser.parse_args()
+
+    mdicts = {
+        str(n): {'type': 'mdict', 'enable': True, 'query': IndexBuilder2(fname), 'title': fname}
+        for n, fname in enumerate(args.filenames)
+    }
+    suggest_index = SuggestIndex()
+    suggest_index.build(mdicts, {})
+    keys, words, _, _ = suggest_index._data
+    rng = random.Random(0)
+    targets = [misspell(rng, rng.choice(keys)) for _ in range(args.number)]
+    print('%d keys, %d words' % (len(keys), len(targets)))
+
+    for max_edits in range(1, args.max_edits + 1):
+        start = time.perf_counter()
+        found = [suggest_index.fuzzy(word, max_edits) for word in targets]
+        elapsed = time.perf_counter() - start
+        print('  max_edits %d: %8.2f ms/word, %6.1f matches/word' % (
+            max_edits, elapsed / len(targets) * 1e3, sum(map(len, found)) / len(targets)))
+        if args.check:
+            for word, matches in zip(targets, found):
+                target = fold_key(word)
+                expected = []
+                for position in range(len(keys)):
+                    key = keys[position]
+                    display = words.get(position, key)
+                    distance = levenshtein(key, target)
+                    if distance <= max_edits:
+                        expected.append((distance, display))
+                assert sorted(matches) == sorted(expected), word
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark: case-insensitive headword lookup, lower(key_text) vs. key_fold.
+
+Builds a synthetic MDX_INDEX with the pre-key_fold schema, measures the old
+`lower(key_text) = ?` query, migrates it with IndexBuilder2.upgrade_index and
+measures IndexBuilder2.lookup_indexes(..., ignorecase=True) on the same words.
+
+    python tools/bench_ignorecase_lookup.py
+    python tools/bench_ignorecase_lookup.py -e 1000000 -n 200
+"""
+
+import os
+import sys
+import time
+import random
+import string
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.mdict_query2 import IndexBuilder2  # noqa: E402
+
+
+def make_index(db_name, entries):
+    random.seed(0)
+    words = set()
+    while len(words) < entries:
+        word = ''.join(random.choice(string.ascii_lowercase) for _ in range(random.randint(3, 12)))
+        if random.random() < 0.1:
+            word = word.capitalize()
+        words.add(word)
+    words = sorted(words)
+    conn = sqlite3.connect(db_name)
+    conn.execute('''CREATE TABLE MDX_INDEX
+               (key_text text not null,
+                file_pos integer,
+                compressed_size integer,
+                decompressed_size integer,
+                record_block_type integer,
+                record_start integer,
+                record_end integer,
+                offset integer
+                )''')
+    conn.executemany(
+        'INSERT INTO MDX_INDEX VALUES (?,?,?,?,?,?,?,?)',
+        ((w, i // 100, 0, 0, 2, i, i + 1, 0) for i, w in enumerate(words)))
+    conn.execute('CREATE INDEX key_index ON MDX_INDEX (key_text)')
+    conn.commit()
+    conn.close()
+    return words
+
+
+def bench(conn, words, lookup):
+    start = time.perf_counter()
+    for word in words:
+        lookup(conn, word)
+    return (time.perf_counter() - start) / len(words)
+
+
+def old_lookup(conn, keyword):
+    sql = 'SELECT * FROM MDX_INDEX WHERE lower(key_text) = ?'
+    return conn.execute(sql, (keyword.lower(), )).fetchall()
+
+
+def new_lookup(conn, keyword):
+    return IndexBuilder2.lookup_indexes(conn, keyword, ignorecase=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-e', '--entries', type=int, default=500000, help='number of headwords')
+    parser.add_argument('-n', '--number', type=int, default=100, help='number of lookups')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_name = os.path.join(tmp_dir, 'bench.mdx.db')
+        print('building %d-entry index...' % args.entries)
+        words = make_index(db_name, args.entries)
+        queries = [random.choice(words).upper() for _ in range(args.number)]
+
+        conn = sqlite3.connect(db_name)
+        t_old = bench(conn, queries, old_lookup)
+        conn.close()
+
+        start = time.perf_counter()
+        IndexBuilder2.upgrade_index(db_name)
+        t_migrate = time.perf_counter() - start
+
+        conn = sqlite3.connect(db_name)
+        t_new = bench(conn, queries, new_lookup)
+        conn.close()
+
+        print('migration (add key_fold + index): %.2f s' % t_migrate)
+        print('lower(key_text) = ?: %10.1f us/lookup' % (t_old * 1e6))
+        print('key_fold = ?:        %10.1f us/lookup' % (t_new * 1e6))
+        print('speedup:             %10.1fx' % (t_old / t_new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark the sqlite and compact index backends of IndexBuilder2.
+
+Builds the index of every given MDX file with both backends (into
+temporary directories), then compares build time, size on disk, the
+latency of an index probe alone and of a whole mdx_lookup, and the time
+to list all keys. The lookups and key lists of both backends must be
+equal.
+
+    python tools/bench_index_backend.py oald10.mdx -n 5000
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.mdict_query2 import IndexBuilder2  # noqa: E402
+from flask_mdict.pool import connection_pool  # noqa: E402
+
+
+def bench(fname, backend, index_dir, words):
+    IndexBuilder2.index_backend = backend
+    start = time.perf_counter()
+    q = IndexBuilder2(fname, index_dir=index_dir)
+    build = time.perf_counter() - start
+    size = sum(os.path.getsize(os.path.join(index_dir, f)) for f in os.listdir(index_dir))
+
+    if backend == 'compact':
+        compact = q._compact(q._mdx_db)
+
+        def probe(word):
+            return compact.lookup(word, ignorecase=True)
+    else:
+        def probe(word):
+            with connection_pool.connection(q._mdx_db) as conn:
+                return q.lookup_indexes(conn, word, ignorecase=True)
+
+    # opens the index, or the pooled connection
+    probe(words[0])
+    start = time.perf_counter()
+    indexes = [probe(word) for word in words]
+    probe_time = (time.perf_counter() - start) / len(words)
+    start = time.perf_counter()
+    records = [q.mdx_lookup(None, word, ignorecase=True) for word in words]
+    lookup_time = (time.perf_counter() - start) / len(words)
+    start = time.perf_counter()
+    keys = q.get_mdx_keys(None)
+    keys_time = time.perf_counter() - start
+
+    print('  %-8s build %7.2f s  size %8.1f MB  probe %7.1f us  lookup %7.1f us  keys %6.2f s' % (
+        backend, build, size / 1e6, probe_time * 1e6, lookup_time * 1e6, keys_time))
+    return indexes, records, keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filenames', nargs='+', help='MDX files')
+    parser.add_argument('-n', '--number', type=int, default=5000, help='number of words looked up')
+    args = parser.parse_args()
+
+    for fname in args.filenames:
+        print(os.path.basename(fname))
+        results = {}
+        for backend in IndexBuilder2.INDEX_BACKENDS:
+            index_dir = tempfile.mkdtemp()
+            try:
+                if not results:
+                    # the words come from the first backend, looked up in both
+                    IndexBuilder2.index_backend = backend
+                    keys = IndexBuilder2(fname, index_dir=index_dir).get_mdx_keys(None)
+                    rng = random.Random(0)
+                    words = [rng.choice(keys) for _ in range(args.number)]
+                    words += [word.upper() for word in words[:args.number // 10]]
+                    shutil.rmtree(index_dir)
+                    os.makedirs(index_dir)
+                results[backend] = bench(fname, backend, index_dir, words)
+            finally:
+                shutil.rmtree(index_dir)
+        first, *others = results.values()
+        for other in others:
+            assert other == first, 'the backends disagree'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark: splitting key blocks key by key vs. in one pass per block.
+
+With MDX files, times reading their keys and record index (the parsing
+done before an index build) with both splitters and checks that the key
+lists are identical. Without files, generates the key blocks of a
+dictionary with a million keys in each of several encodings.
+
+    python tools/bench_key_block.py
+    python tools/bench_key_block.py oald10.mdx -r 3
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from struct import unpack
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.word_query.readmdict2 import MDX  # noqa: E402
+
+
+def split_key_block_bytewise(self, key_block):
+    """MDict._split_key_block before it split whole blocks at once"""
+    key_list = []
+    key_start_index = 0
+    while key_start_index < len(key_block):
+        # the corresponding record's offset in record block
+        key_id = unpack(self._number_format, key_block[key_start_index:key_start_index+self._number_width])[0]
+        # key text ends with '\x00'
+        if self._encoding == 'UTF-16':
+            delimiter = b'\x00\x00'
+            width = 2
+        else:
+            delimiter = b'\x00'
+            width = 1
+        i = key_start_index + self._number_width
+        while i < len(key_block):
+            if key_block[i:i+width] == delimiter:
+                key_end_index = i
+                break
+            i += width
+        key_text = key_block[key_start_index+self._number_width:key_end_index]\
+            .decode(self._encoding, errors='ignore').encode('utf-8').strip()
+        key_start_index = key_end_index + width
+        key_list += [(key_id, key_text)]
+    return key_list
+
+
+SPLITTERS = [('bytewise', split_key_block_bytewise), ('one pass', MDX._split_key_block)]
+
+
+def make_key_blocks(encoding, number, keys_per_block=2000):
+    random.seed(0)
+    chars = 'abcdefghijklmnopqrstuvwxyz -\'éüß中文词典'
+    codec = 'utf-16-le' if encoding == 'UTF-16' else encoding
+    terminator = '\x00'.encode(codec)
+    blocks = []
+    keys = []
+    offset = 0
+    for i in range(number):
+        key = ''.join(random.choice(chars) for _ in range(random.randint(1, 16)))
+        keys.append(offset.to_bytes(8, 'big') + key.encode(codec, errors='ignore') + terminator)
+        offset += random.randint(100, 2000)
+        if len(keys) == keys_per_block:
+            blocks.append(b''.join(keys))
+            keys = []
+    if keys:
+        blocks.append(b''.join(keys))
+    return blocks
+
+
+def bench_blocks(number):
+    for encoding in ('UTF-8', 'UTF-16', 'GBK'):
+        blocks = make_key_blocks(encoding, number)
+        mdx = MDX.__new__(MDX)
+        mdx._encoding = encoding
+        mdx._number_width = 8
+        mdx._number_format = '>Q'
+        results = []
+        timings = []
+        for name, split in SPLITTERS:
+            start = time.perf_counter()
+            key_list = []
+            for block in blocks:
+                key_list.extend(split(mdx, block))
+            timings.append('%s %.2fs' % (name, time.perf_counter() - start))
+            results.append(key_list)
+        print('%-7s %d keys: %s, %s' % (encoding, number, ', '.join(timings),
+                                        'same' if results[0] == results[1] else 'DIFFERENT'))
+
+
+def bench_files(fnames, repeat):
+    for fname in fnames:
+        results = []
+        timings = []
+        for name, split in SPLITTERS:
+            MDX._split_key_block = split
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                mdx = MDX(fname)
+                index = mdx.get_index(check_block=False)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append('%s %.2fs' % (name, best))
+            results.append((mdx._key_list, index['index_dict_list']))
+        MDX._split_key_block = SPLITTERS[1][1]
+        print('%s, %d keys: %s, %s' % (os.path.basename(fname), len(results[0][0]), ', '.join(timings),
+                                       'same' if results[0] == results[1] else 'DIFFERENT'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filenames', nargs='*', help='MDX files, default: generated key blocks')
+    parser.add_argument('-n', '--number', type=int, default=1000000, help='number of generated keys')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='best of REPEAT runs per file')
+    args = parser.parse_args()
+
+    if args.filenames:
+        bench_files(args.filenames, args.repeat)
+    else:
+        bench_blocks(args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark: pure Python LZO1X decompression vs. python-lzo.
+
+Reads the LZO-compressed record blocks of the given v1.x MDX files, checks
+that the pure Python decompressor gives the same output as python-lzo and
+reports the time per block of both. Without files, blocks made of
+dictionary-like HTML are compressed with python-lzo.
+
+    python tools/bench_lzo.py oxford_v12.mdx
+    python tools/bench_lzo.py -n 50
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from struct import unpack
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.word_query import lzo  # noqa: E402
+from flask_mdict.word_query.readmdict2 import MDX  # noqa: E402
+try:
+    import lzo as python_lzo
+except ImportError:
+    python_lzo = None
+
+
+def read_blocks(fname, number):
+    """(compressed data, decompressed size) of the LZO record blocks of fname"""
+    mdx = MDX(fname)
+    blocks = {}
+    for index in mdx.get_index(check_block=False)['index_dict_list']:
+        if index['record_block_type'] == 1:
+            blocks[index['file_pos']] = (index['compressed_size'], index['decompressed_size'])
+    result = []
+    with open(fname, 'rb') as f:
+        for file_pos, (compressed_size, decompressed_size) in sorted(blocks.items())[:number]:
+            f.seek(file_pos)
+            data = f.read(compressed_size)
+            assert unpack('<L', data[:4])[0] == 1
+            result.append((data[8:], decompressed_size))
+    return result
+
+
+def make_blocks(number, size):
+    random.seed(0)
+    words = [''.join(random.choice('abcdefghijklmnop') for _ in range(random.randint(2, 10))) for _ in range(2000)]
+    result = []
+    for _ in range(number):
+        parts = []
+        length = 0
+        while length < size:
+            w = random.choice(words)
+            part = '<div class="entry"><span class="hw">%s</span> <i>%s</i> %s</div>\r\n' % (
+                w, random.choice(['n.', 'v.', 'adj.']), ' '.join(random.sample(words, 12)))
+            parts.append(part)
+            length += len(part)
+        data = ''.join(parts).encode('utf-8')
+        # python-lzo prepends 0xf0 and the big-endian size
+        result.append((python_lzo.compress(data)[5:], len(data)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filenames', nargs='*', help='v1.x MDX files with LZO record blocks')
+    parser.add_argument('-n', '--number', type=int, default=20, help='number of blocks per file')
+    parser.add_argument('-s', '--size', type=int, default=64 * 1024, help='size of generated blocks')
+    args = parser.parse_args()
+
+    blocks = []
+    for fname in args.filenames:
+        blocks.extend(read_blocks(fname, args.number))
+    if not args.filenames:
+        if python_lzo is None:
+            print('python-lzo is not installed, give MDX files with LZO record blocks')
+            return
+        blocks = make_blocks(args.number, args.size)
+    if not blocks:
+        print('no LZO record block found')
+        return
+    total = sum(size for _, size in blocks)
+    print('%d blocks, %.1f KB on average' % (len(blocks), total / len(blocks) / 1024))
+
+    start = time.perf_counter()
+    output = [lzo.decompress(data, size) for data, size in blocks]
+    elapsed = time.perf_counter() - start
+    print('pure       %8.2f ms/block, %6.2f MB/s' % (elapsed / len(blocks) * 1000, total / elapsed / 1024 / 1024))
+
+    if python_lzo is None:
+        print('python-lzo is not installed')
+        return
+    start = time.perf_counter()
+    expected = [python_lzo.decompress(b'\xf0' + size.to_bytes(4, 'big') + data) for data, size in blocks]
+    elapsed = time.perf_counter() - start
+    print('python-lzo %8.2f ms/block, %6.2f MB/s' % (elapsed / len(blocks) * 1000, total / elapsed / 1024 / 1024))
+    print('%d mismatches' % sum(1 for a, b in zip(output, expected) if a != b))
+
+
+if __name__ == '__main__':
+    main()
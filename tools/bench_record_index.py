@@ -0,0 +1,67 @@
+"""Benchmark the record block pass of readmdict2.Index.get_index.
+
+Times, for every given MDX/MDD file, reading every record block in order
+(what get_index used to do just to learn the block types), the header-only
+block table pass of get_index(check_block=False), and get_index(check_block=True)
+with its blocks decoded in a thread pool against decoding them one by one.
+The indexes built with and without check_block must be equal.
+
+    python tools/bench_record_index.py oald10.mdx oald10.mdd
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.word_query.readmdict2 import MDX, MDD  # noqa: E402
+
+
+def read_blocks(d, blocks, data_offset, decode=False):
+    """Read every record block in file order in this thread, decode it if asked"""
+    with open(d._fname, 'rb') as f:
+        for file_pos, compressed_size, decompressed_size, _ in blocks:
+            f.seek(file_pos + data_offset)
+            block = f.read(compressed_size)
+            if decode:
+                d._decode_block(block, decompressed_size)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filenames', nargs='+', help='MDX or MDD files')
+    args = parser.parse_args()
+
+    for fname in args.filenames:
+        d = (MDD if fname.lower().endswith('.mdd') else MDX)(fname)
+        index = d.get_index(check_block=False)['index_dict_list']
+        blocks = sorted(set(
+            (i['file_pos'], i['compressed_size'], i['decompressed_size'], i['record_block_type'])
+            for i in index
+        ))
+        data_offset = 8 if d._version >= 3 else 0
+        print('%s: %d records in %d blocks, %.1f MB' % (
+            os.path.basename(fname), len(index), len(blocks),
+            sum(b[1] for b in blocks) / 1e6))
+
+        elapsed, _ = timed(read_blocks, d, blocks, data_offset)
+        print('  %-34s %8.2f s' % ('read every block', elapsed))
+        elapsed, _ = timed(d.get_index, check_block=False)
+        print('  %-34s %8.2f s' % ('get_index, headers only', elapsed))
+        elapsed, _ = timed(read_blocks, d, blocks, data_offset, decode=True)
+        print('  %-34s %8.2f s' % ('decode every block, one by one', elapsed))
+        elapsed, checked = timed(d.get_index, check_block=True)
+        print('  %-34s %8.2f s' % ('get_index, check_block', elapsed))
+        assert checked['index_dict_list'] == index
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Benchmark: chained re.sub link rewriting vs. the single-pass RecordRewriter.
+
+Runs both over the largest records of the given MDX files (or over generated
+50-200 KB entries), checks that every configuration used by the views gives
+identical output and reports the throughput in MB/s.
+
+    python tools/bench_rewriter.py
+    python tools/bench_rewriter.py oald10.mdx collins.mdx -n 200
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.rewriter import RecordRewriter  # noqa: E402
+from flask_mdict.word_query.readmdict import MDX  # noqa: E402
+
+# the substitutions RecordRewriter replaces
+regex_src_schema = re.compile(r'([ "]src=["\'])(/|file:///)?(?!data:)(.+?["\'])')
+regex_href_end_slash = re.compile(r'([ "]href=["\'].+?)(/)(["\'])')
+regex_href_schema_sound = re.compile(r'([ "]href=["\'])(sound://)([^#].+?["\'])')
+regex_href_schema_entry = re.compile(r'([ "]href=["\'])(entry://)([^#].+?["\'])')
+regex_href_no_schema = re.compile(r'([ "]href=["\'])(?!http://|https://|sound://|entry://)([^#].+?["\'])')
+regex_css = re.compile(r'(<link.*? )(href)(=".+?>)')
+regex_js = re.compile(r'(<script.*? )(src)(=".+?>)')
+
+PREFIX = '/mdict/uuid_0EEAC91A-11D2-316E-BB96-35B45F27677E/resource/'
+ENTRY_URL = '/mdict/uuid_0EEAC91A-11D2-316E-BB96-35B45F27677E/query/'
+
+
+def chain_api(record, keep_css, keep_js):
+    """api.lookup_word / lookup_all"""
+    record = regex_src_schema.sub(r'\g<1>%s/\3' % PREFIX, record)
+    record = regex_href_no_schema.sub(r'\g<1>%s/\2' % PREFIX, record)
+    record = regex_href_end_slash.sub(r'\1\3', record)
+    record = regex_href_schema_sound.sub(r' data-sound-url="%s/\3" \1\2\3' % PREFIX, record)
+    record = regex_href_schema_entry.sub(r' data-entry-word="\3" \1\2\3', record)
+    return chain_css_js(record, keep_css, keep_js)
+
+
+def chain_query_word(record, keep_css, keep_js):
+    """views.query_word"""
+    record = regex_src_schema.sub(r'\g<1>%s/\3' % PREFIX, record)
+    record = regex_href_no_schema.sub(r'\g<1>%s/\2' % PREFIX, record)
+    record = regex_href_end_slash.sub(r'\1\3', record)
+    record = regex_href_schema_sound.sub(r' data-sound-url="%s/\3" \1\2\3' % PREFIX, record)
+    record = regex_href_schema_entry.sub(r' data-entry-url="%s\3" \1\2\3' % ENTRY_URL, record)
+    return chain_css_js(record, keep_css, keep_js)
+
+
+def chain_query_word_all(record, keep_css, keep_js):
+    """views.query_word_all"""
+    record = regex_href_end_slash.sub(r'\1\3', record)
+    record = regex_src_schema.sub(r'\g<1>%s/\3' % PREFIX, record)
+    record = regex_href_no_schema.sub(r'\g<1>%s/\2' % PREFIX, record)
+    record = regex_href_schema_sound.sub(r' data-sound-url="%s/\3" \1\2\3' % PREFIX, record)
+    record = regex_href_schema_entry.sub(r' data-entry-url="%s\3" \1\2\3' % ENTRY_URL, record)
+    return chain_css_js(record, keep_css, keep_js)
+
+
+def chain_query_word_lite(record, keep_css, keep_js):
+    """views.query_word_lite"""
+    record = regex_href_end_slash.sub(r'\1\3', record)
+    record = regex_src_schema.sub(r'\g<1>%s/\3' % PREFIX, record)
+    record = regex_href_no_schema.sub(r'\g<1>%s/\2' % PREFIX, record)
+    return chain_css_js(record, keep_css, keep_js)
+
+
+def chain_css_js(record, keep_css, keep_js):
+    if not keep_css:
+        record = regex_css.sub(r'\1data-\2\3', record)
+    if not keep_js:
+        record = regex_js.sub(r'\1data-\2\3', record)
+    return record
+
+
+CONFIGS = [
+    ('api', chain_api, RecordRewriter(PREFIX)),
+    ('query_word', chain_query_word, RecordRewriter(PREFIX, entry_url=ENTRY_URL)),
+    ('query_word_all', chain_query_word_all, RecordRewriter(PREFIX, entry_url=ENTRY_URL)),
+    ('query_word_lite', chain_query_word_lite, RecordRewriter(PREFIX, mark_links=False)),
+]
+
+SNIPPETS = [
+    '<img src="img/{w}.png">', '<img src="/img/{w}.png"/>', "<img src='file:///{w}.jpg'>",
+    '<img src="data:image/png;base64,iVBORw0KGgo{w}=">', '<a href="entry://{w}">{w}</a>',
+    '<a href="sound://{w}.mp3"><img src="sp.png"></a>', '<a href="https://example.com/{w}/">web</a>',
+    '<a href="#{w}">anchor</a>', '<a href="{w}.html">rel</a>', '<a href="entry://#{w}">x</a>',
+    '<link rel="stylesheet" type="text/css" href="{w}.css">', '<script src="{w}.js"></script>',
+    '<script type="text/javascript">var a = "{w}";</script>', '<span class="{w}">{w}</span>',
+    '<a class="x" href=\'sound://{w}/\'>s</a>', '<div onclick="play(\'{w}/\')">p</div>', '\n',
+]
+
+
+def make_records(number, min_size, max_size):
+    random.seed(0)
+    records = []
+    for _ in range(number):
+        size = random.randint(min_size, max_size)
+        parts = []
+        length = 0
+        while length < size:
+            w = ''.join(random.choice('abcdefghij') for _ in range(random.randint(2, 8)))
+            part = random.choice(SNIPPETS).format(w=w) + '<p>' + 'lorem ipsum ' * random.randint(0, 8) + '</p>'
+            parts.append(part)
+            length += len(part)
+        records.append(''.join(parts))
+    return records
+
+
+def read_records(fnames, number, min_size):
+    records = []
+    for fname in fnames:
+        mdx = MDX(fname)
+        encoding = mdx._encoding
+        for _, value in mdx.items():
+            if len(value) >= min_size:
+                records.append(value.decode(encoding, errors='ignore'))
+    records.sort(key=len, reverse=True)
+    return records[:number]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filenames', nargs='*', help='MDX files to take records from, default: generated')
+    parser.add_argument('-n', '--number', type=int, default=100, help='number of records')
+    parser.add_argument('-s', '--min-size', type=int, default=50 * 1024, help='minimum record size in bytes')
+    args = parser.parse_args()
+
+    if args.filenames:
+        records = read_records(args.filenames, args.number, args.min_size)
+    else:
+        records = make_records(args.number, args.min_size, 4 * args.min_size)
+    if not records:
+        print('no record of %d bytes or more' % args.min_size)
+        return
+    total = sum(len(r.encode('utf-8')) for r in records) / 1024 / 1024
+    print('%d records, %.1f MB' % (len(records), total))
+
+    for name, chain, rewriter in CONFIGS:
+        mismatches = 0
+        for record in records:
+            for keep_css, keep_js in ((True, False), (False, True)):
+                if chain(record, keep_css, keep_js) != rewriter.rewrite(record, keep_css, keep_js):
+                    mismatches += 1
+        start = time.perf_counter()
+        for record in records:
+            chain(record, False, False)
+        t_chain = time.perf_counter() - start
+        start = time.perf_counter()
+        for record in records:
+            rewriter.rewrite(record, False, False)
+        t_single = time.perf_counter() - start
+        print('%-16s chained %7.1f MB/s, single pass %7.1f MB/s (%.1fx), %d mismatches' % (
+            name, total / t_chain, total / t_single, t_chain / t_single, mismatches))
+
+
+if __name__ == '__main__':
+    main()
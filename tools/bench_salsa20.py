@@ -0,0 +1,87 @@
+"""Check and benchmark the NumPy Salsa20 backend against pureSalsa20.
+
+Encrypts random data with both implementations for 16 and 32 byte keys,
+8 and 20 rounds and sizes around the 64-byte block boundary, including
+counters about to wrap, then checks readmdict._salsa_decrypt. Finally
+reports the throughput of both backends and of decrypting record blocks
+that share one key, which is what encrypted MDict 3.0 files do.
+
+    python tools/bench_salsa20.py
+    python tools/bench_salsa20.py -s 4
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.word_query import pureSalsa20  # noqa: E402
+from flask_mdict.word_query.readmdict import _salsa_decrypt  # noqa: E402
+try:
+    from flask_mdict.word_query import fastSalsa20
+except ImportError:
+    fastSalsa20 = None
+
+
+def compare():
+    mismatches = 0
+    checks = 0
+    for key_size in (16, 32):
+        for rounds in (8, 20):
+            for size in (0, 1, 63, 64, 65, 255, 1000, 4096):
+                for counter in (0, 2**32 - 1, 2**64 - 2):
+                    key = os.urandom(key_size)
+                    iv = os.urandom(8)
+                    data = os.urandom(size)
+                    pure = pureSalsa20.Salsa20(key, iv, rounds)
+                    fast = fastSalsa20.Salsa20(key, iv, rounds)
+                    pure.setCounter(counter)
+                    fast.setCounter(counter)
+                    checks += 1
+                    if (pure.encryptBytes(data) != fast.encryptBytes(data)
+                            or pure.getCounter() != fast.getCounter()):
+                        mismatches += 1
+    return checks, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-s', '--size', type=float, default=1, help='benchmark buffer size in MB')
+    args = parser.parse_args()
+
+    if fastSalsa20 is None:
+        print('NumPy is not installed, only pureSalsa20 is available')
+    else:
+        print('compared %d streams, %d mismatches' % compare())
+
+    mismatches = 0
+    for size in (0, 1, 200, 255, 256, 300):
+        key = os.urandom(16)
+        data = os.urandom(size)
+        expected = pureSalsa20.Salsa20(key=key, IV=b'\x00' * 8, rounds=8).encryptBytes(data)
+        for _ in range(2):
+            if _salsa_decrypt(data, key) != expected:
+                mismatches += 1
+    print('_salsa_decrypt: %d mismatches' % mismatches)
+
+    data = os.urandom(int(args.size * 1024 * 1024))
+    key = os.urandom(16)
+    backends = [('pure', pureSalsa20)]
+    if fastSalsa20 is not None:
+        backends.append(('numpy', fastSalsa20))
+    for name, module in backends:
+        start = time.perf_counter()
+        module.Salsa20(key, b'\x00' * 8, 8).encryptBytes(data)
+        print('%-6s %8.2f MB/s' % (name, args.size / (time.perf_counter() - start)))
+
+    blocks = [os.urandom(255) for _ in range(10000)]
+    start = time.perf_counter()
+    for block in blocks:
+        _salsa_decrypt(block, key)
+    print('%d record blocks with one key: %.1f ms' % (len(blocks), (time.perf_counter() - start) * 1000))
+
+
+if __name__ == '__main__':
+    main()
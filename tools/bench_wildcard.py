@@ -0,0 +1,72 @@
+"""Benchmark wildcard key searches with and without the wildcard index.
+
+Builds the WildcardIndex of every given MDX file, then times patterns
+with a leading or inner * (given with -p, or a default set plus patterns
+cut from random keys) through the LIKE query of the index backend and
+through the wildcard index. The keys found must be the same; patterns
+the index leaves to LIKE are reported as such.
+
+    python tools/bench_wildcard.py oald10.mdx -p '*tion' -p 'un*able'
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.mdict_query2 import IndexBuilder2  # noqa: E402
+from flask_mdict.pool import connection_pool  # noqa: E402
+from flask_mdict.wildcard import WildcardIndex  # noqa: E402
+
+PATTERNS = ['*tion', '*ing', 'un*able', '*ph*', 'a*b', '*ss*ss*']
+
+
+def like(q, pattern):
+    if q.index_backend == 'compact':
+        return q._compact(q._mdx_db).like(pattern)
+    with connection_pool.connection(q._mdx_db) as conn:
+        return q.get_keys(conn, pattern.replace('%', '*'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filenames', nargs='+', help='MDX files')
+    parser.add_argument('-p', '--pattern', action='append', help='wildcard pattern, * for any text')
+    parser.add_argument('-n', '--number', type=int, default=10, help='number of patterns from random keys')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for fname in args.filenames:
+        q = IndexBuilder2(fname)
+        keys = q.get_mdx_keys(None)
+        start = time.perf_counter()
+        wildcard = WildcardIndex(keys)
+        print('%s: %d keys, index built in %.2f s' % (
+            os.path.basename(fname), len(keys), time.perf_counter() - start))
+
+        patterns = list(args.pattern or PATTERNS)
+        for key in rng.sample(keys, min(args.number, len(keys))):
+            cut = rng.randrange(len(key) + 1)
+            patterns.append(rng.choice(['*' + key[cut:], key[:cut] + '*' + key[cut + 1:]]))
+        for pattern in patterns:
+            pattern = q._like_pattern(pattern)
+            start = time.perf_counter()
+            expected = like(q, pattern)
+            like_time = time.perf_counter() - start
+            start = time.perf_counter()
+            found = wildcard.like(pattern)
+            index_time = time.perf_counter() - start
+            if found is None:
+                print('  %-20s %8d keys  LIKE %8.1f ms  (left to LIKE)' % (
+                    pattern, len(expected), like_time * 1e3))
+                continue
+            assert found == expected, pattern
+            print('  %-20s %8d keys  LIKE %8.1f ms  index %8.2f ms' % (
+                pattern, len(found), like_time * 1e3, index_time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Build the full-text indexes of MDX dictionaries for /api/fulltext.
+
+Writes name.mdx.fts.db next to the index of every given MDX file (building
+the index first if needed). Pass the INDEX_DIR of the server with
+--index-dir when it has one, and the MDX files by the path the server
+finds them at. An interrupted build resumes where it stopped when run
+again; an index newer than its dictionary is skipped unless --force.
+
+The default tokenizer splits words on spaces and punctuation. For Chinese
+or Japanese dictionaries, --tokenizer trigram matches any text of three
+characters or more instead, at the cost of a larger index.
+
+    python tools/build_fulltext.py content/oald10/oald10.mdx
+    python tools/build_fulltext.py --index-dir /data/index content/*/*.mdx
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'flask-mdict'))
+
+from flask_mdict.mdict_query2 import IndexBuilder2  # noqa: E402
+from flask_mdict.fulltext import TOKENIZER, BATCH_BLOCKS, build_fulltext  # noqa: E402
+from flask_mdict.helper import _dict_uuid, _mdict_index_dir  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filenames', nargs='+', help='MDX files')
+    parser.add_argument('--index-dir', help='INDEX_DIR of the server')
+    parser.add_argument('--tokenizer', default=TOKENIZER, help='FTS5 tokenizer (default: %(default)s)')
+    parser.add_argument('--batch-blocks', type=int, default=BATCH_BLOCKS,
+                        help='record blocks inserted per transaction')
+    parser.add_argument('--force', action='store_true', help='rebuild up to date indexes')
+    args = parser.parse_args()
+
+    for fname in args.filenames:
+        fname = os.path.abspath(fname)
+        index_dir = _mdict_index_dir(args.index_dir, _dict_uuid(fname))
+        query = IndexBuilder2(fname, index_dir=index_dir)
+        fts_db = query.get_fulltext_db(query._mdx_db)
+        if (not args.force and os.path.isfile(fts_db)
+                and os.path.getmtime(fts_db) >= os.path.getmtime(fname)):
+            print('%s: up to date' % os.path.basename(fname))
+            continue
+        if args.force and os.path.exists(fts_db + '.part'):
+            os.remove(fts_db + '.part')
+
+        def progress(blocks, records):
+            print('\r%s: %d blocks, %d records' % (os.path.basename(fname), blocks, records),
+                  end='', flush=True)
+
+        start = time.perf_counter()
+        build_fulltext(query, fts_db, tokenizer=args.tokenizer,
+                       batch_blocks=args.batch_blocks, progress=progress)
+        print(' (%.1fs, %.1f MB)' % (time.perf_counter() - start, os.path.getsize(fts_db) / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,8 @@ export interface DictInfo {
   logo: string
   type: string
   enabled: boolean
+  status: 'ready' | 'building' | 'error'
+  wildcard: 'building' | 'ready' | 'error' | null
 }
 
 export interface LookupResult {
@@ -16,18 +18,44 @@ export interface LookupResult {
   html: string
 }
 
+// A dictionary that missed the server-side lookup deadline
+export interface PendingDict {
+  uuid: string
+  title: string
+}
+
 export interface LookupAllResult {
   word: string
   results: LookupResult[]
   total: number
+  pending?: PendingDict[]
 }
 
+export interface LookupBatchResult {
+  // per word, one entry per dictionary that has it
+  results: Record<string, LookupResult[]>
+  total: number
+  pending: PendingDict[]
+}
+
+// One line of the /api/lookup/<word>/stream NDJSON response
+export type LookupStreamLine =
+  | (LookupResult & { type: 'result'; index: number })
+  | { type: 'done'; word: string; total: number; pending: PendingDict[] }
+
 export interface HistoryItem {
   word: string
   count: number
   last_time: string
 }
 
+export interface FuzzyMatch {
+  word: string
+  distance: number
+  bnc: number | null
+  frq: number | null
+}
+
 export interface WordMeta {
   word: string
   found: boolean
@@ -64,6 +92,49 @@ async function fetchJson<T>(url: string, init?: RequestInit): Promise<T> {
   return res.json()
 }
 
+// Calls onLine for every line of a newline-delimited JSON response as it arrives
+async function fetchNdjson<T>(url: string, onLine: (line: T) => void, signal?: AbortSignal) {
+  const res = await fetch(`${BASE}${url}`, { signal })
+  if (!res.ok || !res.body) throw new Error(`API error: ${res.status}`)
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader()
+  let buffer = ''
+  for (;;) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += value
+    const lines = buffer.split('\n')
+    buffer = lines.pop() ?? ''
+    for (const line of lines) {
+      if (line) onLine(JSON.parse(line))
+    }
+  }
+  if (buffer) onLine(JSON.parse(buffer))
+}
+
+async function lookupAllStream(
+  word: string,
+  onProgress?: (partial: LookupAllResult) => void,
+  signal?: AbortSignal,
+): Promise<LookupAllResult> {
+  let results: (LookupResult & { index: number })[] = []
+  let result: LookupAllResult = { word, results, total: 0 }
+  await fetchNdjson<LookupStreamLine>(
+    `/api/lookup/${encodeURIComponent(word)}/stream`,
+    (line) => {
+      if (line.type === 'result') {
+        // results arrive in completion order, display them in dictionary order
+        results = [...results, line].sort((a, b) => a.index - b.index)
+        result = { word, results, total: results.length }
+        onProgress?.(result)
+      } else {
+        result = { word: line.word, results, total: line.total, pending: line.pending }
+      }
+    },
+    signal,
+  )
+  return result
+}
+
 export const api = {
   getDicts: () => fetchJson<DictInfo[]>('/api/dicts'),
 
@@ -73,9 +144,23 @@ export const api = {
   lookupAll: (word: string) =>
     fetchJson<LookupAllResult>(`/api/lookup/${encodeURIComponent(word)}`),
 
+  lookupAllStream,
+
+  lookupBatch: (words: string[], uuids?: string[]) =>
+    fetchJson<LookupBatchResult>('/api/lookup/batch', {
+      method: 'POST',
+      body: JSON.stringify({ words, uuids }),
+      headers: { 'Content-Type': 'application/json' },
+    }),
+
   suggest: (query: string, limit = 20) =>
     fetchJson<string[]>(`/api/suggest/${encodeURIComponent(query)}?limit=${limit}`),
 
+  fuzzy: (word: string, maxEdits = 2, limit = 20) =>
+    fetchJson<FuzzyMatch[]>(
+      `/api/fuzzy/${encodeURIComponent(word)}?max_edits=${maxEdits}&limit=${limit}`,
+    ),
+
   getHistory: (limit = 100) =>
     fetchJson<HistoryItem[]>(`/api/history?limit=${limit}`),
 
@@ -5,7 +5,7 @@ import { BookOpen } from 'lucide-react'
 
 export function ResultsArea() {
   const searchWord = useAppStore((s) => s.searchWord)
-  const { data, isLoading, error } = useLookup(searchWord)
+  const { data, isLoading, isFetching, error } = useLookup(searchWord)
 
   if (!searchWord) {
     return (
@@ -43,7 +43,7 @@ export function ResultsArea() {
 
   const results = data?.results ?? []
 
-  if (results.length === 0) {
+  if (results.length === 0 && !isFetching) {
     return (
       <div className="mt-4 p-8 text-center text-gray-400 dark:text-slate-600">
         <p className="text-lg">No results found for "<span className="text-gray-600 dark:text-slate-400 font-medium">{searchWord}</span>"</p>
@@ -62,6 +62,10 @@ export function ResultsArea() {
           html={r.html}
         />
       ))}
+      {isFetching && (
+        // more dictionaries are still streaming in
+        <div className="h-10 bg-white dark:bg-slate-900 rounded-xl border border-gray-200 dark:border-slate-800 animate-pulse" />
+      )}
     </div>
   )
 }
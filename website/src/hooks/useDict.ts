@@ -12,17 +12,28 @@ export function useDicts() {
 
 export function useLookup(word: string) {
   const activeDict = useAppStore((s) => s.activeDict)
+  const queryClient = useQueryClient()
+  const queryKey = ['lookup', word, activeDict]
 
   return useQuery({
-    queryKey: ['lookup', word, activeDict],
-    queryFn: () =>
-      activeDict === 'all'
-        ? api.lookupAll(word)
-        : api.lookupWord(activeDict, word).then((r) => ({
-            word: r.word,
-            results: r.found ? [r] : [],
-            total: r.found ? 1 : 0,
-          })),
+    queryKey,
+    queryFn: ({ signal }) => {
+      if (activeDict === 'all') {
+        // Render each dictionary as soon as it arrives, but let a background
+        // refetch keep showing the previous complete result until it is done
+        const progressive = queryClient.getQueryData(queryKey) === undefined
+        return api.lookupAllStream(
+          word,
+          progressive ? (partial) => queryClient.setQueryData(queryKey, partial) : undefined,
+          signal,
+        )
+      }
+      return api.lookupWord(activeDict, word).then((r) => ({
+        word: r.word,
+        results: r.found ? [r] : [],
+        total: r.found ? 1 : 0,
+      }))
+    },
     enabled: !!word.trim(),
     staleTime: 5 * 60_000,
   })